@@ -1,3 +1,4 @@
+import logging # Used to report that the shared embedding cache is not installed.
 import boto3 # Used to create a client for AWS services, including Bedrock.
 import streamlit as st # The framework for creating the web application UI.
 from langchain.embeddings import BedrockEmbeddings # Used to generate text embeddings with Bedrock models.
@@ -8,6 +9,16 @@ from langchain.vectorstores import FAISS # A library for efficient similarity se
 from langchain.prompts import PromptTemplate # A class for creating and managing prompts for LLMs.
 from langchain.chains import RetrievalQA # A chain that combines retrieval and question-answering.
 
+try:
+    from embedding_cache import cache_embeddings
+except ModuleNotFoundError as e:
+    if e.name != "embedding_cache":
+        raise
+    logging.getLogger(__name__).warning("embedding_cache is not installed, every chunk is embedded")
+
+    def cache_embeddings(embeddings, model_id=None):
+        return embeddings
+
 
 # Defines the template for the prompt sent to the LLM.
 # It includes placeholders for the 'context' retrieved from the vector store
@@ -37,6 +48,8 @@ bedrock = boto3.client(service_name="bedrock-runtime", region_name = "us-east-1"
 # Initializes the embedding model from Bedrock.
 # `amazon.titan-embed-text-v1` is a specific model used to convert text into numerical vectors (embeddings).
 bedrock_embeddings = BedrockEmbeddings(model_id="amazon.titan-embed-text-v1",client=bedrock)
+# Wrapped once, so every rebuild in this process reuses the same open embedding cache.
+cached_bedrock_embeddings = cache_embeddings(bedrock_embeddings)
 
 #Choose any model you Like.
 
@@ -58,9 +71,10 @@ def get_documents():
 # Defines a function to create a vector store from the document chunks.
 def get_vector_store(docs):
     # Creates an in-memory FAISS vector store from the document chunks using the Bedrock embeddings model.
+    # Chunks embedded by an earlier build are read from the on-disk cache, so only new text is sent to Bedrock.
     vectorstore_faiss = FAISS.from_documents(
         docs,
-        bedrock_embeddings
+        cached_bedrock_embeddings
     )
     # Saves the created vector store to a local file for later use.
     vectorstore_faiss.save_local("faiss_index")
@@ -6,6 +6,7 @@ Here are comments for the provided code, explaining each section and function's
 
 ```python
 import os  # Used to access environment variables.
+import logging  # Used to report that the shared embedding cache is not installed.
 import boto3  # The AWS SDK for Python, used to interact with AWS services like Bedrock.
 import streamlit as st  # The framework for building the web-based user interface.
 from langchain.llms.bedrock import Bedrock  # A LangChain wrapper for Bedrock's large language models.
@@ -17,6 +18,16 @@ from langchain.prompts import PromptTemplate  # A class to create structured pro
 from langchain.chains import RetrievalQA  # A LangChain chain that combines document retrieval with question answering.
 from dotenv import load_dotenv  # A library to load environment variables from a .env file.
 
+try:
+    from embedding_cache import cache_embeddings
+except ModuleNotFoundError as e:
+    if e.name != "embedding_cache":
+        raise
+    logging.getLogger(__name__).warning("embedding_cache is not installed, every chunk is embedded")
+
+    def cache_embeddings(embeddings, model_id=None):
+        return embeddings
+
 # Load environment variables from the .env file. This is a best practice
 # for managing sensitive information like API keys and credentials.
 load_dotenv()
@@ -57,6 +68,8 @@ bedrock = boto3.client(
 # Initialize the Bedrock embedding model.
 # `amazon.titan-text-express-v1` is the specific model used to convert text into numerical vectors.
 bedrock_embedding = BedrockEmbeddings(model_id="amazon.titan-text-express-v1", client= bedrock)
+# Wrapped once, so every rebuild in this process reuses the same open embedding cache.
+cached_bedrock_embedding = cache_embeddings(bedrock_embedding)
 
 
 # Defines a function to load and process documents.
@@ -78,7 +91,8 @@ def get_documents():
 def get_vector_store(docs):
    # Creates a Chroma vector store from the document chunks and embeddings.
    # `persist_directory` saves the vector store to disk, so it doesn't have to be recreated every time.
-    vectordb = Chroma.from_documents(docs, embedding=bedrock_embedding, persist_directory='./db')
+    # Chunks embedded by an earlier build are read from the on-disk cache, so only new text is sent to Bedrock.
+    vectordb = Chroma.from_documents(docs, embedding=cached_bedrock_embedding, persist_directory='./db')
     # Persists the vector store to the specified directory.
     vectordb.persist()
 
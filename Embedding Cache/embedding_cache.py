@@ -0,0 +1,192 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:
+    from langchain.embeddings.base import Embeddings
+
+
+# One cache for every index build on this machine, so the projects share vectors of identical text
+EMBEDDING_CACHE = os.environ.get("EMBEDDING_CACHE", "1") == "1"
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "embeddings"))
+# Missing texts are sent to the model this many at a time
+EMBEDDING_CACHE_BATCH_SIZE = int(os.environ.get("EMBEDDING_CACHE_BATCH_SIZE", "256"))
+
+INDEX_FILE = "index.sqlite"
+# SQLite limits the number of parameters in one query
+_LOOKUP_BATCH = 500
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """ Vectors keyed by (model id, sha256 of the text), stored in ``directory``.
+
+    Each model's vectors are rows of one raw float32 file (vectors-<model hash>.f32)
+    that is only ever appended to and is read through a memory map. index.sqlite
+    maps (model, text hash) to a row. Rows are appended inside a write transaction,
+    so several processes can fill the same cache, and bytes past the last
+    committed row (left by a crash) are cut off before the next append.
+    """
+
+    def __init__(self, directory=EMBEDDING_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, INDEX_FILE), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS vectors (
+                                  model TEXT NOT NULL,
+                                  key BLOB NOT NULL,
+                                  row INTEGER NOT NULL,
+                                  PRIMARY KEY (model, key))""")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS models (
+                                  model TEXT PRIMARY KEY,
+                                  dimensions INTEGER NOT NULL,
+                                  rows INTEGER NOT NULL)""")
+
+    def _path(self, model):
+        return os.path.join(self.directory, f"vectors-{hashlib.sha256(model.encode()).hexdigest()[:16]}.f32")
+
+    def get_many(self, model, keys):
+        """ Cached vectors of ``keys`` as {key: float32 array}; missing keys are left out """
+        with self._lock:
+            info = self._conn.execute("SELECT dimensions, rows FROM models WHERE model = ?", (model,)).fetchone()
+            if info is None:
+                return {}
+            rows = {}
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), _LOOKUP_BATCH):
+                batch = unique[start:start + _LOOKUP_BATCH]
+                rows.update(self._conn.execute(
+                    f"SELECT key, row FROM vectors WHERE model = ? AND key IN ({','.join('?' * len(batch))})",
+                    [model, *batch]))
+        if not rows:
+            return {}
+        dimensions, count = info
+        vectors = np.memmap(self._path(model), dtype=np.float32, mode="r", shape=(count, dimensions))
+        return {key: np.array(vectors[row]) for key, row in rows.items()}
+
+    def put_many(self, model, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                info = self._conn.execute("SELECT dimensions, rows FROM models WHERE model = ?", (model,)).fetchone()
+                dimensions, count = info or (vectors.shape[1], 0)
+                if vectors.shape[1] != dimensions:
+                    raise ValueError(f"{model} vectors have {dimensions} dimensions, got {vectors.shape[1]}")
+
+                # Another process may have cached some of these since they were looked up
+                new, seen = [], set()
+                for i, key in enumerate(keys):
+                    if key not in seen:
+                        seen.add(key)
+                        new.append(i)
+                existing = set()
+                for start in range(0, len(new), _LOOKUP_BATCH):
+                    batch = [keys[i] for i in new[start:start + _LOOKUP_BATCH]]
+                    existing.update(key for key, in self._conn.execute(
+                        f"SELECT key FROM vectors WHERE model = ? AND key IN ({','.join('?' * len(batch))})",
+                        [model, *batch]))
+                new = [i for i in new if keys[i] not in existing]
+
+                if new:
+                    with open(self._path(model), "ab") as f:
+                        f.truncate(count * dimensions * 4)
+                        f.write(vectors[new].tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._conn.executemany("INSERT INTO vectors (model, key, row) VALUES (?, ?, ?)",
+                                           [(model, keys[i], count + n) for n, i in enumerate(new)])
+                    self._conn.execute("INSERT OR REPLACE INTO models (model, dimensions, rows) VALUES (?, ?, ?)",
+                                       (model, dimensions, count + len(new)))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def stats(self):
+        with self._lock:
+            return {model: {"dimensions": dimensions, "vectors": rows}
+                    for model, dimensions, rows in self._conn.execute("SELECT model, dimensions, rows FROM models")}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_caches = {}
+_default_lock = threading.Lock()
+
+
+# The process's cache of ``directory``, opened on first use and shared by every wrapper after that
+def default_cache(directory=EMBEDDING_CACHE_DIR):
+    with _default_lock:
+        cache = _default_caches.get(directory)
+        if cache is None:
+            cache = _default_caches[directory] = EmbeddingCache(directory)
+        return cache
+
+
+# Model id of a LangChain embeddings object, e.g. "OpenAIEmbeddings:text-embedding-ada-002"
+def model_id_of(embeddings):
+    for attribute in ("model", "model_id", "model_name"):
+        name = getattr(embeddings, attribute, None)
+        if isinstance(name, str) and name:
+            return f"{type(embeddings).__name__}:{name}"
+    raise ValueError(f"Pass model_id, {type(embeddings).__name__} does not name its model")
+
+
+class CachedEmbeddings(Embeddings):
+    """ Wraps a LangChain embeddings object so documents already embedded by the same model are read from disk.
+
+    Only texts whose (model id, sha256) is not in the cache reach the model;
+    queries are always passed through.
+    """
+
+    def __init__(self, embeddings, model_id=None, cache=None, batch_size=EMBEDDING_CACHE_BATCH_SIZE):
+        self.embeddings = embeddings
+        self.model_id = model_id or model_id_of(embeddings)
+        self.cache = cache or default_cache()
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        keys = [text_key(text) for text in texts]
+        found = self.cache.get_many(self.model_id, keys)
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        self.hits += len(keys) - sum(1 for key in keys if key not in found)
+        self.misses += len(missing)
+
+        if missing:
+            texts_by_key = dict(zip(keys, texts))
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                vectors = self.embeddings.embed_documents([texts_by_key[key] for key in batch])
+                # Each batch is stored right away, so an interrupted build keeps what it paid for
+                self.cache.put_many(self.model_id, batch, vectors)
+                found.update(zip(batch, np.asarray(vectors, dtype=np.float32)))
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def stats(self):
+        return {"model": self.model_id, "hits": self.hits, "misses": self.misses}
+
+
+# Wrap ``embeddings`` in the on-disk cache unless EMBEDDING_CACHE=0
+def cache_embeddings(embeddings, model_id=None):
+    if not EMBEDDING_CACHE:
+        return embeddings
+    return CachedEmbeddings(embeddings, model_id)
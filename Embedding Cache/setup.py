@@ -0,0 +1,11 @@
+from setuptools import setup
+
+setup(
+    name = 'embedding-cache',
+    version= '0.0.1',
+    author= 'Abhijit D',
+    author_email= 'abhijit.d88@gmail.com',
+    py_modules= ['embedding_cache'],
+    install_requires = ['numpy', 'langchain-core']
+
+)
@@ -1,13 +1,9 @@
 from flask import Flask, render_template, jsonify, request
-from src.helper import download_hugging_face_embeddings
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import OpenAI
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+from src.helper import preload_embeddings
+from src.rag import create_service
 from dotenv import load_dotenv
-from src.prompt import *
 import os
+import threading
 
 app = Flask(__name__)
 
@@ -16,33 +12,24 @@ load_dotenv()
 PINECONE_API_KEY=os.environ.get('PINECONE_API_KEY')
 OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY')
 
-os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
+if PINECONE_API_KEY:
+    os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
-embeddings = download_hugging_face_embeddings()
+# Embeddings, vector store, retrieval chain and caches (shared with the ASGI app in asgi.py).
+# gunicorn imports this module in the master, so the service and its Pinecone and OpenAI
+# clients are built on first use in each worker instead of being forked.
+_rag = None
+_rag_lock = threading.Lock()
 
 
-index_name = "medicalbot"
-
-# Embed each chunk and upsert the embeddings into your Pinecone index.
-docsearch = PineconeVectorStore.from_existing_index(
-    index_name=index_name,
-    embedding=embeddings
-)
-
-retriever = docsearch.as_retriever(search_type="similarity", search_kwargs={"k":3})
-
-
-llm = OpenAI(temperature=0.4, max_tokens=500)
-prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", system_prompt),
-        ("human", "{input}"),
-    ]
-)
-
-question_answer_chain = create_stuff_documents_chain(llm, prompt)
-rag_chain = create_retrieval_chain(retriever, question_answer_chain)
+def get_rag():
+    global _rag
+    if _rag is None:
+        with _rag_lock:
+            if _rag is None:
+                _rag = create_service()
+    return _rag
 
 
 @app.route("/")
@@ -55,12 +42,19 @@ def chat():
     msg = request.form["msg"]
     input = msg
     print(input)
-    response = rag_chain.invoke({"input": msg})
-    print("Response : ", response["answer"])
-    return str(response["answer"])
+    answer = get_rag().answer(msg)
+    print("Response : ", answer)
+    return str(answer)
+
 
+@app.route("/cache")
+def cache_stats():
+    return jsonify(get_rag().stats())
 
 
 
+# Development server; use gunicorn -c gunicorn.conf.py app:app in production
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port= 8080, debug= True)
+    preload_embeddings()
+    # The debug reloader runs the app in a second process, loading the model twice
+    app.run(host="0.0.0.0", port= 8080, debug= os.environ.get("FLASK_DEBUG") == "1")
@@ -0,0 +1,88 @@
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Form, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from dotenv import load_dotenv
+import asyncio
+import json
+import os
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Format one Server-Sent Event frame
+def sse_event(data, event=None):
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+#Retrieved chunks as sent to the browser, ahead of the answer
+def context_summary(documents):
+    return [{"source": os.path.basename(str(d.metadata.get("source", ""))), "page": d.metadata.get("page"),
+             "text": d.page_content[:200]} for d in documents]
+
+
+async def stream_answer(service, msg):
+    """ Server-Sent Events: ``event: context`` with the retrieved chunks, ``data: {"token": ...}``
+    frames as the LLM writes, then ``event: done`` (or ``event: error``) """
+    try:
+        async for kind, value in service.astream(msg):
+            if kind == "context":
+                yield sse_event(context_summary(value), event="context")
+            else:
+                yield sse_event({"token": value})
+        yield sse_event({}, event="done")
+    except Exception as e:
+        yield sse_event({"detail": str(e)}, event="error")
+
+
+def create_app(service=None):
+    """ ASGI app for the chatbot; pass a RagService (e.g. built from fakes) or let it build the configured one """
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if service is None:
+            load_dotenv()
+            from src.rag import create_service
+            # Built in each worker, after gunicorn forks, so network clients are never shared between processes
+            app.state.service = await asyncio.to_thread(create_service)
+        else:
+            app.state.service = service
+        yield
+
+    app = FastAPI(lifespan=lifespan)
+    app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
+    templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+
+    @app.get("/")
+    def index(request: Request):
+        return templates.TemplateResponse(request, "chat.html")
+
+    @app.post("/get", response_class=PlainTextResponse)
+    async def chat(request: Request, msg: str = Form(...)):
+        return str(await request.app.state.service.aanswer(msg))
+
+    @app.post("/stream")
+    async def chat_stream(request: Request, msg: str = Form(...)):
+        return StreamingResponse(stream_answer(request.app.state.service, msg), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.get("/cache")
+    def cache_stats(request: Request):
+        return request.app.state.service.stats()
+
+    return app
+
+
+app = create_app()
+
+
+# Production: GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+if __name__ == "__main__":
+    import uvicorn
+    from src.helper import preload_embeddings
+
+    preload_embeddings()
+    uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -0,0 +1,115 @@
+""" Offline check of the chatbot's RAG service and web endpoints.
+
+Builds a RagService from LangChain's deterministic fake embeddings, a fake
+streaming LLM and a local index in a temporary directory, then checks answers,
+streamed answers, the semantic cache, reloading a rebuilt index, and the ASGI
+app's /get and /stream endpoints (including an error in the middle of a
+stream). Nothing needs network access or API keys:
+
+    python check_offline.py
+"""
+from fastapi.testclient import TestClient
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeStreamingListLLM
+from src.cache import IndexVersion
+from src.rag import RagService
+from src.vector_store import LocalVectorStore
+from asgi import create_app
+import asyncio
+import json
+import os
+import tempfile
+
+
+ANSWER = "Acne is treated with topical retinoids."
+
+PASSAGES = [
+    ("Acne is a skin condition treated with topical retinoids and benzoyl peroxide.", {"source": "Data/book.pdf", "page": 11}),
+    ("Asthma causes wheezing and is managed with inhalers.", {"source": "Data/book.pdf", "page": 40}),
+    ("Migraine is a headache disorder that can cause nausea.", {"source": "Data/book.pdf", "page": 72}),
+]
+
+
+def check(name, condition, detail=""):
+    if not condition:
+        raise SystemExit(f"FAIL {name} {detail}")
+    print(f"ok   {name}")
+
+
+#Split a text/event-stream body into (event, data) pairs
+def parse_sse(body):
+    events = []
+    for frame in body.strip().split("\n\n"):
+        event, data = "message", ""
+        for line in frame.split("\n"):
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data += line[6:]
+        events.append((event, json.loads(data)))
+    return events
+
+
+#A service whose stream fails after the first token
+class FailingService:
+    async def astream(self, msg):
+        yield "context", []
+        yield "token", "Partial"
+        raise RuntimeError("LLM connection lost")
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix="medicalbot-check-")
+    embeddings = DeterministicFakeEmbedding(size=64)
+    texts, metadatas = zip(*PASSAGES)
+    docsearch = LocalVectorStore(embeddings, os.path.join(directory, "vector_index"))
+    docsearch.add_texts(list(texts), list(metadatas))
+    docsearch.save()
+
+    index_version = IndexVersion(os.path.join(directory, "index_version.txt"), check_interval=0)
+    llm = FakeStreamingListLLM(responses=[ANSWER])
+    service = RagService(embeddings, docsearch, llm, index_version=index_version, semantic_cache=True)
+
+    check("answer", service.answer("How is acne treated?") == ANSWER)
+    check("aanswer", asyncio.run(service.aanswer("What helps with asthma?")) == ANSWER)
+
+    items = asyncio.run(collect(service.astream("What causes migraines?")))
+    kinds = [kind for kind, _ in items]
+    check("astream sends the context first", kinds[0] == "context" and len(items[0][1]) == 3, kinds)
+    check("astream tokens make up the answer", "".join(v for k, v in items if k == "token") == ANSWER)
+    items = asyncio.run(collect(service.astream("What causes migraines?")))
+    check("repeated question comes from the answer cache", items == [("context", []), ("token", ANSWER)], items)
+
+    # A rebuilt index is picked up once the version file changes
+    docsearch.add_texts(["Eczema is itchy inflamed skin."], [{"source": "Data/book.pdf", "page": 90}])
+    docsearch.save()
+    reader = LocalVectorStore.load(embeddings, docsearch.directory)
+    service = RagService(embeddings, reader, llm, index_version=index_version)
+    reader.add_texts(["Discarded unsaved text."])
+    IndexVersion.bump(index_version.path)
+    service.retriever.invoke("Eczema")
+    check("rebuilt index is reloaded", len(reader.index) == 4, len(reader.index))
+
+    # The app's lifespan, which installs the service, only runs inside the with block
+    with TestClient(create_app(service)) as client:
+        response = client.post("/get", data={"msg": "How is acne treated?"})
+        check("POST /get", response.status_code == 200 and response.text == ANSWER, response.text)
+        response = client.post("/stream", data={"msg": "How is eczema treated?"})
+    events = parse_sse(response.text)
+    check("POST /stream is an event stream", response.headers["content-type"].startswith("text/event-stream"))
+    check("POST /stream sends the sources first", events[0][0] == "context" and events[0][1][0]["source"] == "book.pdf", events[0])
+    check("POST /stream sends the answer's tokens", "".join(d.get("token", "") for e, d in events if e == "message") == ANSWER)
+    check("POST /stream ends with done", events[-1] == ("done", {}), events[-1])
+
+    with TestClient(create_app(FailingService())) as client:
+        events = parse_sse(client.post("/stream", data={"msg": "anything"}).text)
+    check("a failed stream ends with an error event", events[-1] == ("error", {"detail": "LLM connection lost"}), events)
+    print("All offline checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# Production server (streaming ASGI app): GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+# or the Flask app without /stream: gunicorn -c gunicorn.conf.py app:app
+import gc
+import os
+
+from src.helper import EMBEDDING_BACKEND, load_embedding_model, preload_embeddings
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# Flask is a WSGI app, so each worker serves requests from a small thread pool (ignored by uvicorn workers)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+# Import the app once in the master so the workers fork with it (and the model weights) already in memory.
+# Only the embedding model is loaded there; each worker builds its own RAG service and network clients.
+preload_app = True
+
+
+def when_ready(server):
+    # Load the torch weights in the master, without running them, so every worker shares them copy-on-write
+    if EMBEDDING_BACKEND == "torch":
+        load_embedding_model()
+    # Keep the garbage collector from touching (and so copying) everything loaded so far
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Runs before the worker accepts connections, so no request waits for the first inference
+    preload_embeddings()
+    worker.log.info("Embedding model ready (%s backend)", EMBEDDING_BACKEND)
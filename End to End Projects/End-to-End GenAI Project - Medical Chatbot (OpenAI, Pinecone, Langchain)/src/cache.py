@@ -0,0 +1,202 @@
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from collections import OrderedDict
+import numpy as np
+import os
+import re
+import threading
+import time
+
+
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "4096"))
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("RETRIEVAL_CACHE_SIZE", "4096"))
+RETRIEVAL_CACHE_TTL = float(os.environ.get("RETRIEVAL_CACHE_TTL", "3600"))
+# Semantic answer cache: off unless SEMANTIC_CACHE=1, answers are reused for questions at least this similar
+SEMANTIC_CACHE = os.environ.get("SEMANTIC_CACHE") == "1"
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", "1024"))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+# store_index.py rewrites this file after every upsert; cached retrievals and answers older than it are dropped
+INDEX_VERSION_FILE = os.environ.get("INDEX_VERSION_FILE", "index_version.txt")
+INDEX_VERSION_CHECK_INTERVAL = float(os.environ.get("INDEX_VERSION_CHECK_INTERVAL", "5"))
+
+
+#Lowercase, collapse whitespace and drop trailing punctuation, so trivially different questions share entries
+def normalize_query(text):
+    return re.sub(r"\s+", " ", text).strip().lower().rstrip("?!. ")
+
+
+
+#Least recently used cache with an optional time to live, safe to share between threads
+class LRUCache:
+    def __init__(self, max_entries, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] < time.monotonic()):
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+
+#Version of the vector index as written by store_index.py, re-read at most every few seconds
+class IndexVersion:
+    def __init__(self, path=INDEX_VERSION_FILE, check_interval=INDEX_VERSION_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._version = self._read()
+        self._checked_at = time.monotonic()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def on_change(self, callback):
+        self._listeners.append(callback)
+
+    def check(self):
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self._version
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = self._read()
+            if version != self._version:
+                self._version = version
+                for callback in self._listeners:
+                    callback()
+        return self._version
+
+    @staticmethod
+    def bump(path=INDEX_VERSION_FILE):
+        with open(path, "w") as f:
+            f.write(str(time.time()))
+
+
+
+#Embeddings with query vectors cached by normalized text; documents are passed straight through
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, max_entries=QUERY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.cache = LRUCache(max_entries)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = normalize_query(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+
+
+#Retriever that remembers the documents found for each normalized query until the index changes
+class CachedRetriever(BaseRetriever):
+    retriever: BaseRetriever
+    cache: LRUCache
+    index_version: IndexVersion
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.index_version.on_change(self.cache.clear)
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        self.index_version.check()
+        key = normalize_query(query)
+        documents = self.cache.get(key)
+        if documents is None:
+            documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+            self.cache.set(key, documents)
+        return documents
+
+
+
+#Answers reused for questions whose embeddings are within SEMANTIC_CACHE_THRESHOLD cosine similarity
+class SemanticCache:
+    def __init__(self, embeddings, index_version, threshold=SEMANTIC_CACHE_THRESHOLD,
+                 max_entries=SEMANTIC_CACHE_SIZE, ttl=SEMANTIC_CACHE_TTL):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._answers = []
+        self._lock = threading.Lock()
+        self.index_version = index_version
+        index_version.on_change(self.clear)
+
+    def _unit(self, text):
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get(self, question):
+        self.index_version.check()
+        vector = self._unit(question)
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is not None and len(self._answers):
+                # Rows are normalized, so one matrix-vector product gives every cosine similarity
+                scores = self._vectors @ vector
+                best = int(np.argmax(scores))
+                answer, expires_at = self._answers[best]
+                if scores[best] >= self.threshold and expires_at >= now:
+                    self.hits += 1
+                    return answer
+            self.misses += 1
+        return None
+
+    def set(self, question, answer):
+        vector = self._unit(question)
+        now = time.monotonic()
+        with self._lock:
+            # Drop expired entries, then the oldest ones beyond the size limit
+            keep = [i for i, (_, expires_at) in enumerate(self._answers) if expires_at >= now]
+            keep = keep[-(self.max_entries - 1):] if self.max_entries > 1 else []
+            vectors = self._vectors[keep] if self._vectors is not None else np.empty((0, len(vector)), np.float32)
+            self._vectors = np.vstack([vectors, vector[None, :]])
+            self._answers = [self._answers[i] for i in keep] + [(answer, now + self.ttl)]
+
+    def clear(self):
+        with self._lock:
+            self._vectors = None
+            self._answers = []
+
+    def stats(self):
+        return {"entries": len(self._answers), "hits": self.hits, "misses": self.misses}
@@ -1,6 +1,20 @@
 from langchain.document_loaders import PyPDFLoader, DirectoryLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+import os
+import threading
+
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# "torch" (default), "onnx" or "onnx-int8" (dynamically quantized ONNX weights shipped with the model)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_INT8_FILE = os.environ.get("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+# CPU threads per process for inference; keep workers * threads at or below the number of cores
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0")) or max(1, (os.cpu_count() or 1) // int(os.environ.get("WEB_CONCURRENCY", "1")))
+
+_model = None
+_model_lock = threading.Lock()
 
 
 #Extract Data From the PDF File
@@ -23,7 +37,74 @@ def text_split(extracted_data):
 
 
 
-#Download the Embeddings from HuggingFace 
+#Model arguments for the configured inference backend
+def embedding_model_kwargs():
+    model_kwargs = {"device": "cpu"}
+    if EMBEDDING_BACKEND == "torch":
+        import torch
+        torch.set_num_threads(EMBEDDING_THREADS)
+        return model_kwargs
+
+    import onnxruntime
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = EMBEDDING_THREADS
+    session_options.inter_op_num_threads = 1
+    model_kwargs["backend"] = "onnx"
+    model_kwargs["model_kwargs"] = {"session_options": session_options, "provider": "CPUExecutionProvider"}
+    if EMBEDDING_BACKEND == "onnx-int8":
+        model_kwargs["model_kwargs"]["file_name"] = EMBEDDING_ONNX_INT8_FILE
+    elif EMBEDDING_BACKEND != "onnx":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
+    return model_kwargs
+
+
+
+#Load the embedding model, once per process
+def load_embedding_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model=HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, model_kwargs=embedding_model_kwargs())  #this model return 384 dimensions
+    return _model
+
+
+
+#Embeddings that always go through this process's model, so objects built before a fork stay valid after it
+class ProcessEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return load_embedding_model().embed_documents(texts)
+
+    def embed_query(self, text):
+        return load_embedding_model().embed_query(text)
+
+_embeddings = ProcessEmbeddings()
+
+
+
+#Download the Embeddings from HuggingFace
 def download_hugging_face_embeddings():
-    embeddings=HuggingFaceEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2')  #this model return 384 dimensions
-    return embeddings
\ No newline at end of file
+    return _embeddings
+
+
+
+#Load the model and run one query through it so the first request does not pay for it
+def preload_embeddings():
+    if EMBEDDING_BACKEND == "torch":
+        # Forked workers inherit the weights but not the parent's thread settings
+        import torch
+        torch.set_num_threads(EMBEDDING_THREADS)
+    _embeddings.embed_query("warm up")
+    return _embeddings
+
+
+
+#ONNX Runtime sessions own threads that do not survive fork(), so forked workers build their own.
+#Torch weights stay shared with the parent copy-on-write.
+def _reset_after_fork():
+    global _model, _model_lock
+    _model_lock = threading.Lock()
+    if EMBEDDING_BACKEND != "torch":
+        _model = None
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,158 @@
+from langchain.document_loaders import PyPDFLoader
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.helper import text_split
+import hashlib
+import json
+import os
+import time
+
+
+# Processes parsing PDFs; embedding stays in the main process so the model is loaded once
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "0")) or max(1, (os.cpu_count() or 2) - 1)
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+UPSERT_BATCH_SIZE = int(os.environ.get("UPSERT_BATCH_SIZE", "100"))
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+#Chunk ids are content hashes, so an unchanged chunk keeps its id and its vector
+def chunk_id(source, text):
+    return hashlib.sha256(f"{source}\n{text}".encode()).hexdigest()
+
+
+#Parse and split one PDF (runs in a worker process)
+def parse_pdf(path):
+    chunks = text_split(PyPDFLoader(path).load())
+    return path, [(chunk_id(path, c.page_content), c.page_content, c.metadata) for c in chunks]
+
+
+#Which PDFs changed since the manifest was written: (changed paths, removed paths, current file hashes)
+def diff_files(data, manifest):
+    paths = sorted(os.path.join(data, name) for name in os.listdir(data) if name.lower().endswith(".pdf"))
+    hashes = {path: file_sha256(path) for path in paths}
+    changed = [path for path in paths if manifest.get(path, {}).get("sha256") != hashes[path]]
+    removed = [path for path in manifest if path not in hashes]
+    return changed, removed, hashes
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(f"{path}.tmp", path)
+
+
+class PineconeTarget:
+    """ Upserts raw vectors into a Pinecone index, in the layout PineconeVectorStore reads (text under "text") """
+
+    def __init__(self, index):
+        self.index = index
+
+    def upsert(self, ids, vectors, texts, metadatas):
+        self.index.upsert(vectors=[(i, list(map(float, v)), {**m, "text": t})
+                                   for i, v, t, m in zip(ids, vectors, texts, metadatas)])
+
+    def delete(self, ids):
+        for start in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[start:start + 1000])
+
+    def finish(self):
+        pass
+
+
+class LocalTarget:
+    """ Collects upserts and deletes in a LocalVectorStore and saves it once at the end.
+
+    The save writes a new version of the index and swaps it in, so apps reading
+    the old version are unaffected until they reload; nothing is written when
+    nothing changed.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._pending = []
+        self._deleted = False
+
+    def upsert(self, ids, vectors, texts, metadatas):
+        self._pending.append((ids, vectors, texts, metadatas))
+
+    def delete(self, ids):
+        self.store.delete(ids)
+        self._deleted = True
+
+    def finish(self):
+        if self._pending:
+            ids, vectors, texts, metadatas = ([x for batch in self._pending for x in batch[i]] for i in range(4))
+            self.store.add_vectors(vectors, texts, metadatas, ids)
+        if self._pending or self._deleted or not self.store.exists(self.store.directory):
+            self.store.save()
+
+
+def ingest(data, embeddings, target, manifest_path, workers=INGEST_WORKERS):
+    """ Bring the index in line with the PDFs in ``data``, touching only what changed.
+
+    Changed PDFs are parsed in a process pool and their chunks are embedded as
+    they arrive, EMBED_BATCH_SIZE at a time, skipping chunks already indexed.
+    New vectors are upserted UPSERT_BATCH_SIZE at a time, and vectors of chunks
+    that disappeared (edited or removed files) are deleted. The manifest of file
+    and chunk hashes is only written once everything is stored, so an interrupted
+    run simply redoes its files next time.
+    """
+    started = time.perf_counter()
+    manifest = load_manifest(manifest_path)
+    changed, removed, hashes = diff_files(data, manifest)
+    stats = {"files": len(hashes), "parsed": len(changed), "removed": len(removed), "embedded": 0, "deleted": 0}
+
+    pending = []
+    stale = [i for path in removed for i in manifest[path]["chunks"]]
+
+    def flush(force=False):
+        while pending and (force or len(pending) >= UPSERT_BATCH_SIZE):
+            batch = pending[:UPSERT_BATCH_SIZE]
+            del pending[:len(batch)]
+            vectors = []
+            for start in range(0, len(batch), EMBED_BATCH_SIZE):
+                vectors += embeddings.embed_documents([text for _, text, _ in batch[start:start + EMBED_BATCH_SIZE]])
+            target.upsert([i for i, _, _ in batch], vectors, [t for _, t, _ in batch], [m for _, _, m in batch])
+            stats["embedded"] += len(batch)
+
+    if changed:
+        with ProcessPoolExecutor(max_workers=min(workers, len(changed))) as pool:
+            for future in as_completed([pool.submit(parse_pdf, path) for path in changed]):
+                path, chunks = future.result()
+                known = set(manifest.get(path, {}).get("chunks", []))
+                ids = list(dict.fromkeys(i for i, _, _ in chunks))
+                seen = set(known)
+                for i, text, metadata in chunks:
+                    if i not in seen:
+                        seen.add(i)
+                        pending.append((i, text, metadata))
+                current = set(ids)
+                stale += [i for i in known if i not in current]
+                manifest[path] = {"sha256": hashes[path], "chunks": ids}
+                flush()
+    flush(force=True)
+
+    if stale:
+        target.delete(stale)
+        stats["deleted"] = len(stale)
+    target.finish()
+
+    for path in removed:
+        del manifest[path]
+    save_manifest(manifest_path, manifest)
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
@@ -0,0 +1,97 @@
+from langchain.chains import create_retrieval_chain
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain_core.prompts import ChatPromptTemplate
+from src.cache import CachedEmbeddings, CachedRetriever, IndexVersion, LRUCache, SemanticCache, SEMANTIC_CACHE, RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL
+from src.helper import download_hugging_face_embeddings
+from src.prompt import system_prompt
+from src.vector_store import LocalVectorStore, load_vector_store
+import asyncio
+
+
+class RagService:
+    """ Retrieval chain and caches behind both the Flask app (app.py) and the ASGI app (asgi.py).
+
+    The embeddings, vector store and LLM are passed in, so the service runs
+    offline with fake embeddings and a fake LLM as well as with the real ones
+    built by create_service().
+    """
+
+    def __init__(self, embeddings, docsearch, llm, index_version=None, k=3, semantic_cache=SEMANTIC_CACHE):
+        self.embeddings = embeddings
+        self.index_version = index_version or IndexVersion()
+        # A rebuilt local index is reloaded before the cached retrievals are dropped
+        if isinstance(docsearch, LocalVectorStore):
+            self.index_version.on_change(docsearch.reload)
+
+        # Retrieved documents are cached per question until store_index.py re-upserts
+        self.retriever = CachedRetriever(
+            retriever=docsearch.as_retriever(search_type="similarity", search_kwargs={"k": k}),
+            cache=LRUCache(RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL),
+            index_version=self.index_version
+        )
+
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", system_prompt),
+                ("human", "{input}"),
+            ]
+        )
+        question_answer_chain = create_stuff_documents_chain(llm, prompt)
+        self.rag_chain = create_retrieval_chain(self.retriever, question_answer_chain)
+
+        # Optionally answer near-duplicate questions from earlier answers
+        self.answer_cache = SemanticCache(embeddings, self.index_version) if semantic_cache else None
+
+    def answer(self, msg):
+        answer = self.answer_cache.get(msg) if self.answer_cache else None
+        if answer is None:
+            answer = self.rag_chain.invoke({"input": msg})["answer"]
+            if self.answer_cache:
+                self.answer_cache.set(msg, answer)
+        return answer
+
+    async def aanswer(self, msg):
+        # Cache lookups embed the question, which is CPU work, so they run off the event loop
+        answer = await asyncio.to_thread(self.answer_cache.get, msg) if self.answer_cache else None
+        if answer is None:
+            answer = (await self.rag_chain.ainvoke({"input": msg}))["answer"]
+            if self.answer_cache:
+                await asyncio.to_thread(self.answer_cache.set, msg, answer)
+        return answer
+
+    async def astream(self, msg):
+        """ Yield ("context", documents) as soon as retrieval is done, then ("token", text) as the LLM writes """
+        if self.answer_cache:
+            answer = await asyncio.to_thread(self.answer_cache.get, msg)
+            if answer is not None:
+                yield "context", []
+                yield "token", answer
+                return
+
+        tokens = []
+        async for chunk in self.rag_chain.astream({"input": msg}):
+            if "context" in chunk:
+                yield "context", chunk["context"]
+            if chunk.get("answer"):
+                tokens.append(chunk["answer"])
+                yield "token", chunk["answer"]
+
+        if self.answer_cache and tokens:
+            await asyncio.to_thread(self.answer_cache.set, msg, "".join(tokens))
+
+    def stats(self):
+        query_cache = getattr(self.embeddings, "cache", None)
+        return {"query_embeddings": query_cache.stats() if query_cache else None, "retrieval": self.retriever.cache.stats(),
+                "answers": self.answer_cache.stats() if self.answer_cache else None}
+
+
+
+#Build the service from the configured embeddings, vector store (Pinecone or local) and OpenAI
+def create_service(index_name="medicalbot"):
+    from langchain_openai import OpenAI
+
+    # Query embeddings are cached by normalized text, so repeated questions skip the model
+    embeddings = CachedEmbeddings(download_hugging_face_embeddings())
+    docsearch = load_vector_store(index_name, embeddings)
+    llm = OpenAI(temperature=0.4, max_tokens=500)
+    return RagService(embeddings, docsearch, llm)
@@ -0,0 +1,282 @@
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from numpy.lib.format import open_memmap
+import numpy as np
+import json
+import os
+import shutil
+import uuid
+
+
+# "pinecone" (default) or "local", the in-process index below
+VECTOR_STORE = os.environ.get("VECTOR_STORE", "pinecone")
+LOCAL_INDEX_DIR = os.environ.get("LOCAL_INDEX_DIR", "vector_index")
+# "int8" stores vectors in a quarter of the space, scored with a per-row scale
+LOCAL_INDEX_QUANTIZE = os.environ.get("LOCAL_INDEX_QUANTIZE", "")
+# Corpora at least this large get an IVF index (k-means lists) so a query scans only IVF_NPROBE lists
+IVF_MIN_VECTORS = int(os.environ.get("IVF_MIN_VECTORS", "20000"))
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", "8"))
+
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+CENTROIDS_FILE = "centroids.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+META_FILE = "meta.json"
+# Names the subdirectory holding the current version of the index
+CURRENT_FILE = "CURRENT"
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+#Lloyd's k-means on unit vectors (spherical), seeded so the same corpus always gets the same lists
+def kmeans(vectors, n_lists, iterations=10, sample_size=256, seed=0):
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), n_lists * sample_size), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = sample[assignment == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+#One immutable snapshot of the index, swapped in whole so searches never see a half-loaded index
+class _Index:
+    def __init__(self, vectors, scales, documents, centroids=None, offsets=None):
+        self.vectors = vectors
+        self.scales = scales
+        self.documents = documents
+        self.centroids = centroids
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.documents)
+
+    def ranges(self, query, nprobe):
+        if self.centroids is None:
+            return [(0, len(self))]
+        lists = np.argsort(-(self.centroids @ query))[:nprobe]
+        return [tuple(self.offsets[i]) for i in lists]
+
+    def scores(self, start, end, query):
+        block = np.asarray(self.vectors[start:end])
+        if self.scales is None:
+            return block @ query
+        return (block.astype(np.float32) @ query) / self.scales[start:end]
+
+    def dense(self):
+        if self.scales is None:
+            return np.array(self.vectors, dtype=np.float32)
+        return np.asarray(self.vectors, dtype=np.float32) / self.scales[:, None]
+
+
+class LocalVectorStore(VectorStore):
+    """ In-process cosine index over unit-length vectors.
+
+    Vectors live in one matrix (float32, or int8 with a per-row scale),
+    memory-mapped from ``directory`` once saved. Large corpora are split into
+    k-means lists stored as contiguous row ranges, and a query scores the
+    IVF_NPROBE lists whose centroids are closest; small ones are scanned in full.
+
+    Each save writes a new version subdirectory and then atomically points
+    ``directory``/CURRENT at it, so processes still mapping the previous
+    version are never handed a half-written file.
+    """
+
+    def __init__(self, embedding, directory=LOCAL_INDEX_DIR, quantize=LOCAL_INDEX_QUANTIZE, nprobe=IVF_NPROBE):
+        self.embedding = embedding
+        self.directory = directory
+        self.quantize = quantize
+        self.nprobe = nprobe
+        self.index = _Index(np.empty((0, 0), np.float32), None, [])
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    @staticmethod
+    def exists(directory=LOCAL_INDEX_DIR):
+        """ Whether an index has been saved in ``directory`` """
+        return any(os.path.exists(os.path.join(directory, name)) for name in (CURRENT_FILE, META_FILE))
+
+    @classmethod
+    def load(cls, embedding, directory=LOCAL_INDEX_DIR, **kwargs):
+        store = cls(embedding, directory, **kwargs)
+        store.reload()
+        return store
+
+    def _current(self):
+        # Indexes saved before versioning keep their files directly in ``directory``
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE)) as f:
+                return os.path.join(self.directory, f.read().strip())
+        except FileNotFoundError:
+            return self.directory
+
+    def reload(self):
+        """ Re-open the saved index, e.g. after store_index.py rewrote it """
+        path = self._current()
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        with open(os.path.join(path, DOCUMENTS_FILE)) as f:
+            documents = [json.loads(line) for line in f]
+        vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        scales = np.load(os.path.join(path, SCALES_FILE)) if meta.get("quantize") == "int8" else None
+        centroids = np.load(os.path.join(path, CENTROIDS_FILE)) if meta.get("offsets") else None
+        if len(documents) != len(vectors):
+            raise ValueError(f"{path} has {len(documents)} documents but {len(vectors)} vectors")
+        self.quantize = meta.get("quantize", "")
+        self.index = _Index(vectors, scales, documents, centroids, meta.get("offsets"))
+
+    def save(self):
+        """ Write the index to a new version in ``directory``, rebuilding the IVF lists, and switch to it """
+        index = self.index
+        vectors = index.dense()
+        documents = index.documents
+        centroids, offsets = None, None
+
+        if len(vectors) >= IVF_MIN_VECTORS:
+            centroids = kmeans(vectors, int(np.sqrt(len(vectors))))
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            order = np.argsort(assignment, kind="stable")
+            vectors, documents, assignment = vectors[order], [documents[i] for i in order], assignment[order]
+            ends = np.searchsorted(assignment, np.arange(len(centroids)), side="right")
+            offsets = [[int(s), int(e)] for s, e in zip(np.concatenate([[0], ends[:-1]]), ends)]
+
+        previous = self._current()
+        version = f"v-{uuid.uuid4().hex}"
+        path = os.path.join(self.directory, version)
+        os.makedirs(path)
+        scales = None
+        if self.quantize == "int8":
+            scales = (127 / np.maximum(np.abs(vectors).max(axis=1), 1e-12)).astype(np.float32)
+            stored = open_memmap(os.path.join(path, VECTORS_FILE), mode="w+", dtype=np.int8, shape=vectors.shape)
+            stored[:] = np.round(vectors * scales[:, None]).astype(np.int8)
+            np.save(os.path.join(path, SCALES_FILE), scales)
+        else:
+            stored = open_memmap(os.path.join(path, VECTORS_FILE), mode="w+", dtype=np.float32, shape=vectors.shape)
+            stored[:] = vectors
+        stored.flush()
+        del stored
+        if centroids is not None:
+            np.save(os.path.join(path, CENTROIDS_FILE), centroids)
+
+        with open(os.path.join(path, DOCUMENTS_FILE), "w") as f:
+            for document in documents:
+                f.write(json.dumps(document) + "\n")
+        with open(os.path.join(path, META_FILE), "w") as f:
+            json.dump({"dimensions": int(vectors.shape[1]) if vectors.size else 0, "count": len(documents),
+                       "quantize": self.quantize, "offsets": offsets}, f)
+        self._publish(version, previous)
+        self.reload()
+
+    def _publish(self, version, previous):
+        # os.replace swaps CURRENT in one step, so readers see either the old version or the new one
+        pointer = os.path.join(self.directory, f"{CURRENT_FILE}.tmp-{uuid.uuid4().hex}")
+        with open(pointer, "w") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer, os.path.join(self.directory, CURRENT_FILE))
+
+        # The version just replaced stays for processes that have not reloaded yet, older ones are removed
+        # (a process still mapping a removed file keeps reading it until it reloads)
+        keep = {version, os.path.basename(previous)}
+        for name in os.listdir(self.directory):
+            if name.startswith("v-") and name not in keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        return self.add_vectors(self.embedding.embed_documents(texts), texts, metadatas, ids)
+
+    def add_vectors(self, vectors, texts, metadatas, ids):
+        """ Insert or replace (by id) already embedded texts; call save() to persist """
+        vectors = normalize_rows(vectors)
+        replaced = set(ids)
+        index = self.index
+        keep = [i for i, document in enumerate(index.documents) if document["id"] not in replaced]
+        existing = index.dense()[keep] if keep else np.empty((0, vectors.shape[1]), np.float32)
+        documents = [index.documents[i] for i in keep]
+        documents += [{"id": i, "text": t, "metadata": m} for i, t, m in zip(ids, texts, metadatas)]
+        self.index = _Index(np.vstack([existing, vectors]), None, documents)
+        return list(ids)
+
+    def delete(self, ids=None, **kwargs):
+        removed = set(ids or [])
+        index = self.index
+        keep = [i for i, document in enumerate(index.documents) if document["id"] not in removed]
+        self.index = _Index(index.dense()[keep], None, [index.documents[i] for i in keep])
+        return True
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None):
+        index = self.index
+        if not len(index):
+            return []
+        query = normalize_rows(embedding)
+        rows, scores = [], []
+        for start, end in index.ranges(query, self.nprobe):
+            rows.append(np.arange(start, end))
+            scores.append(index.scores(start, end, query))
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+
+        if filter:
+            # Metadata filters are applied in score order until k documents match
+            order = np.argsort(-scores, kind="stable")
+        elif len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+            order = top[np.argsort(-scores[top], kind="stable")]
+        else:
+            order = np.argsort(-scores, kind="stable")
+
+        results = []
+        for i in order:
+            document = index.documents[rows[i]]
+            if filter and any(document["metadata"].get(key) != value for key, value in filter.items()):
+                continue
+            results.append((Document(page_content=document["text"], metadata=document["metadata"], id=document["id"]),
+                            float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, directory=LOCAL_INDEX_DIR, **kwargs):
+        store = cls(embedding, directory, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        store.save()
+        return store
+
+
+
+#Open the configured vector store for querying
+def load_vector_store(index_name, embeddings):
+    if VECTOR_STORE == "local":
+        return LocalVectorStore.load(embeddings)
+    if VECTOR_STORE != "pinecone":
+        raise ValueError(f"Unknown VECTOR_STORE: {VECTOR_STORE}")
+
+    from langchain_pinecone import PineconeVectorStore
+    return PineconeVectorStore.from_existing_index(index_name=index_name, embedding=embeddings)
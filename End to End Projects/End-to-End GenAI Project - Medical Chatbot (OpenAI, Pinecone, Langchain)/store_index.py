@@ -1,40 +1,75 @@
-from src.helper import load_pdf_file, text_split, download_hugging_face_embeddings
-from pinecone.grpc import PineconeGRPC as Pinecone
-from pinecone import ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
+from src.helper import download_hugging_face_embeddings, EMBEDDING_MODEL, EMBEDDING_BACKEND
+from src.cache import IndexVersion
+from src.ingest import LocalTarget, PineconeTarget, ingest
+from src.vector_store import LocalVectorStore, LOCAL_INDEX_DIR, VECTOR_STORE
 from dotenv import load_dotenv
+import logging
 import os
 
+try:
+    from embedding_cache import cache_embeddings
+except ModuleNotFoundError as e:
+    if e.name != "embedding_cache":
+        raise
+    logging.getLogger(__name__).warning("embedding_cache is not installed, every chunk is embedded")
 
-load_dotenv()
+    def cache_embeddings(embeddings, model_id=None):
+        return embeddings
 
-PINECONE_API_KEY=os.environ.get('PINECONE_API_KEY')
-os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
 
+load_dotenv()
 
-extracted_data=load_pdf_file(data='Data/')
-text_chunks=text_split(extracted_data)
-embeddings = download_hugging_face_embeddings()
 
+# Chunks embedded by an earlier build (of this or any other index) are read from the on-disk cache
+embeddings = cache_embeddings(download_hugging_face_embeddings(), model_id=f"{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}")
 
-pc = Pinecone(api_key=PINECONE_API_KEY)
 
 index_name = "medicalbot"
 
+# Hashes of the files and chunks already in the index, so only what changed is re-embedded
+manifest_path = os.environ.get("INDEX_MANIFEST", "index_manifest.json")
+
+
+if __name__ == "__main__":
+    if VECTOR_STORE == "local":
+        # The local index keeps its manifest inside it, so deleting the directory starts over
+        manifest_path = os.path.join(LOCAL_INDEX_DIR, "manifest.json")
+        if LocalVectorStore.exists(LOCAL_INDEX_DIR):
+            docsearch = LocalVectorStore.load(embeddings)
+        else:
+            docsearch = LocalVectorStore(embeddings)
+        target = LocalTarget(docsearch)
+    else:
+        from pinecone.grpc import PineconeGRPC as Pinecone
+        from pinecone import ServerlessSpec
+
+        PINECONE_API_KEY=os.environ.get('PINECONE_API_KEY')
+        os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
+
+        pc = Pinecone(api_key=PINECONE_API_KEY)
+
+        # Create the index on the first run only; a new index has none of the manifest's vectors
+        if index_name not in pc.list_indexes().names():
+            pc.create_index(
+                name=index_name,
+                dimension=384, 
+                metric="cosine", 
+                spec=ServerlessSpec(
+                    cloud="aws", 
+                    region="us-east-1"
+                ) 
+            ) 
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+        target = PineconeTarget(pc.Index(index_name))
+
+    # Parse new and changed PDFs in parallel, embed and upsert their new chunks, delete vectors of removed ones
+    stats = ingest('Data/', embeddings, target, manifest_path)
+    print(stats)
+    if hasattr(embeddings, "stats"):
+        print(embeddings.stats())
 
-pc.create_index(
-    name=index_name,
-    dimension=384, 
-    metric="cosine", 
-    spec=ServerlessSpec(
-        cloud="aws", 
-        region="us-east-1"
-    ) 
-) 
-
-# Embed each chunk and upsert the embeddings into your Pinecone index.
-docsearch = PineconeVectorStore.from_documents(
-    documents=text_chunks,
-    index_name=index_name,
-    embedding=embeddings, 
-)
+    # Tell running apps to reload and drop what they cached from the old index; ingest() has already
+    # swapped the new version in, so they never see it half written
+    if stats["embedded"] or stats["deleted"]:
+        IndexVersion.bump()
@@ -1,11 +1,12 @@
 from langchain.vectorstores import Chroma
-from src.helper import load_embedding
+from src.helper import load_embedding, cache_embeddings
 from dotenv import load_dotenv
 import os
-from src.helper import repo_ingestion
-from flask import Flask, render_template, jsonify, request
+import uuid
+from src.jobs import IndexingJobManager, current_db_directory
+from src.memory import SessionMemory
+from flask import Flask, render_template, jsonify, request, make_response
 from langchain.chat_models import ChatOpenAI
-from langchain.memory import ConversationSummaryMemory
 from langchain.chains import ConversationalRetrievalChain
 
 
@@ -20,15 +21,33 @@ os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
 
 embeddings = load_embedding()
-persist_directory = "db"
+persist_directory = current_db_directory("db")
 # Now we can load the persisted database from disk, and use it as normal.
 vectordb = Chroma(persist_directory=persist_directory,
                   embedding_function=embeddings)
 
 
 llm = ChatOpenAI()
-memory = ConversationSummaryMemory(llm=llm, memory_key = "chat_history", return_messages=True)
-qa = ConversationalRetrievalChain.from_llm(llm, retriever=vectordb.as_retriever(search_type="mmr", search_kwargs={"k":8}), memory=memory)
+# Each browser session has its own history; old turns are summarized off the request path
+memory = SessionMemory(llm)
+
+
+#The chain holds no memory, the session's history is passed in with each question
+def build_qa(vectordb):
+    return ConversationalRetrievalChain.from_llm(llm, retriever=vectordb.as_retriever(search_type="mmr", search_kwargs={"k":8}))
+
+
+qa = build_qa(vectordb)
+
+
+#Called by the indexing worker once a new collection is complete; requests already running keep the old chain
+def swap_index(new_vectordb):
+    global qa
+    qa = build_qa(new_vectordb)
+
+
+# Indexing jobs read chunks embedded by earlier builds from the on-disk cache
+indexing = IndexingJobManager(cache_embeddings(embeddings), on_ready=swap_index, db_root="db", repo_path="repo/")
 
 
 
@@ -39,15 +58,29 @@ def index():
 
 
 
-@app.route('/chatbot', methods=["GET", "POST"])
+@app.route('/chatbot', methods=["POST"])
 def gitRepo():
+    user_input = request.form['question']
+    # Cloning and embedding run in the background, the client polls the job
+    job = indexing.submit(user_input)
+
+    return jsonify({"response": str(user_input), "job_id": job.id, "status": job.status,
+                    "status_url": f"/jobs/{job.id}"}), 202
+
+
 
-    if request.method == 'POST':
-        user_input = request.form['question']
-        repo_ingestion(user_input)
-        os.system("python store_index.py")
+@app.route('/jobs/<job_id>', methods=["GET"])
+def job_status(job_id):
+    job = indexing.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job.as_dict())
 
-    return jsonify({"response": str(user_input) })
+
+
+@app.route('/jobs', methods=["GET"])
+def jobs():
+    return jsonify(indexing.list())
 
 
 
@@ -57,16 +90,25 @@ def chat():
     msg = request.form["msg"]
     input = msg
     print(input)
+    session_id = request.cookies.get("session_id") or uuid.uuid4().hex
 
     if input == "clear":
-        os.system("rm -rf repo")
+        # The clones are in use while a repository is being indexed
+        if not indexing.remove_clones():
+            return "An indexing job is still running, send clear again once it is done.", 409
+        memory.clear(session_id)
 
-    result = qa(input)
+    result = qa({"question": input, "chat_history": memory.history(session_id)})
+    memory.add_turn(session_id, input, result["answer"])
     print(result['answer'])
-    return str(result["answer"])
+
+    response = make_response(str(result["answer"]))
+    response.set_cookie("session_id", session_id, max_age=int(memory.ttl), httponly=True, samesite="Lax")
+    return response
 
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0",port=8080,debug=True)
+    # The reloader would start a second indexing worker
+    app.run(host="0.0.0.0",port=8080,debug=os.environ.get("FLASK_DEBUG") == "1", use_reloader=False)
 
 
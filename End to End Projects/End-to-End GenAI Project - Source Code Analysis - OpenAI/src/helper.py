@@ -1,17 +1,91 @@
 import os
-from git import Repo
+import logging
+import shutil
+import hashlib
+from git import Repo, GitCommandError
+from langchain.document_loaders.blob_loaders import Blob
 from langchain.document_loaders.generic import GenericLoader
 from langchain.document_loaders.parsers import LanguageParser
 from langchain.text_splitter import Language
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain.vectorstores import Chroma
 
+try:
+    from embedding_cache import cache_embeddings
+except ModuleNotFoundError as e:
+    if e.name != "embedding_cache":
+        raise
+    logging.getLogger(__name__).warning("embedding_cache is not installed, every chunk is embedded")
 
-#clone any github repositories 
-def repo_ingestion(repo_url):
-    os.makedirs("repo", exist_ok=True)
-    repo_path = "repo/"
-    Repo.clone_from(repo_url, to_path=repo_path)
+    def cache_embeddings(embeddings, model_id=None):
+        return embeddings
+
+
+#Each repository gets its own clone directory, so switching between repos does not re-clone them
+def repo_key(repo_url):
+    return hashlib.sha256(repo_url.encode()).hexdigest()[:12]
+
+
+
+
+#Bringing a clone up to date: a shallow, blobless clone the first time, after that a fetch of the new tip only
+def sync_repo(repo_url, repo_path):
+    if os.path.isdir(os.path.join(repo_path, ".git")):
+        repo = Repo(repo_path)
+        if repo.remotes.origin.url == repo_url:
+            repo.git.fetch("--depth=1", "origin", "HEAD")
+            repo.git.reset("--hard", "FETCH_HEAD")
+            return repo
+        shutil.rmtree(repo_path)
+    return Repo.clone_from(repo_url, to_path=repo_path, depth=1, multi_options=["--filter=blob:none"])
+
+
+
+
+#Python files in the checked out commit
+def repo_files(repo, suffix=".py"):
+    return [path for path in repo.git.ls_files().splitlines() if path.endswith(suffix)]
+
+
+
+
+#Whether a commit can be read in the clone. A shallow clone only has the tips it fetched, and git
+#fetches other commits from origin on demand (the clone is blobless), so this is False when neither has it
+def has_commit(repo, commit):
+    try:
+        repo.git.cat_file("-e", f"{commit}^{{commit}}")
+    except GitCommandError:
+        return False
+    return True
+
+
+
+
+#Python files changed and removed between two commits, both of which must be in the clone
+def changed_files(repo, old_commit, new_commit, suffix=".py"):
+    output = repo.git.diff("--name-status", "--no-renames", old_commit, new_commit)
+    changed, removed = [], []
+    for line in output.splitlines():
+        status, path = line.split("\t", 1)
+        if path.endswith(suffix):
+            (removed if status == "D" else changed).append(path)
+    return changed, removed
+
+
+
+
+#Loading a single file of a repository as documents, parsed like load_repo does
+def load_file(repo_path, path):
+    parser = LanguageParser(language=Language.PYTHON, parser_threshold=500)
+    return parser.parse(Blob.from_path(os.path.join(repo_path, path)))
+
+
+
+
+#Chunk ids are content hashes, so an unchanged chunk keeps its id and its vector
+def chunk_id(path, text):
+    return hashlib.sha256(f"{path}\n{text}".encode()).hexdigest()
 
 
 
@@ -47,3 +121,18 @@ def text_splitter(documents):
 def load_embedding():
     embeddings=OpenAIEmbeddings(disallowed_special=())
     return embeddings
+
+
+
+
+#Embedding the chunks into a Chroma collection, a batch at a time so progress can be reported
+def build_vectordb(text_chunks, embeddings, persist_directory, batch_size=100, progress=None, ids=None, delete_ids=None):
+    vectordb = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+    if delete_ids:
+        vectordb.delete(ids=delete_ids)
+    for start in range(0, len(text_chunks), batch_size):
+        vectordb.add_documents(text_chunks[start:start + batch_size], ids=ids[start:start + batch_size] if ids else None)
+        if progress:
+            progress(min(start + batch_size, len(text_chunks)), len(text_chunks))
+    vectordb.persist()
+    return vectordb
@@ -0,0 +1,211 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from src.helper import repo_key, sync_repo, repo_files, has_commit, changed_files, load_file, text_splitter, chunk_id, build_vectordb
+
+
+# Name of the file in db/ naming the collection the app should serve
+CURRENT_FILE = "CURRENT"
+# Per repository URL: the last indexed commit, its collection and the chunk ids of every file
+REGISTRY_FILE = "repos.json"
+MAX_JOBS = int(os.environ.get("INDEX_MAX_JOBS", "100"))
+
+
+#Directory of the collection to serve: the last one a job built, or db/ itself as written by store_index.py
+def current_db_directory(db_root="db"):
+    try:
+        with open(os.path.join(db_root, CURRENT_FILE)) as f:
+            return os.path.join(db_root, f.read().strip())
+    except OSError:
+        return db_root
+
+
+
+def load_registry(db_root="db"):
+    try:
+        with open(os.path.join(db_root, REGISTRY_FILE)) as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+#Replace a file in db/ in one step, so a crash never leaves half of it
+def write_atomic(path, text):
+    with open(f"{path}.tmp", "w") as f:
+        f.write(text)
+    os.replace(f"{path}.tmp", path)
+
+
+
+class IndexingJob:
+    def __init__(self, repo_url):
+        self.id = uuid.uuid4().hex[:12]
+        self.repo_url = repo_url
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = "Waiting for earlier jobs"
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def update(self, status, progress, message):
+        self.status = status
+        self.progress = round(progress, 3)
+        self.message = message
+
+    def as_dict(self):
+        return {"job_id": self.id, "repo_url": self.repo_url, "status": self.status, "progress": self.progress,
+                "message": self.message, "error": self.error, "created_at": self.created_at, "finished_at": self.finished_at}
+
+
+
+class IndexingJobManager:
+    """ Clones and indexes repositories on a background thread, one job at a time.
+
+    Indexing is keyed by (repo URL, commit). The first job for a repository
+    makes a shallow, blobless clone and embeds every Python file. Later jobs
+    fetch the new tip, diff it against the last indexed commit, and re-parse
+    only the changed files; of those, only chunks not already indexed are
+    embedded, and vectors of removed files and chunks are deleted.
+
+    The update is applied to a copy of the repository's collection under
+    ``db_root`` while the app keeps answering from the current one. When it is
+    complete, ``on_ready(vectordb)`` swaps it in, db/CURRENT is pointed at it so
+    a restart serves it too, and collections no longer needed are removed.
+    """
+
+    def __init__(self, embeddings, on_ready, db_root="db", repo_path="repo/"):
+        self.embeddings = embeddings
+        self.on_ready = on_ready
+        self.db_root = db_root
+        self.repo_path = repo_path
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="indexing")
+
+    def submit(self, repo_url):
+        job = IndexingJob(repo_url)
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs
+            while len(self._jobs) > MAX_JOBS:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.finished_at is None:
+                    break
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return [job.as_dict() for job in reversed(self._jobs.values())]
+
+    def active(self):
+        """ Whether a job is queued or running """
+        with self._lock:
+            return any(job.finished_at is None for job in self._jobs.values())
+
+    def remove_clones(self):
+        """ Delete the cloned repositories, unless a job is queued or running; returns whether they were deleted """
+        # Holding the lock keeps a new job from being submitted while the clones are removed
+        with self._lock:
+            if any(job.finished_at is None for job in self._jobs.values()):
+                return False
+            shutil.rmtree(self.repo_path, ignore_errors=True)
+            return True
+
+    def _run(self, job):
+        try:
+            os.makedirs(self.db_root, exist_ok=True)
+            registry = load_registry(self.db_root)
+            base = registry.get(job.repo_url)
+            if base and not os.path.isdir(os.path.join(self.db_root, base["collection"])):
+                base = None
+
+            job.update("fetching" if base else "cloning", 0.05, f"{'Fetching' if base else 'Cloning'} {job.repo_url}")
+            clone_path = os.path.join(self.repo_path, repo_key(job.repo_url))
+            repo = sync_repo(job.repo_url, clone_path)
+            commit = repo.head.commit.hexsha
+
+            files = dict(base["files"]) if base else {}
+            if base and has_commit(repo, base["commit"]):
+                changed, removed = changed_files(repo, base["commit"], commit)
+            else:
+                # First index, or the last indexed commit is gone from the clone and from origin (e.g. after a force push):
+                # every file is re-parsed, but chunks already in the collection are still not re-embedded
+                if base:
+                    job.update("parsing", 0.1, f"{base['commit'][:7]} is no longer available, re-parsing every file")
+                current = repo_files(repo)
+                changed, removed = current, [path for path in files if path not in set(current)]
+
+            new_chunks, new_ids, stale = [], [], []
+            for path in removed:
+                stale += files.pop(path, [])
+            for n, path in enumerate(changed):
+                job.update("parsing", 0.1 + 0.2 * n / len(changed), f"Parsing {n + 1} of {len(changed)} changed files")
+                if not os.path.exists(os.path.join(clone_path, path)):
+                    stale += files.pop(path, [])
+                    continue
+                known = set(files.get(path, []))
+                ids = []
+                for chunk in text_splitter(load_file(clone_path, path)):
+                    i = chunk_id(path, chunk.page_content)
+                    if i in ids:
+                        continue
+                    ids.append(i)
+                    if i not in known:
+                        new_chunks.append(chunk)
+                        new_ids.append(i)
+                stale += [i for i in known if i not in set(ids)]
+                files[path] = ids
+
+            previous = current_db_directory(self.db_root)
+            if base and not new_chunks and not stale:
+                # Nothing to embed or delete: serve the repository's collection as it is
+                name = base["collection"]
+                if name != os.path.basename(previous):
+                    job.update("swapping", 0.97, "Switching to the existing index")
+                    self._swap(name, build_vectordb([], self.embeddings, os.path.join(self.db_root, name)))
+            else:
+                # Embedding dominates, so it gets most of the progress bar
+                def embedded(done, total):
+                    job.update("embedding", 0.3 + 0.65 * done / total, f"Embedded {done} of {total} new chunks")
+
+                name = f"index-{job.id}"
+                if base:
+                    shutil.copytree(os.path.join(self.db_root, base["collection"]), os.path.join(self.db_root, name))
+                job.update("embedding", 0.3, f"Embedding {len(new_chunks)} new chunks")
+                vectordb = build_vectordb(new_chunks, self.embeddings, os.path.join(self.db_root, name),
+                                          progress=embedded, ids=new_ids, delete_ids=stale)
+                job.update("swapping", 0.97, "Switching to the new index")
+                self._swap(name, vectordb)
+
+            registry[job.repo_url] = {"commit": commit, "collection": name, "files": files}
+            write_atomic(os.path.join(self.db_root, REGISTRY_FILE), json.dumps(registry))
+            self._remove_old_collections(keep={name, os.path.basename(previous)} | {r["collection"] for r in registry.values()})
+
+            job.update("done", 1.0, f"Indexed {commit[:7]}: {len(changed)} files changed, {len(removed)} removed, "
+                                    f"{len(new_chunks)} chunks embedded, {len(stale)} deleted")
+        except Exception as e:
+            job.error = str(e)
+            job.update("failed", job.progress, "Indexing failed")
+        finally:
+            job.finished_at = time.time()
+
+    def _swap(self, name, vectordb):
+        self.on_ready(vectordb)
+        write_atomic(os.path.join(self.db_root, CURRENT_FILE), name)
+
+    def _remove_old_collections(self, keep):
+        # The previous collection stays, requests that started before the swap may still be reading it
+        for name in os.listdir(self.db_root):
+            if name.startswith("index-") and name not in keep:
+                shutil.rmtree(os.path.join(self.db_root, name), ignore_errors=True)
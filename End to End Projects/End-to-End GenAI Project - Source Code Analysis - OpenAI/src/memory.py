@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from langchain.memory import ConversationSummaryMemory
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+
+# Sessions idle for longer than SESSION_TTL seconds are dropped, and at most MAX_SESSIONS are kept
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "3600"))
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "1000"))
+# Turns kept word for word; older ones are folded into the session's summary in the background
+RECENT_TURNS = int(os.environ.get("RECENT_TURNS", "4"))
+SUMMARY_WORKERS = int(os.environ.get("SUMMARY_WORKERS", "2"))
+
+
+class Session:
+    def __init__(self):
+        self.summary = ""
+        self.turns = []
+        self.summarizing = False
+        self.last_used = time.time()
+
+
+
+class SessionMemory:
+    """ Chat history per session: a running summary plus the last RECENT_TURNS turns.
+
+    Sessions live in an LRU store bounded by ``max_sessions`` and expire after
+    ``ttl`` idle seconds. When a session has more than ``recent_turns`` turns,
+    the older ones are summarized on a background thread (with LangChain's
+    summary prompt), so answering a question never waits for the summary.
+    """
+
+    def __init__(self, llm, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL, recent_turns=RECENT_TURNS, workers=SUMMARY_WORKERS):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.recent_turns = recent_turns
+        self._summarizer = ConversationSummaryMemory(llm=llm)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summary")
+
+    def _session(self, session_id):
+        # Called with the lock held; sessions are in order of last use, so expired ones are at the front
+        now = time.time()
+        while self._sessions and now - next(iter(self._sessions.values())).last_used > self.ttl:
+            self._sessions.popitem(last=False)
+        session = self._sessions.get(session_id)
+        if session is None:
+            if len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+            session = self._sessions[session_id] = Session()
+        self._sessions.move_to_end(session_id)
+        session.last_used = now
+        return session
+
+    def history(self, session_id):
+        """ chat_history for ConversationalRetrievalChain: the summary, then the recent turns """
+        with self._lock:
+            session = self._session(session_id)
+            messages = [SystemMessage(content=session.summary)] if session.summary else []
+            for question, answer in session.turns:
+                messages += [HumanMessage(content=question), AIMessage(content=answer)]
+            return messages
+
+    def add_turn(self, session_id, question, answer):
+        with self._lock:
+            session = self._session(session_id)
+            session.turns.append((question, answer))
+            self._schedule_summary(session)
+
+    def _schedule_summary(self, session):
+        # Called with the lock held; one summary at a time per session
+        if len(session.turns) <= self.recent_turns or session.summarizing:
+            return
+        session.summarizing = True
+        self._executor.submit(self._summarize, session, session.turns[:-self.recent_turns], session.summary)
+
+    def _summarize(self, session, old_turns, summary):
+        try:
+            messages = []
+            for question, answer in old_turns:
+                messages += [HumanMessage(content=question), AIMessage(content=answer)]
+            new_summary = self._summarizer.predict_new_summary(messages, summary)
+            with self._lock:
+                # Turns are only appended, so the summarized ones are still at the front
+                if session.turns[:len(old_turns)] == old_turns:
+                    session.summary = new_summary
+                    del session.turns[:len(old_turns)]
+        except Exception as e:
+            # The turns stay verbatim and are summarized with the next ones
+            print(f"Summarizing chat history failed: {e}")
+            with self._lock:
+                session.summarizing = False
+            return
+        with self._lock:
+            session.summarizing = False
+            # Turns added while this summary was written
+            self._schedule_summary(session)
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, "ttl": self.ttl}
@@ -1,4 +1,5 @@
-from src.helper import repo_ingestion, load_repo, text_splitter, load_embedding
+from src.helper import load_repo, text_splitter, load_embedding, cache_embeddings
+from src.jobs import CURRENT_FILE
 from dotenv import load_dotenv
 from langchain.vectorstores import Chroma
 import os
@@ -12,10 +13,15 @@ os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
 documents = load_repo("repo/")
 text_chunks = text_splitter(documents)
-embeddings = load_embedding()
+# Chunks embedded by an earlier build are read from the on-disk cache
+embeddings = cache_embeddings(load_embedding())
 
 
 
 #storing vector in choramdb
 vectordb = Chroma.from_documents(text_chunks, embedding=embeddings, persist_directory='./db')
-vectordb.persist()
\ No newline at end of file
+vectordb.persist()
+
+# Serve this collection rather than one built by an earlier indexing job
+if os.path.exists(os.path.join('db', CURRENT_FILE)):
+    os.remove(os.path.join('db', CURRENT_FILE))
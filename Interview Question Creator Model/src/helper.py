@@ -8,9 +8,20 @@ from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
 from langchain.chains import RetrievalQA
 import os
+import logging
 from dotenv import load_dotenv
 from src.prompt import *
 
+try:
+    from embedding_cache import cache_embeddings
+except ModuleNotFoundError as e:
+    if e.name != "embedding_cache":
+        raise
+    logging.getLogger(__name__).warning("embedding_cache is not installed, every chunk is embedded")
+
+    def cache_embeddings(embeddings, model_id=None):
+        return embeddings
+
 
 # OpenAI authentication
 load_dotenv()
@@ -83,7 +94,8 @@ def llm_pipeline(file_path):
 
     ques = ques_gen_chain.run(document_ques_gen)
 
-    embeddings = OpenAIEmbeddings()
+    # Chunks of a PDF uploaded before are read from the on-disk cache instead of being embedded again
+    embeddings = cache_embeddings(OpenAIEmbeddings())
 
     vector_store = FAISS.from_documents(document_answer_gen, embeddings)
 
@@ -1,55 +1,91 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-import requests
 import os
-import json
+import sys
 
-app = FastAPI()
+# Make the shared Ollama helpers importable when running from this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ollama_common.admission import AdmissionController, PRIORITY_NORMAL, install_admission
+from ollama_common.client import OllamaClient, OllamaError
+from ollama_common.metrics import install_metrics
+from ollama_common.sessions import SessionStore
+from ollama_common.streaming import stream_response
+from ollama_common.warmup import ModelKeeper, install_readiness
+
+MODEL_NAME = "mistral"  # Change to "llama3" if preferred
+
+# One pooled Ollama client per process, shared by every request
+ollama = OllamaClient()
+
+# Preload the model on startup and keep it resident between requests
+keeper = ModelKeeper(ollama, MODEL_NAME)
+
+# Bounded, prioritised admission queue in front of the Ollama calls
+admission = AdmissionController()
+admission.register("/chat", priority=PRIORITY_NORMAL)
+
+# Multi-turn conversations reuse Ollama's context tokens instead of resending the history
+sessions = SessionStore()
+
+@asynccontextmanager
+async def lifespan(app):
+    keeper.start()
+    yield
+    await keeper.stop()
+    await ollama.close()
+
+app = FastAPI(lifespan=lifespan)
+install_admission(app, admission)
+install_metrics(app)
+install_readiness(app, keeper)
 
 # Serve frontend files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Ollama settings
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MODEL_NAME = "mistral"  # Change to "llama3" if preferred
-
 @app.get("/")
 def serve_homepage():
     """ Serve the index.html file when accessing the root URL """
     return FileResponse(os.path.join("static", "index.html"))
 
 @app.post("/chat")
-def chat(prompt: str = Query(..., description="User prompt for AI model")):
-    headers = {"Content-Type": "application/json"}
+async def chat(prompt: str = Query(..., description="User prompt for AI model"), stream: bool = Query(False, description="Stream tokens as Server-Sent Events"),
+               session_id: str = Query(None, description="Conversation to continue, a new one with a server-chosen id is started if omitted, unknown or expired")):
+    session = sessions.get_or_create(session_id)
 
-    try:
-        # Send request to Ollama
-        response = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL_NAME, "prompt": prompt, "stream": False},
-            headers=headers
-        )
-
-        # Log the response for debugging
-        print("Ollama Response:", response.text)
-
-        # Ensure valid JSON response
-        response_data = response.text.strip()
+    # Relay tokens as Server-Sent Events when the client asks for streaming
+    if stream:
         try:
-            json_response = json.loads(response_data)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail=f"Invalid JSON response from Ollama: {response_data}")
+            response = await stream_response(sessions.stream_turn(session, lambda options: admission.admit_stream(
+                "/chat", ollama.generate_stream(MODEL_NAME, prompt, affinity=session.id, **options))))
+        except OllamaError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        response.headers["X-Session-Id"] = session.id
+        return response
 
-        # Extract AI-generated response
-        ai_response = json_response.get("response")
-        if not ai_response:
-            raise HTTPException(status_code=500, detail="No valid response received from Ollama")
-
-        return {"response": ai_response}
-
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Request to Ollama failed: {str(e)}")
+    try:
+        # Send request to Ollama, continuing from the previous turn's context
+        async with session.lock:
+            async with admission.admit("/chat"):
+                json_response = await ollama.generate(MODEL_NAME, prompt, affinity=session.id, **sessions.options(session))
+            sessions.update(session, json_response.get("context"))
+    except OllamaError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Extract AI-generated response
+    ai_response = json_response.get("response")
+    if not ai_response:
+        raise HTTPException(status_code=500, detail="No valid response received from Ollama")
+
+    return {"response": ai_response, "session_id": session.id}
+
+@app.delete("/chat/{session_id}")
+def end_session(session_id: str):
+    """ Forget a conversation and free its context """
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown session")
+    return {"deleted": session_id}
 
 # Run the API server
 if __name__ == "__main__":
@@ -1,27 +1,52 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Form
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-import requests
 import os
-import json
+import sys
 
-app = FastAPI()
+# Make the shared Ollama helpers importable when running from this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ollama_common.admission import AdmissionController, PRIORITY_NORMAL, install_admission
+from ollama_common.client import OllamaClient, OllamaError
+from ollama_common.metrics import install_metrics
+from ollama_common.streaming import stream_response
+from ollama_common.warmup import ModelKeeper, install_readiness
+
+MODEL_NAME = "codellama"  # Using CodeLlama for code generation & debugging
+
+# One pooled Ollama client per process, shared by every request
+ollama = OllamaClient()
+
+# Preload the model on startup and keep it resident between requests
+keeper = ModelKeeper(ollama, MODEL_NAME)
+
+# Bounded, prioritised admission queue in front of the Ollama calls
+admission = AdmissionController()
+admission.register("/generate_code", priority=PRIORITY_NORMAL)
+
+@asynccontextmanager
+async def lifespan(app):
+    keeper.start()
+    yield
+    await keeper.stop()
+    await ollama.close()
+
+app = FastAPI(lifespan=lifespan)
+install_admission(app, admission)
+install_metrics(app)
+install_readiness(app, keeper)
 
 # Serve static files (HTML, CSS, JS)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MODEL_NAME = "codellama"  # Using CodeLlama for code generation & debugging
-
 @app.get("/")
 def serve_homepage():
     """ Serve the index.html file when accessing the root URL """
     return FileResponse(os.path.join("static", "index.html"))
 
 @app.post("/generate_code")
-def generate_code(prompt: str = Form(...), mode: str = Form(...)):
-    headers = {"Content-Type": "application/json"}
-    
+async def generate_code(prompt: str = Form(...), mode: str = Form(...), stream: bool = Form(False)):
     # Define prompts based on mode (generate or debug)
     if mode == "generate":
         full_prompt = f"Write a clean, well-documented {prompt} code snippet."
@@ -30,30 +55,23 @@ def generate_code(prompt: str = Form(...), mode: str = Form(...)):
     else:
         raise HTTPException(status_code=400, detail="Invalid mode selected.")
 
-    try:
-        # Send the request to Ollama
-        response = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL_NAME, "prompt": full_prompt, "stream": False},
-            headers=headers
-        )
-
-        # Log the response for debugging
-        print("Ollama Response:", response.text)
-
-        # Ensure valid JSON response
-        response_data = response.text.strip()
+    # Relay tokens as Server-Sent Events when the client asks for streaming
+    if stream:
         try:
-            json_response = json.loads(response_data)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail=f"Invalid JSON response from Ollama: {response_data}")
+            return await stream_response(admission.admit_stream("/generate_code", ollama.generate_stream(MODEL_NAME, full_prompt)))
+        except OllamaError as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-        # Extract the generated or debugged code
-        generated_code = json_response.get("response", "No valid response received.")
-        return {"code": generated_code}
+    try:
+        # Send the request to Ollama
+        async with admission.admit("/generate_code"):
+            json_response = await ollama.generate(MODEL_NAME, full_prompt)
+    except OllamaError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Request to Ollama failed: {str(e)}")
+    # Extract the generated or debugged code
+    generated_code = json_response.get("response", "No valid response received.")
+    return {"code": generated_code}
 
 # Run the API server
 if __name__ == "__main__":
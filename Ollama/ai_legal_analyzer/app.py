@@ -1,53 +1,87 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Form
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-import requests
 import os
-import json
+import sys
+
+# Make the shared Ollama helpers importable when running from this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ollama_common.admission import AdmissionController, PRIORITY_NORMAL, install_admission
+from ollama_common.cache import ResponseCache
+from ollama_common.client import OllamaClient, OllamaError
+from ollama_common.legal import ContractAnalyzer, LEGAL_CACHE_DB, LEGAL_CACHE_TTL, split_clauses
+from ollama_common.metrics import install_metrics
+from ollama_common.streaming import sse_response, stream_response
+from ollama_common.warmup import ModelKeeper, install_readiness
 
-app = FastAPI()
+MODEL_NAME = "phi"  # Using Phi-2 for legal document analysis
+
+# One pooled Ollama client per process, shared by every request
+ollama = OllamaClient()
+
+# Preload the model on startup and keep it resident between requests
+keeper = ModelKeeper(ollama, MODEL_NAME)
+
+# Bounded, prioritised admission queue in front of the Ollama calls
+admission = AdmissionController()
+admission.register("/analyze_legal_text", priority=PRIORITY_NORMAL)
+
+# Long contracts are analysed clause by clause; chunk results are cached so amended drafts only re-run changed sections
+cache = ResponseCache(ttl=LEGAL_CACHE_TTL, db_path=LEGAL_CACHE_DB, name="legal")
+analyzer = ContractAnalyzer(ollama, admission, cache, MODEL_NAME, "/analyze_legal_text")
+
+@asynccontextmanager
+async def lifespan(app):
+    keeper.start()
+    yield
+    await keeper.stop()
+    await ollama.close()
+    cache.close()
+
+app = FastAPI(lifespan=lifespan)
+install_admission(app, admission)
+install_metrics(app)
+install_readiness(app, keeper)
 
 # Serve static files (HTML, CSS, JS)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MODEL_NAME = "phi"  # Using Phi-2 for legal document analysis
-
 @app.get("/")
 def serve_homepage():
     """ Serve the index.html file when accessing the root URL """
     return FileResponse(os.path.join("static", "index.html"))
 
 @app.post("/analyze_legal_text")
-def analyze_legal_text(text: str = Form(...)):
-    headers = {"Content-Type": "application/json"}
+async def analyze_legal_text(text: str = Form(...), stream: bool = Form(False)):
+    # Documents longer than one chunk go through the map-reduce pipeline
+    if len(split_clauses(text)) > 1:
+        if stream:
+            return sse_response(analyzer.analyze_events(text))
+        try:
+            return await analyzer.analyze(text)
+        except OllamaError as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
     prompt = f"Extract key insights from the following legal document:\n{text}\nSummarize important clauses, risks, and obligations."
 
-    try:
-        # Send the input text to Ollama for legal analysis
-        response = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL_NAME, "prompt": prompt, "stream": False},
-            headers=headers
-        )
-
-        # Log the response for debugging
-        print("Ollama Response:", response.text)
-
-        # Ensure valid JSON response
-        response_data = response.text.strip()
+    # Relay tokens as Server-Sent Events when the client asks for streaming
+    if stream:
         try:
-            json_response = json.loads(response_data)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail=f"Invalid JSON response from Ollama: {response_data}")
-
-        # Extract legal insights
-        legal_insights = json_response.get("response", "No insights generated.")
-        return {"insights": legal_insights}
+            return await stream_response(admission.admit_stream("/analyze_legal_text", ollama.generate_stream(MODEL_NAME, prompt)))
+        except OllamaError as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Request to Ollama failed: {str(e)}")
+    try:
+        # Send the input text to Ollama for legal analysis
+        async with admission.admit("/analyze_legal_text"):
+            json_response = await ollama.generate(MODEL_NAME, prompt)
+    except OllamaError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Extract legal insights
+    legal_insights = json_response.get("response", "No insights generated.")
+    return {"insights": legal_insights}
 
 # Run the API server
 if __name__ == "__main__":
@@ -1,51 +1,145 @@
-from fastapi import FastAPI, HTTPException, Form
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Form, Query, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-import requests
-import os
+from fastapi.responses import FileResponse, StreamingResponse
 import json
+import os
+import sys
+
+# Make the shared Ollama helpers importable when running from this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ollama_common.admission import AdmissionController, PRIORITY_LOW, PRIORITY_NORMAL, install_admission
+from ollama_common.batch import BatchRunner, json_items, ndjson_items
+from ollama_common.cache import ResponseCache, set_cache_headers
+from ollama_common.client import OllamaClient, OllamaError
+from ollama_common.metrics import install_metrics
+from ollama_common.streaming import stream_response
+from ollama_common.warmup import ModelKeeper, install_readiness
+
+MODEL_NAME = "mistral"  # Using Mistral 7B for summarization
+
+# One pooled Ollama client per process, shared by every request
+ollama = OllamaClient()
+
+# Preload the model on startup and keep it resident between requests
+keeper = ModelKeeper(ollama, MODEL_NAME)
+
+# Bounded, prioritised admission queue in front of the Ollama calls
+admission = AdmissionController()
+admission.register("/summarize", priority=PRIORITY_NORMAL)
+# Batch documents queue behind interactive requests
+admission.register("/summarize/batch", priority=PRIORITY_LOW)
+batches = BatchRunner()
+
+# Identical documents are resubmitted often, so spacing and case differences share a cache entry
+cache = ResponseCache(normalize_whitespace=True, normalize_case=True, name="summarizer")
+
+@asynccontextmanager
+async def lifespan(app):
+    keeper.start()
+    yield
+    await keeper.stop()
+    await ollama.close()
+    cache.close()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+install_admission(app, admission)
+install_metrics(app)
+install_readiness(app, keeper)
 
 # Serve static files (HTML, CSS, JS)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MODEL_NAME = "mistral"  # Using Mistral 7B for summarization
-
 @app.get("/")
 def serve_homepage():
     """ Serve the index.html file when accessing the root URL """
     return FileResponse(os.path.join("static", "index.html"))
 
+# Summarize one document through the cache, the admission queue and Ollama
+async def summarize_document(text, endpoint="/summarize"):
+    prompt = f"Summarize this: {text}"
+    cache_key = cache.key(MODEL_NAME, prompt)
+    cached, tier = await cache.get(cache_key)
+    if cached:
+        return cached, tier
+
+    # Send the input text to Ollama for summarization
+    async with admission.admit(endpoint):
+        json_response = await ollama.generate(MODEL_NAME, prompt)
+
+    await cache.set(cache_key, json_response)
+    return json_response, None
+
 @app.post("/summarize")
-def summarize_text(text: str = Form(...)):
-    headers = {"Content-Type": "application/json"}
-    
-    try:
-        # Send the input text to Ollama for summarization
-        response = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL_NAME, "prompt": f"Summarize this: {text}", "stream": False},
-            headers=headers
-        )
-
-        # Log the response for debugging
-        print("Ollama Response:", response.text)
-
-        # Ensure valid JSON response
-        response_data = response.text.strip()
+async def summarize_text(response: Response, text: str = Form(...), stream: bool = Form(False)):
+    # Relay tokens as Server-Sent Events when the client asks for streaming
+    if stream:
+        prompt = f"Summarize this: {text}"
+        cache_key = cache.key(MODEL_NAME, prompt)
+        cached, tier = await cache.get(cache_key)
+        if cached:
+            return set_cache_headers(await stream_response(cache.replay(cached)), tier)
         try:
-            json_response = json.loads(response_data)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail=f"Invalid JSON response from Ollama: {response_data}")
-
-        # Extract summarized text
-        summarized_text = json_response.get("response", "No valid summary received.")
-        return {"summary": summarized_text}
+            chunks = admission.admit_stream("/summarize", ollama.generate_stream(MODEL_NAME, prompt))
+            return set_cache_headers(await stream_response(cache.store_stream(cache_key, chunks)), None)
+        except OllamaError as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Request to Ollama failed: {str(e)}")
+    try:
+        json_response, tier = await summarize_document(text)
+    except OllamaError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    set_cache_headers(response, tier)
+
+    # Extract summarized text
+    summarized_text = json_response.get("response", "No valid summary received.")
+    return {"summary": summarized_text}
+
+async def summarize_item(item):
+    text = item.get("text") if isinstance(item, dict) else item
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("Each item must be a string or an object with a non-empty 'text' field")
+    json_response, tier = await summarize_document(text, "/summarize/batch")
+    return {"summary": json_response.get("response", "No valid summary received."), "cached": tier is not None}
+
+@app.post("/summarize/batch")
+async def summarize_batch(request: Request, concurrency: int = Query(None, description="Documents summarized in parallel")):
+    """ Summarize many documents, streaming one NDJSON result line per document as it completes.
+
+    Accepts a JSON array or NDJSON body (items are strings or objects with
+    ``text`` and an optional ``id``), or either format uploaded as a ``file``
+    form field. The batch id is returned in the X-Batch-Id header and in the
+    final summary line, and can be passed to DELETE /summarize/batch/{id}.
+    """
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            upload = (await request.form()).get("file")
+            if upload is None:
+                raise HTTPException(status_code=400, detail="Upload the documents as a 'file' field")
+            body = await upload.read()
+            items = json_items(body) if body.lstrip().startswith(b"[") else ndjson_items(body)
+        elif "ndjson" in content_type:
+            items = ndjson_items(await request.body())
+        else:
+            items = json_items(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {str(e)}")
+
+    batch_id = batches.new_batch()
+
+    async def results():
+        async for result in batches.run(batch_id, items, summarize_item, concurrency):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson", headers={"X-Batch-Id": batch_id})
+
+@app.delete("/summarize/batch/{batch_id}")
+def cancel_batch(batch_id: str):
+    if not batches.cancel(batch_id):
+        raise HTTPException(status_code=404, detail="Unknown or finished batch")
+    return {"batch_id": batch_id, "cancelled": True}
 
 # Run the API server
 if __name__ == "__main__":
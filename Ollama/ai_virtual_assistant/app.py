@@ -1,31 +1,63 @@
-from fastapi import FastAPI, HTTPException, Form
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Form, Query, Request, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-import requests
+import asyncio
 import os
-import json
-import datetime
+import sys
 
-app = FastAPI()
+# Make the shared Ollama helpers importable when running from this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ollama_common.admission import AdmissionController, PRIORITY_NORMAL, install_admission
+from ollama_common.client import OllamaClient, OllamaError
+from ollama_common.metrics import install_metrics
+from ollama_common.warmup import ModelKeeper, install_readiness
+from tasks import ReminderDispatcher, ReminderInbox, TaskStore, is_task_request, save_task, user_id_of
 
-# Serve static files (HTML, CSS, JS)
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-OLLAMA_URL = "http://localhost:11434/api/generate"
 MODEL_NAME = "llama2"  # Using LLaMA 2 for AI Virtual Assistant
 
-# Store scheduled tasks
-scheduled_tasks = []
+# One pooled Ollama client per process, shared by every request
+ollama = OllamaClient()
+
+# Preload the model on startup and keep it resident between requests
+keeper = ModelKeeper(ollama, MODEL_NAME)
+
+# Bounded, prioritised admission queue in front of the Ollama calls
+admission = AdmissionController()
+admission.register("/chat", priority=PRIORITY_NORMAL)
+
+# Durable per-user task store, and the dispatcher that fires reminders into each user's inbox when they fall due
+task_store = TaskStore()
+inbox = ReminderInbox(task_store)
+dispatcher = ReminderDispatcher(task_store, on_fire=inbox.notify)
+
+@asynccontextmanager
+async def lifespan(app):
+    keeper.start()
+    dispatcher.start()
+    yield
+    await dispatcher.stop()
+    await keeper.stop()
+    await ollama.close()
+    task_store.close()
+
+app = FastAPI(lifespan=lifespan)
+install_admission(app, admission)
+install_metrics(app)
+install_readiness(app, keeper)
+
+# Serve static files (HTML, CSS, JS)
+app.mount("/static", StaticFiles(directory="static"), name="static")
 
 @app.get("/")
-def serve_homepage():
-    """ Serve the index.html file when accessing the root URL """
-    return FileResponse(os.path.join("static", "index.html"))
+def serve_homepage(request: Request):
+    """ Serve the index.html file when accessing the root URL, with a user id cookie for new visitors """
+    response = FileResponse(os.path.join("static", "index.html"))
+    user_id_of(request, response)
+    return response
 
 @app.post("/chat")
-def chat_with_ai(user_query: str = Form(...)):
-    headers = {"Content-Type": "application/json"}
-
+async def chat_with_ai(request: Request, response: Response, user_query: str = Form(...)):
     prompt = f"""You are an AI-powered virtual assistant that helps with task scheduling and answering queries.
     If the user asks to schedule a task, extract the task details and save it.
     User: {user_query}
@@ -33,33 +65,32 @@ def chat_with_ai(user_query: str = Form(...)):
 
     try:
         # Send the query to LLaMA 2
-        response = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL_NAME, "prompt": prompt, "stream": False},
-            headers=headers
-        )
-
-        print("Ollama Response:", response.text)
-
-        # Ensure valid JSON response
-        response_data = response.text.strip()
-        try:
-            json_response = json.loads(response_data)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail=f"Invalid JSON response from Ollama: {response_data}")
-
-        chatbot_response = json_response.get("response", "I'm sorry, but I couldn't generate a response.")
-        
-        # Check if the user is scheduling a task
-        if "schedule" in user_query.lower() or "remind" in user_query.lower():
-            task = {"task": user_query, "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-            scheduled_tasks.append(task)
-            chatbot_response += f"\nTask Scheduled: {user_query}"
-
-        return {"response": chatbot_response, "tasks": scheduled_tasks}
-
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Request to Ollama failed: {str(e)}")
+        async with admission.admit("/chat"):
+            json_response = await ollama.generate(MODEL_NAME, prompt)
+    except OllamaError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    chatbot_response = json_response.get("response", "I'm sorry, but I couldn't generate a response.")
+    
+    # Check if the user is scheduling a task, and only return that task rather than the whole history
+    task = None
+    if is_task_request(user_query):
+        task = await save_task(task_store, dispatcher, user_id_of(request, response), user_query)
+        chatbot_response += f"\nTask Scheduled: {user_query}"
+
+    return {"response": chatbot_response, "task": task}
+
+@app.get("/tasks")
+async def list_tasks(request: Request, response: Response, limit: int = Query(20), before: int = Query(None),
+                     status: str = Query(None)):
+    """ Page through the caller's tasks, newest first; pass ``next_before`` back as ``before`` for the next page """
+    tasks, next_before = await asyncio.to_thread(task_store.list, user_id_of(request, response), limit, before, status)
+    return {"tasks": tasks, "next_before": next_before}
+
+@app.get("/reminders")
+async def collect_reminders(request: Request, response: Response, wait: float = Query(0)):
+    """ Reminders of the caller's that fell due since the last call, waiting up to ``wait`` seconds for one """
+    return {"reminders": await inbox.collect(user_id_of(request, response), wait)}
 
 # Run the API server
 if __name__ == "__main__":
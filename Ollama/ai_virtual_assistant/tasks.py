@@ -0,0 +1,324 @@
+import asyncio
+import datetime
+import hashlib
+import heapq
+import hmac
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding every user's tasks
+TASKS_DB_PATH = os.environ.get("TASKS_DB", "tasks.db")
+# Pending reminders due within this many seconds are kept in the dispatcher's heap
+DISPATCH_HORIZON = float(os.environ.get("TASKS_DISPATCH_HORIZON", "3600"))
+# Most tasks returned by one page of /tasks
+TASKS_MAX_PAGE_SIZE = int(os.environ.get("TASKS_MAX_PAGE_SIZE", "100"))
+# After a failed store read the dispatcher tries again this many seconds later
+DISPATCH_RETRY = float(os.environ.get("TASKS_DISPATCH_RETRY", "5"))
+# Longest a client may long-poll /reminders, in seconds
+REMINDER_MAX_WAIT = float(os.environ.get("TASKS_REMINDER_MAX_WAIT", "30"))
+
+# Key signing the user id cookie. Without it ids are signed with a per-process key, so users
+# lose their tasks on restart and each worker of a multi-worker server sees different users.
+TASKS_SECRET = os.environ.get("TASKS_SECRET", "")
+USER_COOKIE = "assistant_user"
+USER_COOKIE_MAX_AGE = 365 * 86400
+
+if not TASKS_SECRET:
+    logger.warning("TASKS_SECRET is not set, user ids are only valid until this process exits")
+_secret = TASKS_SECRET.encode() or secrets.token_bytes(32)
+
+_UNITS = {"minute": 60, "min": 60, "hour": 3600, "hr": 3600, "day": 86400, "week": 604800}
+
+
+def parse_due(text, now=None):
+    """ Find a due time in phrases like "in 10 minutes", "at 17:30" or "tomorrow at 9am"; None if there is none """
+    now = now or datetime.datetime.now()
+    text = text.lower()
+
+    match = re.search(r"\bin (\d+|an?) (minute|min|hour|hr|day|week)s?\b", text)
+    if match:
+        amount = 1 if match.group(1) in ("a", "an") else int(match.group(1))
+        return now + datetime.timedelta(seconds=amount * _UNITS[match.group(2)])
+
+    match = re.search(r"\bat (\d{1,2})(?::(\d{2}))?\s*(am|pm)?\b", text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2) or 0)
+        if match.group(3) == "pm" and hour < 12:
+            hour += 12
+        elif match.group(3) == "am" and hour == 12:
+            hour = 0
+        if hour > 23 or minute > 59:
+            return None
+        due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if "tomorrow" in text or due <= now:
+            due += datetime.timedelta(days=1)
+        return due
+
+    if "tomorrow" in text:
+        return (now + datetime.timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+    return None
+
+
+def _row_to_task(row):
+    task_id, user_id, task, created_at, due_at, status, fired_at = row
+    as_text = lambda ts: datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else None
+    return {"id": task_id, "user_id": user_id, "task": task, "timestamp": as_text(created_at),
+            "due": as_text(due_at), "status": status, "fired_at": as_text(fired_at)}
+
+
+def _sign(user_id):
+    return hmac.new(_secret, user_id.encode(), hashlib.sha256).hexdigest()
+
+
+def user_id_of(request, response):
+    """ The caller's user id from its signed cookie; new callers get a fresh id and the cookie on ``response``.
+
+    Ids are chosen by the server and signed, so a client cannot list or add
+    tasks as another user by naming them.
+    """
+    user_id, _, signature = request.cookies.get(USER_COOKIE, "").rpartition(".")
+    if user_id and hmac.compare_digest(signature, _sign(user_id)):
+        return user_id
+    user_id = secrets.token_urlsafe(16)
+    response.set_cookie(USER_COOKIE, f"{user_id}.{_sign(user_id)}", max_age=USER_COOKIE_MAX_AGE,
+                        httponly=True, samesite="lax")
+    return user_id
+
+
+def is_task_request(user_query):
+    return "schedule" in user_query.lower() or "remind" in user_query.lower()
+
+
+async def save_task(store, dispatcher, user_id, user_query):
+    """ Store a "schedule"/"remind" request, queueing a reminder if it names a due time """
+    due = parse_due(user_query)
+    due_at = due.timestamp() if due else None
+    task = await asyncio.to_thread(store.add, user_id, user_query, due_at)
+    if due_at:
+        dispatcher.schedule(task["id"], due_at)
+    return task
+
+
+class TaskStore:
+    """ Durable per-user task list in SQLite (WAL mode).
+
+    Listing is indexed on (user_id, id) and pages backwards from a ``before``
+    id, so a page costs the same however many tasks a user has. Pending
+    reminders are indexed on due time for the dispatcher. The methods block,
+    so async code calls them through asyncio.to_thread.
+    """
+
+    def __init__(self, path=TASKS_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS tasks (
+                                  id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                  user_id TEXT NOT NULL,
+                                  task TEXT NOT NULL,
+                                  created_at REAL NOT NULL,
+                                  due_at REAL,
+                                  status TEXT NOT NULL,
+                                  fired_at REAL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_user ON tasks (user_id, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_due ON tasks (status, due_at)")
+        self._conn.commit()
+
+    def add(self, user_id, task, due_at=None):
+        status = "pending" if due_at else "saved"
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO tasks (user_id, task, created_at, due_at, status) VALUES (?, ?, ?, ?, ?)",
+                (user_id, task, time.time(), due_at, status))
+            self._conn.commit()
+        return self.get(user_id, cursor.lastrowid)
+
+    def get(self, user_id, task_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM tasks WHERE user_id = ? AND id = ?", (user_id, task_id)).fetchone()
+        return _row_to_task(row) if row else None
+
+    def list(self, user_id, limit=20, before=None, status=None):
+        """ Return ``(tasks, next_before)``: newest first, with the cursor for the next page or None """
+        limit = max(1, min(limit, TASKS_MAX_PAGE_SIZE))
+        query, params = "SELECT * FROM tasks WHERE user_id = ?", [user_id]
+        if before is not None:
+            query += " AND id < ?"
+            params.append(before)
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        tasks = [_row_to_task(row) for row in rows[:limit]]
+        return tasks, (tasks[-1]["id"] if len(rows) > limit else None)
+
+    def due_before(self, until):
+        """ Pending reminders due before ``until`` as ``(due_at, id)`` pairs """
+        with self._lock:
+            return self._conn.execute("SELECT due_at, id FROM tasks WHERE status = 'pending' AND due_at < ? "
+                                      "ORDER BY due_at", (until,)).fetchall()
+
+    def mark_fired(self, task_id):
+        """ Flip a pending reminder to fired; returns the task, or None if it was no longer pending """
+        with self._lock:
+            cursor = self._conn.execute("UPDATE tasks SET status = 'fired', fired_at = ? "
+                                        "WHERE id = ? AND status = 'pending'", (time.time(), task_id))
+            self._conn.commit()
+            if cursor.rowcount == 0:
+                return None
+            row = self._conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return _row_to_task(row)
+
+    def take_fired(self, user_id):
+        """ Fired reminders of ``user_id`` not yet handed to a client, oldest first, now marked delivered """
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM tasks WHERE user_id = ? AND status = 'fired' ORDER BY due_at",
+                                      (user_id,)).fetchall()
+            if rows:
+                self._conn.executemany("UPDATE tasks SET status = 'delivered' WHERE id = ?", [(row[0],) for row in rows])
+                self._conn.commit()
+        return [dict(_row_to_task(row), status="delivered") for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ReminderInbox:
+    """ Hands fired reminders to their users through a long-polled /reminders.
+
+    Fired reminders wait in the store until a client collects them, so none
+    are lost while no page is open or across restarts. ``notify`` is the
+    dispatcher's ``on_fire``: it wakes the user's waiting polls.
+    """
+
+    def __init__(self, store, max_wait=REMINDER_MAX_WAIT):
+        self.store = store
+        self.max_wait = max_wait
+        self._waiters = {}
+
+    async def notify(self, task):
+        for event in self._waiters.get(task["user_id"], ()):
+            event.set()
+
+    async def collect(self, user_id, wait=0.0):
+        """ The user's fired reminders, waiting up to ``wait`` seconds (capped at ``max_wait``) for one to fire """
+        event = asyncio.Event()
+        waiters = self._waiters.setdefault(user_id, set())
+        # Registered before the first read, so a reminder fired in between still wakes this poll
+        waiters.add(event)
+        try:
+            reminders = await asyncio.to_thread(self.store.take_fired, user_id)
+            if reminders or wait <= 0:
+                return reminders
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(wait, self.max_wait))
+            except asyncio.TimeoutError:
+                return []
+            return await asyncio.to_thread(self.store.take_fired, user_id)
+        finally:
+            waiters.discard(event)
+            if not waiters:
+                self._waiters.pop(user_id, None)
+
+
+class ReminderDispatcher:
+    """ Fires reminders when they fall due.
+
+    Only reminders due within ``horizon`` seconds are held in a min-heap of
+    ``(due_at, id)``; the heap is refilled from the store's due-time index as
+    the horizon moves, so memory does not grow with the number of future
+    tasks. Firing marks the task in the store (so it happens once, even
+    across restarts) and then calls ``on_fire(task)``. Store errors are
+    logged and retried, so they delay reminders rather than stop them.
+    """
+
+    def __init__(self, store, on_fire=None, horizon=DISPATCH_HORIZON, retry=DISPATCH_RETRY):
+        self.store = store
+        self.on_fire = on_fire
+        self.horizon = horizon
+        self.retry = retry
+        self._heap = []
+        self._queued = set()
+        self._horizon_end = 0.0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def _push(self, due_at, task_id):
+        if task_id not in self._queued:
+            self._queued.add(task_id)
+            heapq.heappush(self._heap, (due_at, task_id))
+
+    async def _refill(self):
+        self._horizon_end = time.time() + self.horizon
+        for due_at, task_id in await asyncio.to_thread(self.store.due_before, self._horizon_end):
+            self._push(due_at, task_id)
+
+    def schedule(self, task_id, due_at):
+        """ Tell the dispatcher about a newly stored reminder """
+        if due_at < self._horizon_end:
+            self._push(due_at, task_id)
+            self._wakeup.set()
+
+    async def _fire(self, task_id):
+        try:
+            task = await asyncio.to_thread(self.store.mark_fired, task_id)
+        except Exception:
+            logger.exception("Could not mark reminder %s as fired, retrying in %.0fs", task_id, self.retry)
+            self._push(time.time() + self.retry, task_id)
+            return
+        if task is None:
+            return
+        logger.info("Reminder for %s: %s", task["user_id"], task["task"])
+        if self.on_fire is not None:
+            try:
+                await self.on_fire(task)
+            except Exception:
+                logger.exception("Reminder callback failed for task %s", task_id)
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            if now >= self._horizon_end:
+                try:
+                    await self._refill()
+                except Exception:
+                    logger.exception("Could not load due reminders, retrying in %.0fs", self.retry)
+                    self._horizon_end = now + self.retry
+
+            while self._heap and self._heap[0][0] <= now:
+                _, task_id = heapq.heappop(self._heap)
+                self._queued.discard(task_id)
+                await self._fire(task_id)
+
+            next_due = self._heap[0][0] if self._heap else self._horizon_end
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, min(next_due, self._horizon_end) - time.time()))
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
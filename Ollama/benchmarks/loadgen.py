@@ -0,0 +1,258 @@
+""" Load generator for the Ollama apps.
+
+Starts the stub Ollama server and each app under uvicorn, drives the app's
+main route at a target rate (open loop, so slow responses do not lower the
+offered load) and writes a JSON report with latency percentiles, time to
+first token for streamed requests, errors and achieved throughput:
+
+    python loadgen.py --rps 20 --duration 30 --out report.json
+    python loadgen.py --apps ai_text_summarizer gateway --stream --compare baseline.json
+
+Everything runs on 127.0.0.1 and needs no GPU, so it can run in CI; reports
+carry the git commit and settings so runs from different commits compare.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+OLLAMA_DIR = os.path.join(BENCH_DIR, "..")
+
+# Main route of each app directory: (path, how the fields are sent, fields built from a request number)
+TARGETS = {
+    "AI Chat Assistant": ("/chat", "query", lambda n: {"prompt": f"Tell me a fact about the number {n}"}),
+    "ai_code_assistant": ("/generate_code", "form", lambda n: {"prompt": f"python function number {n}", "mode": "generate"}),
+    "ai_legal_analyzer": ("/analyze_legal_text", "form", lambda n: {"text": f"Clause {n}: the tenant pays rent monthly."}),
+    "ai_text_summarizer": ("/summarize", "form", lambda n: {"text": f"Document {n}. " + "The quick brown fox jumps. " * 20}),
+    "ai_virtual_assistant": ("/chat", "form", lambda n: {"user_query": f"What is {n} plus {n}?"}),
+    "customer_support_chatbot": ("/chat", "form", lambda n: {"user_query": f"Where is my order {n}?"}),
+    "ecommerce_ai_recommender": ("/recommend", "form", lambda n: {"preferences": f"gifts under {n} dollars"}),
+    "medical_ai_symptom_checker": ("/analyze_symptoms", "form", lambda n: {"symptoms": f"cough for {n % 14} days"}),
+    "gateway": ("/summarizer/summarize", "form", lambda n: {"text": f"Document {n}. " + "The quick brown fox jumps. " * 20}),
+}
+# The virtual assistant has no streaming endpoint
+NO_STREAM = {"ai_virtual_assistant"}
+
+# Shared by warm-up and measured runs, so measured requests never replay warm-up inputs from a cache
+request_numbers = itertools.count()
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return round(values[index], 4)
+
+
+def summarize(latencies):
+    return {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+            "max": round(max(latencies), 4) if latencies else None}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def wait_until_up(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return True
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    return False
+
+
+def start_process(args, cwd, env, log):
+    return subprocess.Popen(args, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def stop_process(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def one_request(client, method, path, fields, stream):
+    """ Send one request and return (status, latency, ttft, error) """
+    started = time.perf_counter()
+    if stream:
+        fields = {**fields, "stream": "true"}
+    kwargs = {"params": fields} if method == "query" else {"data": fields}
+    ttft = None
+    try:
+        if not stream:
+            response = await client.post(path, **kwargs)
+            error = None if response.status_code < 400 else response.text[:200]
+            return response.status_code, time.perf_counter() - started, None, error
+
+        error = None
+        done = False
+        async with client.stream("POST", path, **kwargs) as response:
+            async for line in response.aiter_lines():
+                if ttft is None and line.startswith("data: ") and '"token"' in line:
+                    ttft = time.perf_counter() - started
+                if line.startswith("event: error"):
+                    error = "stream error event"
+                done = done or line.startswith("event: done")
+        if response.status_code >= 400:
+            error = f"HTTP {response.status_code}"
+        elif error is None and not done:
+            # A stream that stops without its done event lost the rest of the answer
+            error = "stream ended early"
+        return response.status_code, time.perf_counter() - started, ttft, error
+    except httpx.HTTPError as e:
+        return None, time.perf_counter() - started, ttft, f"{type(e).__name__}: {e}"
+
+
+async def drive(base_url, target, rps, duration, stream, duplicate_ratio, timeout):
+    """ Offer ``rps`` requests per second for ``duration`` seconds with Poisson arrivals """
+    path, method, build = target
+    results = []
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def run(n):
+            # Repeat an earlier input now and then to exercise caches and request coalescing
+            if random.random() < duplicate_ratio:
+                n = random.randrange(n + 1)
+            results.append(await one_request(client, method, path, build(n), stream))
+
+        tasks = []
+        started = time.perf_counter()
+        next_at = started
+        while next_at - started < duration:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            tasks.append(asyncio.create_task(run(next(request_numbers))))
+            next_at += random.expovariate(rps)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r[3] is None]
+    errors = {}
+    for r in results:
+        if r[3] is not None:
+            key = str(r[0]) if r[0] is not None and r[0] >= 400 else r[3].split(":")[0]
+            errors[key] = errors.get(key, 0) + 1
+    return {"requests": len(results), "succeeded": len(ok), "errors": errors,
+            "error_rate": round(1 - len(ok) / len(results), 4) if results else None,
+            "achieved_rps": round(len(ok) / elapsed, 2),
+            "latency": summarize([r[1] for r in ok]),
+            "ttft": summarize([r[2] for r in ok if r[2] is not None]) if stream else None}
+
+
+async def bench_app(name, args, stub_url, port, workdir):
+    env = {**os.environ, "OLLAMA_BASE_URL": stub_url, "OLLAMA_BACKENDS": stub_url,
+           "TASKS_DB": os.path.join(workdir, f"{name}-tasks.db"),
+           "LEGAL_CACHE_DB": os.path.join(workdir, f"{name}-legal-cache.db"),
+           "CATALOG_INDEX_DIR": os.path.join(workdir, "no-catalog-index"),
+           "OLLAMA_KEEPER_RETRY_INTERVAL": "0.5"}
+    log = open(os.path.join(workdir, f"{name}.log"), "w")
+    app = start_process([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+                        os.path.join(OLLAMA_DIR, name), env, log)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        if not await wait_until_up(f"{base_url}/ready"):
+            return {"error": f"app did not start, see {log.name}"}
+        # Let the model keeper preload before measuring
+        await asyncio.sleep(1)
+        if args.warmup:
+            await drive(base_url, TARGETS[name], args.rps, args.warmup, False, 0, args.timeout)
+        stream = args.stream and name not in NO_STREAM
+        return await drive(base_url, TARGETS[name], args.rps, args.duration, stream, args.duplicate_ratio, args.timeout)
+    finally:
+        stop_process(app)
+        log.close()
+
+
+def compare(report, baseline):
+    """ Print p50/p95/p99 and throughput changes against an earlier report """
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('created')}):")
+    for name, result in report["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before or "latency" not in before or "latency" not in result:
+            continue
+        deltas = []
+        for q in ("p50", "p95", "p99"):
+            old, new = before["latency"][q], result["latency"][q]
+            if old and new:
+                deltas.append(f"{q} {new:.3f}s ({(new - old) / old:+.1%})")
+        deltas.append(f"rps {result['achieved_rps']} (was {before['achieved_rps']})")
+        print(f"  {name}: " + ", ".join(deltas))
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="ollama-bench-")
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub_log = open(os.path.join(workdir, "stub.log"), "w")
+    stub = start_process([sys.executable, "stub_ollama.py", "--port", str(args.stub_port), "--latency", args.latency,
+                          "--token-rate", str(args.token_rate), "--tokens", str(args.tokens),
+                          "--parallel", str(args.parallel), "--error-rate", str(args.error_rate),
+                          "--error-kind", args.error_kind, "--seed", "0"], BENCH_DIR, os.environ, stub_log)
+
+    report = {"commit": git_commit(), "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(), "machine": platform.machine(),
+              "settings": {k: v for k, v in vars(args).items() if k not in ("out", "compare")}, "results": {}}
+    try:
+        if not await wait_until_up(f"{stub_url}/api/ps"):
+            raise SystemExit(f"Stub Ollama server did not start, see {stub_log.name}")
+        for offset, name in enumerate(args.apps):
+            print(f"Benchmarking {name} at {args.rps} rps for {args.duration}s...")
+            result = await bench_app(name, args, stub_url, args.app_port + offset, workdir)
+            report["results"][name] = result
+            print(f"  {json.dumps(result)}")
+    finally:
+        stop_process(stub)
+        stub_log.close()
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.out} (logs in {workdir})")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the Ollama apps against a stub Ollama server")
+    parser.add_argument("--apps", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument("--rps", type=float, default=10.0, help="Offered requests per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of measured load per app")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of unmeasured load first")
+    parser.add_argument("--stream", action="store_true", help="Request Server-Sent Events and measure time to first token")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="Share of requests repeating an earlier input")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--out", default="report.json")
+    parser.add_argument("--compare", help="Earlier report to compare against")
+    parser.add_argument("--stub-port", type=int, default=11534)
+    parser.add_argument("--app-port", type=int, default=18000)
+    # Passed through to stub_ollama.py
+    parser.add_argument("--latency", default="lognormal:0.2,0.4")
+    parser.add_argument("--token-rate", type=float, default=100.0)
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--parallel", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-kind", choices=["http500", "disconnect", "malformed"], default="http500")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,154 @@
+""" Stub Ollama server for load tests on machines without a GPU.
+
+It answers /api/generate (streaming and not), /api/embed, /api/embeddings
+and /api/ps like Ollama does, with a configurable prompt latency, token
+rate, number of parallel slots and injected errors:
+
+    python stub_ollama.py --port 11434 --latency lognormal:0.3,0.5 --token-rate 40 --tokens 64 --parallel 4
+    python stub_ollama.py --error-rate 0.02 --error-kind disconnect
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def parse_latency(spec):
+    """ Turn "fixed:0.2", "uniform:0.1,0.5", "normal:0.2,0.05" or "lognormal:0.2,0.5" into a sampler (seconds) """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        # Median of values[0] seconds with shape values[1], which gives the long tail real models show
+        return lambda: random.lognormvariate(0, values[1]) * values[0]
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def _embedding(text, dimensions):
+    digest = hashlib.sha256(text.encode()).digest()
+    rng = random.Random(digest)
+    return [rng.uniform(-1, 1) for _ in range(dimensions)]
+
+
+def create_app(latency="fixed:0.1", token_rate=50.0, tokens=32, parallel=4,
+               error_rate=0.0, error_kind="http500", embedding_dimensions=384, seed=None):
+    """ Build the stub server; ``parallel`` bounds concurrent generations like OLLAMA_NUM_PARALLEL """
+    app = FastAPI()
+    sample_latency = parse_latency(latency)
+    slots = asyncio.Semaphore(parallel)
+    rng = random.Random(seed)
+    loaded = {}
+    stats = {"generate": 0, "embed": 0, "errors": 0}
+
+    def _fail():
+        if error_rate and rng.random() < error_rate:
+            stats["errors"] += 1
+            return True
+        return False
+
+    def _stats(model, prompt, prompt_seconds, eval_seconds, context):
+        return {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": True,
+                "context": context + [len(prompt)], "total_duration": int((prompt_seconds + eval_seconds) * 1e9),
+                "load_duration": 0, "prompt_eval_count": max(1, len(prompt) // 4),
+                "prompt_eval_duration": int(prompt_seconds * 1e9), "eval_count": tokens,
+                "eval_duration": int(eval_seconds * 1e9)}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        model = body.get("model", "stub")
+        prompt = body.get("prompt", "")
+        loaded[model if ":" in model else f"{model}:latest"] = time.time()
+        # An empty prompt only loads the model
+        if not prompt:
+            return {"model": model, "response": "", "done": True}
+
+        stats["generate"] += 1
+        failing = _fail()
+        if failing and error_kind == "http500":
+            return JSONResponse(status_code=500, content={"error": "injected failure"})
+
+        if not body.get("stream", True):
+            async with slots:
+                prompt_seconds = sample_latency()
+                eval_seconds = tokens / token_rate
+                await asyncio.sleep(prompt_seconds + eval_seconds)
+            if failing and error_kind == "malformed":
+                return StreamingResponse(iter([b"{not json"]), media_type="application/json")
+            if failing:
+                raise ConnectionResetError("injected disconnect")
+            return {"response": " ".join(["token"] * tokens), **_stats(model, prompt, prompt_seconds, eval_seconds,
+                                                                       body.get("context", []))}
+
+        async def chunks():
+            async with slots:
+                prompt_seconds = sample_latency()
+                await asyncio.sleep(prompt_seconds)
+                for i in range(tokens):
+                    if failing and i == tokens // 2:
+                        if error_kind == "malformed":
+                            yield b"{not json\n"
+                        # Dropping the stream half way simulates a crashed runner
+                        return
+                    yield (json.dumps({"model": model, "response": " token", "done": False}) + "\n").encode()
+                    await asyncio.sleep(1 / token_rate)
+                yield (json.dumps({"response": "", **_stats(model, prompt, prompt_seconds, tokens / token_rate,
+                                                             body.get("context", []))}) + "\n").encode()
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        stats["embed"] += 1
+        if _fail():
+            return JSONResponse(status_code=500, content={"error": "injected failure"})
+        await asyncio.sleep(sample_latency() / 10)
+        return {"model": body.get("model"), "embeddings": [_embedding(t, embedding_dimensions) for t in inputs]}
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        return {"embedding": _embedding(body.get("prompt", ""), embedding_dimensions)}
+
+    @app.get("/api/ps")
+    def ps():
+        return {"models": [{"name": name, "model": name} for name in loaded]}
+
+    @app.get("/stub/stats")
+    def stub_stats():
+        return stats
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stub Ollama server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", default="fixed:0.1", help="Prompt latency: fixed:S, uniform:A,B, normal:MU,SIGMA or lognormal:MEDIAN,SHAPE")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Generated tokens per second")
+    parser.add_argument("--tokens", type=int, default=32, help="Tokens per response")
+    parser.add_argument("--parallel", type=int, default=4, help="Generations served at once")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail")
+    parser.add_argument("--error-kind", choices=["http500", "disconnect", "malformed"], default="http500")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.latency, args.token_rate, args.tokens, args.parallel,
+                           args.error_rate, args.error_kind, seed=args.seed),
+                host=args.host, port=args.port, log_level="warning")
@@ -1,56 +1,92 @@
-from fastapi import FastAPI, HTTPException, Form
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Form, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-import requests
 import os
-import json
+import sys
 
-app = FastAPI()
+# Make the shared Ollama helpers importable when running from this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ollama_common.admission import AdmissionController, PRIORITY_NORMAL, install_admission
+from ollama_common.cache import ResponseCache, set_cache_headers
+from ollama_common.client import OllamaClient, OllamaError
+from ollama_common.metrics import install_metrics
+from ollama_common.streaming import stream_response
+from ollama_common.warmup import ModelKeeper, install_readiness
+
+MODEL_NAME = "qwq"  # Using QWQ for customer support chatbot
+
+# One pooled Ollama client per process, shared by every request
+ollama = OllamaClient()
+
+# Preload the model on startup and keep it resident between requests
+keeper = ModelKeeper(ollama, MODEL_NAME)
+
+# Bounded, prioritised admission queue in front of the Ollama calls
+admission = AdmissionController()
+admission.register("/chat", priority=PRIORITY_NORMAL)
+
+# Support questions repeat heavily, so spacing and case differences share a cache entry
+cache = ResponseCache(normalize_whitespace=True, normalize_case=True, name="support")
+
+@asynccontextmanager
+async def lifespan(app):
+    keeper.start()
+    yield
+    await keeper.stop()
+    await ollama.close()
+    cache.close()
+
+app = FastAPI(lifespan=lifespan)
+install_admission(app, admission)
+install_metrics(app)
+install_readiness(app, keeper)
 
 # Serve static files (HTML, CSS, JS)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MODEL_NAME = "qwq"  # Using QWQ for customer support chatbot
-
 @app.get("/")
 def serve_homepage():
     """ Serve the index.html file when accessing the root URL """
     return FileResponse(os.path.join("static", "index.html"))
 
 @app.post("/chat")
-def chat_with_ai(user_query: str = Form(...)):
-    headers = {"Content-Type": "application/json"}
-
+async def chat_with_ai(response: Response, user_query: str = Form(...), stream: bool = Form(False)):
     # Create a structured prompt for a customer support chatbot
     prompt = f"""You are a customer support chatbot. Answer the user's question professionally and concisely.
     User: {user_query}
     Chatbot:"""
 
-    try:
-        # Send the query to QWQ
-        response = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL_NAME, "prompt": prompt, "stream": False},
-            headers=headers
-        )
+    cache_key = cache.key(MODEL_NAME, prompt)
+    cached, tier = await cache.get(cache_key)
 
-        # Log the response for debugging
-        print("Ollama Response:", response.text)
-
-        # Ensure valid JSON response
-        response_data = response.text.strip()
+    # Relay tokens as Server-Sent Events when the client asks for streaming
+    if stream:
+        if cached:
+            return set_cache_headers(await stream_response(cache.replay(cached)), tier)
+        try:
+            chunks = admission.admit_stream("/chat", ollama.generate_stream(MODEL_NAME, prompt))
+            return set_cache_headers(await stream_response(cache.store_stream(cache_key, chunks)), None)
+        except OllamaError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    if cached:
+        json_response = cached
+    else:
         try:
-            json_response = json.loads(response_data)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail=f"Invalid JSON response from Ollama: {response_data}")
+            # Send the query to QWQ
+            async with admission.admit("/chat"):
+                json_response = await ollama.generate(MODEL_NAME, prompt)
+        except OllamaError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        await cache.set(cache_key, json_response)
 
-        # Extract chatbot response
-        chatbot_response = json_response.get("response", "I'm sorry, but I couldn't generate a response.")
-        return {"response": chatbot_response}
+    set_cache_headers(response, tier)
 
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Request to Ollama failed: {str(e)}")
+    # Extract chatbot response
+    chatbot_response = json_response.get("response", "I'm sorry, but I couldn't generate a response.")
+    return {"response": chatbot_response}
 
 # Run the API server
 if __name__ == "__main__":
@@ -1,32 +1,48 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Form
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-import requests
 import os
-import json
-import pandas as pd
+import sys
 
-app = FastAPI()
+# Make the shared Ollama helpers importable when running from this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ollama_common.admission import AdmissionController, PRIORITY_LOW, install_admission
+from ollama_common.client import OllamaClient, OllamaError
+from ollama_common.metrics import install_metrics
+from ollama_common.streaming import stream_response
+from ollama_common.warmup import ModelKeeper, install_readiness
+from catalog import CATALOG_TOP_K, ProductCatalog, format_candidates
 
-# Serve static files (HTML, CSS, JS)
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-OLLAMA_URL = "http://localhost:11434/api/generate"
 MODEL_NAME = "granite3.2"  # Using Granite 3.2 for product recommendations
 
-# Sample Product Database (Can be expanded)
-products = [
-    {"id": 1, "category": "Electronics", "name": "Wireless Earbuds"},
-    {"id": 2, "category": "Electronics", "name": "Smartphone"},
-    {"id": 3, "category": "Electronics", "name": "Laptop"},
-    {"id": 4, "category": "Fashion", "name": "Leather Jacket"},
-    {"id": 5, "category": "Fashion", "name": "Running Shoes"},
-    {"id": 6, "category": "Home", "name": "Smart Vacuum Cleaner"},
-    {"id": 7, "category": "Home", "name": "Air Purifier"},
-]
+# One pooled Ollama client per process, shared by every request
+ollama = OllamaClient()
+
+# Preload the model on startup and keep it resident between requests
+keeper = ModelKeeper(ollama, MODEL_NAME)
+
+# Bounded, prioritised admission queue in front of the Ollama calls
+admission = AdmissionController()
+admission.register("/recommend", priority=PRIORITY_LOW)
 
-# Convert to DataFrame for easy filtering
-df = pd.DataFrame(products)
+@asynccontextmanager
+async def lifespan(app):
+    keeper.start()
+    yield
+    await keeper.stop()
+    await ollama.close()
+
+app = FastAPI(lifespan=lifespan)
+install_admission(app, admission)
+install_metrics(app)
+install_readiness(app, keeper)
+
+# Serve static files (HTML, CSS, JS)
+app.mount("/static", StaticFiles(directory="static"), name="static")
+
+# Product embeddings, loaded (memory-mapped) or built on first use
+catalog = ProductCatalog(ollama)
 
 @app.get("/")
 def serve_homepage():
@@ -34,40 +50,41 @@ def serve_homepage():
     return FileResponse(os.path.join("static", "index.html"))
 
 @app.post("/recommend")
-def recommend_products(preferences: str = Form(...)):
-    headers = {"Content-Type": "application/json"}
+async def recommend_products(preferences: str = Form(...), stream: bool = Form(False),
+                             category: str = Form(None), top_k: int = Form(CATALOG_TOP_K)):
+    # Retrieve the closest catalog products, optionally within comma-separated categories
+    try:
+        candidates = await catalog.retrieve(preferences, category, top_k)
+    except OllamaError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
     # Generate recommendation prompt
     prompt = f"""You are an AI product recommender. Based on the user's preferences, suggest the best matching products.
+    Only recommend products from this catalog:
+    {format_candidates(candidates)}
     
     User Preferences: {preferences}
     
     Recommended Products:
     """
 
-    try:
-        # Send preferences to Granite 3.2 for recommendations
-        response = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL_NAME, "prompt": prompt, "stream": False},
-            headers=headers
-        )
-
-        print("Ollama Response:", response.text)
-
-        # Ensure valid JSON response
-        response_data = response.text.strip()
+    # Relay tokens as Server-Sent Events when the client asks for streaming
+    if stream:
         try:
-            json_response = json.loads(response_data)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail=f"Invalid JSON response from Ollama: {response_data}")
+            return await stream_response(admission.admit_stream("/recommend", ollama.generate_stream(MODEL_NAME, prompt)))
+        except OllamaError as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-        ai_recommendations = json_response.get("response", "No recommendations found.")
+    try:
+        # Send preferences to Granite 3.2 for recommendations
+        async with admission.admit("/recommend"):
+            json_response = await ollama.generate(MODEL_NAME, prompt)
+    except OllamaError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return {"recommendations": ai_recommendations}
+    ai_recommendations = json_response.get("response", "No recommendations found.")
 
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Request to Ollama failed: {str(e)}")
+    return {"recommendations": ai_recommendations, "candidates": candidates}
 
 # Run the API server
 if __name__ == "__main__":
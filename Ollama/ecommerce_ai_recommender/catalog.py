@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Directory written by store_index.py; without it the sample products below are embedded on first use
+CATALOG_INDEX_DIR = os.environ.get("CATALOG_INDEX_DIR", "catalog_index")
+# How many retrieved products are shown to the LLM
+CATALOG_TOP_K = int(os.environ.get("CATALOG_TOP_K", "10"))
+# Embedding model used for both the catalog and the shopper's preferences
+EMBED_MODEL = os.environ.get("CATALOG_EMBED_MODEL", "nomic-embed-text")
+# Rows scored per step, so a search never holds more than one block of a memory-mapped catalog in RAM
+SEARCH_BLOCK_ROWS = int(os.environ.get("CATALOG_SEARCH_BLOCK_ROWS", "65536"))
+
+# Sample Product Database (Can be expanded)
+SAMPLE_PRODUCTS = [
+    {"id": 1, "category": "Electronics", "name": "Wireless Earbuds"},
+    {"id": 2, "category": "Electronics", "name": "Smartphone"},
+    {"id": 3, "category": "Electronics", "name": "Laptop"},
+    {"id": 4, "category": "Fashion", "name": "Leather Jacket"},
+    {"id": 5, "category": "Fashion", "name": "Running Shoes"},
+    {"id": 6, "category": "Home", "name": "Smart Vacuum Cleaner"},
+    {"id": 7, "category": "Home", "name": "Air Purifier"},
+]
+
+VECTORS_FILE = "vectors.npy"
+PRODUCTS_FILE = "products.csv"
+META_FILE = "meta.json"
+
+
+def product_text(product):
+    """ Text that gets embedded for a product """
+    parts = [str(product["name"]), str(product["category"])]
+    if isinstance(product.get("description"), str):
+        parts.append(product["description"])
+    return " | ".join(parts)
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def category_offsets(categories):
+    """ Map each category to its ``[start, end)`` row range in a category-sorted catalog """
+    categories = np.asarray(categories)
+    if len(categories) == 0:
+        return {}
+    starts = np.concatenate([[0], np.flatnonzero(categories[1:] != categories[:-1]) + 1])
+    ends = np.append(starts[1:], len(categories))
+    return {str(categories[s]): (int(s), int(e)) for s, e in zip(starts, ends)}
+
+
+class ProductIndex:
+    """ Product catalog with one unit-length embedding per row.
+
+    Rows are sorted by category so every category is a contiguous slice of
+    the vector matrix, and a category filter only scores that slice. Cosine
+    similarity is a matrix-vector product over blocks of SEARCH_BLOCK_ROWS,
+    which works the same on an in-memory array and on a memory-mapped
+    vectors.npy written by store_index.py.
+    """
+
+    def __init__(self, products, vectors, model=EMBED_MODEL):
+        self.products = products.reset_index(drop=True)
+        self.vectors = vectors
+        self.model = model
+        self.offsets = category_offsets(self.products["category"])
+        self._categories = {c.casefold(): c for c in self.offsets}
+
+    @classmethod
+    def from_products(cls, products, vectors, model=EMBED_MODEL):
+        """ Build an in-memory index, sorting products and vectors by category """
+        products = pd.DataFrame(products)
+        order = np.argsort(products["category"].to_numpy(), kind="stable")
+        vectors = np.ascontiguousarray(normalize_rows(vectors)[order])
+        return cls(products.iloc[order], vectors, model)
+
+    @classmethod
+    def load(cls, directory):
+        """ Open an index written by store_index.py, memory-mapping the vectors """
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        products = pd.read_csv(os.path.join(directory, PRODUCTS_FILE), keep_default_na=False)
+        vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        if len(products) != len(vectors):
+            raise ValueError(f"{directory} has {len(products)} products but {len(vectors)} vectors")
+        return cls(products, vectors, meta.get("model", EMBED_MODEL))
+
+    @property
+    def categories(self):
+        return list(self.offsets)
+
+    def _ranges(self, categories):
+        if not categories:
+            return [(0, len(self.products))]
+        ranges = []
+        for category in categories:
+            name = self._categories.get(category.strip().casefold())
+            if name is not None:
+                ranges.append(self.offsets[name])
+        return ranges
+
+    def search(self, query_vector, k=10, categories=None):
+        """ Return the ``k`` products most similar to ``query_vector``, optionally limited to ``categories`` """
+        query = normalize_rows(query_vector)
+        best_rows, best_scores = [], []
+
+        for start, end in self._ranges(categories):
+            for block_start in range(start, end, SEARCH_BLOCK_ROWS):
+                block_end = min(block_start + SEARCH_BLOCK_ROWS, end)
+                scores = np.asarray(self.vectors[block_start:block_end]) @ query
+                # Keep only this block's top k so memory stays bounded by k per block
+                if len(scores) > k:
+                    top = np.argpartition(-scores, k)[:k]
+                else:
+                    top = np.arange(len(scores))
+                best_rows.append(top + block_start)
+                best_scores.append(scores[top])
+
+        if not best_rows:
+            return []
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        order = np.argsort(-scores, kind="stable")[:k]
+
+        results = self.products.iloc[rows[order]].to_dict("records")
+        for product, score in zip(results, scores[order]):
+            product["score"] = round(float(score), 4)
+        return results
+
+
+async def embed_products(client, products, model=EMBED_MODEL, batch_size=64):
+    """ Embed a small catalog in memory; large catalogs are indexed ahead of time with store_index.py """
+    texts = [product_text(p) for p in pd.DataFrame(products).to_dict("records")]
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(await client.embed(model, texts[start:start + batch_size]))
+    return ProductIndex.from_products(products, vectors, model)
+
+
+def format_candidates(candidates):
+    """ Catalog lines for the recommendation prompt """
+    return "\n".join(f"- {p['name']} ({p['category']}, id {p['id']})" for p in candidates) or "- No matching products"
+
+
+class ProductCatalog:
+    """ Loads the product index once (memory-mapped from ``index_dir`` or embedded from ``products``) and retrieves candidates """
+
+    def __init__(self, client, index_dir=CATALOG_INDEX_DIR, products=SAMPLE_PRODUCTS):
+        self.client = client
+        self.index_dir = index_dir
+        self.products = products
+        self._index = None
+        self._lock = asyncio.Lock()
+
+    async def get_index(self):
+        async with self._lock:
+            if self._index is None:
+                if os.path.exists(self.index_dir):
+                    self._index = ProductIndex.load(self.index_dir)
+                else:
+                    self._index = await embed_products(self.client, self.products)
+        return self._index
+
+    async def retrieve(self, preferences, category=None, top_k=CATALOG_TOP_K):
+        """ Products closest to ``preferences``, optionally within comma-separated categories """
+        index = await self.get_index()
+        query_vector = (await self.client.embed(index.model, [preferences]))[0]
+        categories = [c for c in (category or "").split(",") if c.strip()]
+        return index.search(query_vector, k=max(1, min(top_k, 50)), categories=categories)
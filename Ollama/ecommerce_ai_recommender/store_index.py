@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Make the shared Ollama helpers importable when running from this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ollama_common.client import OllamaClient
+from catalog import EMBED_MODEL, META_FILE, PRODUCTS_FILE, VECTORS_FILE, normalize_rows, product_text
+
+
+def load_catalog(path):
+    """ Read a catalog file (.csv, .jsonl or .json) with at least id, name and category columns """
+    if path.endswith(".jsonl"):
+        products = pd.read_json(path, lines=True)
+    elif path.endswith(".json"):
+        products = pd.read_json(path)
+    else:
+        products = pd.read_csv(path, keep_default_na=False)
+
+    missing = {"id", "name", "category"} - set(products.columns)
+    if missing:
+        raise ValueError(f"Catalog is missing columns: {', '.join(sorted(missing))}")
+    # Category-sorted rows let searches filter by slicing a contiguous block of vectors
+    return products.sort_values("category", kind="stable").reset_index(drop=True)
+
+
+async def build_index(catalog_path, out_dir, model=EMBED_MODEL, batch_size=256, parallel=4):
+    products = load_catalog(catalog_path)
+    os.makedirs(out_dir, exist_ok=True)
+    client = OllamaClient()
+    vectors = None
+
+    try:
+        # Embed a few batches at a time and write them straight into the memory-mapped matrix
+        step = batch_size * parallel
+        for start in range(0, len(products), step):
+            rows = products.iloc[start:start + step].to_dict("records")
+            texts = [product_text(row) for row in rows]
+            batches = await asyncio.gather(*(client.embed(model, texts[i:i + batch_size])
+                                             for i in range(0, len(texts), batch_size)))
+            embeddings = normalize_rows([v for batch in batches for v in batch])
+
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(os.path.join(out_dir, VECTORS_FILE), mode="w+",
+                                                    dtype=np.float32, shape=(len(products), embeddings.shape[1]))
+            vectors[start:start + len(embeddings)] = embeddings
+            print(f"Embedded {start + len(embeddings)}/{len(products)} products")
+    finally:
+        await client.close()
+
+    if vectors is None:
+        raise ValueError("The catalog is empty")
+    vectors.flush()
+    del vectors
+
+    # Products and metadata are written last, so a partial run never looks like a complete index
+    products.to_csv(os.path.join(out_dir, PRODUCTS_FILE), index=False)
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump({"model": model, "count": len(products)}, f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed a product catalog for the recommender")
+    parser.add_argument("catalog", help="Catalog file (.csv, .jsonl or .json) with id, name and category columns")
+    parser.add_argument("--out", default="catalog_index", help="Directory to write the index to")
+    parser.add_argument("--model", default=EMBED_MODEL, help="Ollama embedding model")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--parallel", type=int, default=4, help="Embedding batches in flight at once")
+    args = parser.parse_args()
+
+    asyncio.run(build_index(args.catalog, args.out, args.model, args.batch_size, args.parallel))
@@ -0,0 +1,246 @@
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+import asyncio
+import os
+import sys
+
+# Make the shared Ollama helpers, the recommender's catalog and the assistant's task store importable
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(BASE_DIR)
+sys.path.append(os.path.join(BASE_DIR, "ecommerce_ai_recommender"))
+sys.path.append(os.path.join(BASE_DIR, "ai_virtual_assistant"))
+from ollama_common.admission import AdmissionController, install_admission
+from ollama_common.cache import ResponseCache, set_cache_headers
+from ollama_common.client import OllamaClient, OllamaError
+from ollama_common.legal import ContractAnalyzer, split_clauses
+from ollama_common.metrics import install_metrics
+from ollama_common.sessions import SessionStore
+from ollama_common.streaming import sse_response, stream_response
+from ollama_common.warmup import ModelKeeper
+from assistants import ASSISTANTS
+from catalog import CATALOG_INDEX_DIR, CATALOG_TOP_K, ProductCatalog, format_candidates
+from tasks import ReminderDispatcher, ReminderInbox, TaskStore, is_task_request, save_task, user_id_of
+
+# One pooled Ollama client, admission queue and session store for every assistant
+ollama = OllamaClient()
+admission = AdmissionController()
+sessions = SessionStore()
+
+# Preload each distinct model once, however many assistants use it
+keepers = {model: ModelKeeper(ollama, model) for model in dict.fromkeys(a["model"] for a in ASSISTANTS)}
+
+# State behind the optional assistant features
+catalog = ProductCatalog(ollama, index_dir=os.path.join(BASE_DIR, "ecommerce_ai_recommender", CATALOG_INDEX_DIR))
+task_store = TaskStore()
+inbox = ReminderInbox(task_store)
+dispatcher = ReminderDispatcher(task_store, on_fire=inbox.notify)
+caches = {}
+analyzers = {}
+
+@asynccontextmanager
+async def lifespan(app):
+    for keeper in keepers.values():
+        keeper.start()
+    dispatcher.start()
+    yield
+    await dispatcher.stop()
+    for keeper in keepers.values():
+        await keeper.stop()
+    await ollama.close()
+    for cache in caches.values():
+        cache.close()
+    task_store.close()
+
+app = FastAPI(lifespan=lifespan)
+install_admission(app, admission)
+install_metrics(app)
+
+@app.get("/")
+def list_assistants():
+    """ List the mounted assistants and where to find them """
+    return {"assistants": [{"name": a["name"], "page": f"/{a['name']}/", "endpoint": f"/{a['name']}{a['route']}",
+                            "model": a["model"]} for a in ASSISTANTS]}
+
+@app.get("/ready")
+def readiness():
+    """ Ready once every model used by an assistant is loaded """
+    models = {model: keeper.ready for model, keeper in keepers.items()}
+    if not all(models.values()):
+        return JSONResponse(status_code=503, content={"status": "loading", "models": models})
+    return {"status": "ready", "models": models}
+
+# Read the assistant's fields from the query string and, for form posts, the body
+async def read_fields(request, assistant):
+    fields = dict(assistant.get("defaults", {}))
+    fields.update(request.query_params)
+    if request.headers.get("content-type", "").startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+        fields.update((k, v) for k, v in (await request.form()).items() if isinstance(v, str))
+
+    missing = [name for name in assistant["inputs"] if not fields.get(name)]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing field: {', '.join(missing)}")
+    return fields
+
+def read_top_k(fields):
+    try:
+        top_k = int(fields.get("top_k") or CATALOG_TOP_K)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="top_k must be a whole number")
+    if top_k < 1:
+        raise HTTPException(status_code=422, detail="top_k must be at least 1")
+    return top_k
+
+def render_prompt(assistant, fields):
+    template = assistant["template"]
+    if "template_by" in assistant:
+        template = template.get(fields[assistant["template_by"]])
+        if template is None:
+            raise HTTPException(status_code=400, detail=f"Invalid {assistant['template_by']} selected.")
+    return template.format(**fields)
+
+async def generate(assistant, endpoint, prompt, session):
+    """ Non-streaming generation through the cache, the session context and the admission queue """
+    cache = caches.get(assistant["name"])
+    cache_key = cache.key(assistant["model"], prompt) if cache else None
+    if cache_key:
+        cached, tier = await cache.get(cache_key)
+        if cached:
+            return cached, tier
+
+    if session is not None:
+        async with session.lock:
+            async with admission.admit(endpoint):
+                json_response = await ollama.generate(assistant["model"], prompt, affinity=session.id,
+                                                      **sessions.options(session))
+            sessions.update(session, json_response.get("context"))
+    else:
+        async with admission.admit(endpoint):
+            json_response = await ollama.generate(assistant["model"], prompt)
+
+    if cache_key:
+        await cache.set(cache_key, json_response)
+    return json_response, None
+
+async def generate_stream(assistant, endpoint, prompt, session):
+    """ Streaming generation, relayed as Server-Sent Events """
+    model = assistant["model"]
+    if session is not None:
+        response = await stream_response(sessions.stream_turn(session, lambda options: admission.admit_stream(
+            endpoint, ollama.generate_stream(model, prompt, affinity=session.id, **options))))
+        response.headers["X-Session-Id"] = session.id
+        return response
+
+    cache = caches.get(assistant["name"])
+    if cache is None:
+        return await stream_response(admission.admit_stream(endpoint, ollama.generate_stream(model, prompt)))
+
+    cache_key = cache.key(model, prompt)
+    cached, tier = await cache.get(cache_key)
+    if cached:
+        return set_cache_headers(await stream_response(cache.replay(cached)), tier)
+    chunks = admission.admit_stream(endpoint, ollama.generate_stream(model, prompt))
+    return set_cache_headers(await stream_response(cache.store_stream(cache_key, chunks)), None)
+
+def mount_assistant(assistant):
+    name = assistant["name"]
+    endpoint = f"/{name}{assistant['route']}"
+    features = assistant.get("features", [])
+    admission.register(endpoint, max_concurrency=assistant.get("max_concurrency"),
+                       priority=assistant["priority"])
+    # Each assistant caches with its own settings, so one assistant's normalization never merges another's prompts
+    if "cache" in features:
+        caches[name] = ResponseCache(name=name, **assistant.get("cache", {}))
+    if "map_reduce" in features:
+        analyzers[name] = ContractAnalyzer(ollama, admission, caches[name], assistant["model"], endpoint)
+
+    async def handle(request: Request, response: Response):
+        fields = await read_fields(request, assistant)
+        stream = assistant.get("stream", True) and str(fields.get("stream", "")).lower() in ("1", "true", "yes", "on")
+        extra = {}
+
+        try:
+            # Long documents go through the map-reduce pipeline instead of a single prompt
+            if "map_reduce" in features:
+                text = fields[assistant["inputs"][0]]
+                if len(split_clauses(text)) > 1:
+                    if stream:
+                        return sse_response(analyzers[name].analyze_events(text))
+                    return await analyzers[name].analyze(text)
+
+            # Put the closest catalog products in the prompt
+            if "retrieval" in features:
+                top_k = read_top_k(fields)
+                extra["candidates"] = await catalog.retrieve(fields[assistant["inputs"][0]], fields.get("category"), top_k)
+                fields["catalog"] = format_candidates(extra["candidates"])
+
+            prompt = render_prompt(assistant, fields)
+            session = sessions.get_or_create(fields.get("session_id")) if "sessions" in features else None
+
+            if stream:
+                return await generate_stream(assistant, endpoint, prompt, session)
+            json_response, tier = await generate(assistant, endpoint, prompt, session)
+        except OllamaError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        if "cache" in features:
+            set_cache_headers(response, tier)
+
+        text = json_response.get("response") or assistant["fallback"]
+        if text is None:
+            raise HTTPException(status_code=500, detail="No valid response received from Ollama")
+        if session is not None:
+            extra["session_id"] = session.id
+
+        # Save scheduled tasks and reminders, returning only the task that was created
+        if "tasks" in features:
+            user_query = fields[assistant["inputs"][0]]
+            extra["task"] = None
+            if is_task_request(user_query):
+                extra["task"] = await save_task(task_store, dispatcher, user_id_of(request, response), user_query)
+                text += f"\nTask Scheduled: {user_query}"
+
+        return {assistant["response_key"]: text, **extra}
+
+    app.add_api_route(endpoint, handle, methods=["POST"], name=f"{name}_generate")
+
+    # Each assistant's existing page, which posts to relative URLs under /<name>/
+    page = os.path.join(BASE_DIR, assistant["directory"], "static", "index.html")
+    def serve_page(request: Request):
+        response = FileResponse(page)
+        # New visitors get their user id before the page's first requests
+        if "tasks" in features:
+            user_id_of(request, response)
+        return response
+    app.add_api_route(f"/{name}/", serve_page, methods=["GET"], name=f"{name}_page")
+    app.add_api_route(f"/{name}", lambda: RedirectResponse(f"/{name}/"), methods=["GET"], name=f"{name}_redirect")
+
+    if "sessions" in features:
+        def end_session(session_id: str):
+            """ Forget a conversation and free its context """
+            if not sessions.delete(session_id):
+                raise HTTPException(status_code=404, detail="Unknown session")
+            return {"deleted": session_id}
+        app.add_api_route(f"{endpoint}/{{session_id}}", end_session, methods=["DELETE"], name=f"{name}_end_session")
+
+    if "tasks" in features:
+        async def list_tasks(request: Request, response: Response, limit: int = Query(20), before: int = Query(None),
+                             status: str = Query(None)):
+            """ Page through the caller's tasks, newest first """
+            tasks, next_before = await asyncio.to_thread(task_store.list, user_id_of(request, response), limit,
+                                                         before, status)
+            return {"tasks": tasks, "next_before": next_before}
+        app.add_api_route(f"/{name}/tasks", list_tasks, methods=["GET"], name=f"{name}_tasks")
+
+        async def collect_reminders(request: Request, response: Response, wait: float = Query(0)):
+            """ The caller's reminders that fell due since the last call, long-polling up to ``wait`` seconds """
+            return {"reminders": await inbox.collect(user_id_of(request, response), wait)}
+        app.add_api_route(f"/{name}/reminders", collect_reminders, methods=["GET"], name=f"{name}_reminders")
+
+for assistant in ASSISTANTS:
+    mount_assistant(assistant)
+
+# Run the API server
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
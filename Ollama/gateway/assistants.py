@@ -0,0 +1,148 @@
+import os
+import sys
+
+# Make the shared Ollama helpers importable when running from this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ollama_common.admission import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+from ollama_common.legal import LEGAL_CACHE_DB, LEGAL_CACHE_TTL
+
+
+# Every assistant served by the gateway. Each one is mounted under /<name>/ with its page from
+# <directory>/static and one POST <route>, and is described by:
+#   model         Ollama model used for the assistant
+#   inputs        required request fields, read from the form body or the query string
+#   defaults      optional request fields and their default values
+#   template      prompt template filled with the request fields, or a dict of templates picked by
+#                 the value of the field named in template_by
+#   response_key  key of the generated text in the JSON response
+#   fallback      text returned when Ollama answers with an empty response (None turns it into a 500)
+#   priority      admission priority class, max_concurrency optionally caps the assistant's share
+#   stream        whether ?stream=true / stream=true relays tokens as Server-Sent Events
+#   features      optional extras: "cache" (response cache), "sessions" (multi-turn context),
+#                 "map_reduce" (clause-by-clause analysis of long documents), "retrieval" (catalog
+#                 candidates in the prompt) and "tasks" (store scheduled tasks and reminders for the user
+#                 named by a signed cookie, delivered through GET /<name>/reminders)
+#   cache         ResponseCache settings of the assistant's own cache, e.g. its prompt normalization
+ASSISTANTS = [
+    {
+        "name": "chat",
+        "directory": "AI Chat Assistant",
+        "model": "mistral",
+        "route": "/chat",
+        "inputs": ["prompt"],
+        "template": "{prompt}",
+        "response_key": "response",
+        "fallback": None,
+        "priority": PRIORITY_NORMAL,
+        "features": ["sessions"],
+    },
+    {
+        "name": "code",
+        "directory": "ai_code_assistant",
+        "model": "codellama",
+        "route": "/generate_code",
+        "inputs": ["prompt", "mode"],
+        "template_by": "mode",
+        "template": {
+            "generate": "Write a clean, well-documented {prompt} code snippet.",
+            "debug": "Debug and fix the following code:\n{prompt}",
+        },
+        "response_key": "code",
+        "fallback": "No valid response received.",
+        "priority": PRIORITY_NORMAL,
+    },
+    {
+        "name": "legal",
+        "directory": "ai_legal_analyzer",
+        "model": "phi",
+        "route": "/analyze_legal_text",
+        "inputs": ["text"],
+        "template": "Extract key insights from the following legal document:\n{text}\nSummarize important clauses, risks, and obligations.",
+        "response_key": "insights",
+        "fallback": "No insights generated.",
+        "priority": PRIORITY_NORMAL,
+        "features": ["cache", "map_reduce"],
+        "cache": {"ttl": LEGAL_CACHE_TTL, "db_path": LEGAL_CACHE_DB},
+    },
+    {
+        "name": "summarizer",
+        "directory": "ai_text_summarizer",
+        "model": "mistral",
+        "route": "/summarize",
+        "inputs": ["text"],
+        "template": "Summarize this: {text}",
+        "response_key": "summary",
+        "fallback": "No valid summary received.",
+        "priority": PRIORITY_NORMAL,
+        "features": ["cache"],
+        "cache": {"normalize_whitespace": True, "normalize_case": True},
+    },
+    {
+        "name": "assistant",
+        "directory": "ai_virtual_assistant",
+        "model": "llama2",
+        "route": "/chat",
+        "inputs": ["user_query"],
+        "template": """You are an AI-powered virtual assistant that helps with task scheduling and answering queries.
+    If the user asks to schedule a task, extract the task details and save it.
+    User: {user_query}
+    Assistant:""",
+        "response_key": "response",
+        "fallback": "I'm sorry, but I couldn't generate a response.",
+        "priority": PRIORITY_NORMAL,
+        "stream": False,
+        "features": ["tasks"],
+    },
+    {
+        "name": "support",
+        "directory": "customer_support_chatbot",
+        "model": "qwq",
+        "route": "/chat",
+        "inputs": ["user_query"],
+        "template": """You are a customer support chatbot. Answer the user's question professionally and concisely.
+    User: {user_query}
+    Chatbot:""",
+        "response_key": "response",
+        "fallback": "I'm sorry, but I couldn't generate a response.",
+        "priority": PRIORITY_NORMAL,
+        "features": ["cache"],
+        "cache": {"normalize_whitespace": True, "normalize_case": True},
+    },
+    {
+        "name": "recommender",
+        "directory": "ecommerce_ai_recommender",
+        "model": "granite3.2",
+        "route": "/recommend",
+        "inputs": ["preferences"],
+        "defaults": {"category": None, "top_k": None},
+        "template": """You are an AI product recommender. Based on the user's preferences, suggest the best matching products.
+    Only recommend products from this catalog:
+    {catalog}
+
+    User Preferences: {preferences}
+
+    Recommended Products:
+    """,
+        "response_key": "recommendations",
+        "fallback": "No recommendations found.",
+        "priority": PRIORITY_LOW,
+        "features": ["retrieval"],
+    },
+    {
+        "name": "symptoms",
+        "directory": "medical_ai_symptom_checker",
+        "model": "medllama2",
+        "route": "/analyze_symptoms",
+        "inputs": ["symptoms"],
+        "template": """You are a medical AI assistant trained to analyze symptoms.
+    Based on the provided symptoms, give possible explanations and general advice.
+    Do not provide a diagnosis or replace a doctor's consultation.
+
+    User Symptoms: {symptoms}
+
+    Medical AI:""",
+        "response_key": "response",
+        "fallback": "I'm sorry, but I couldn't generate a response.",
+        "priority": PRIORITY_HIGH,
+    },
+]
@@ -1,27 +1,52 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Form
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-import requests
 import os
-import json
+import sys
 
-app = FastAPI()
+# Make the shared Ollama helpers importable when running from this directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ollama_common.admission import AdmissionController, PRIORITY_HIGH, install_admission
+from ollama_common.client import OllamaClient, OllamaError
+from ollama_common.metrics import install_metrics
+from ollama_common.streaming import stream_response
+from ollama_common.warmup import ModelKeeper, install_readiness
+
+MODEL_NAME = "medllama2"  # Using MedLLaMA 2 for symptom analysis
+
+# One pooled Ollama client per process, shared by every request
+ollama = OllamaClient()
+
+# Preload the model on startup and keep it resident between requests
+keeper = ModelKeeper(ollama, MODEL_NAME)
+
+# Bounded, prioritised admission queue in front of the Ollama calls
+admission = AdmissionController()
+admission.register("/analyze_symptoms", priority=PRIORITY_HIGH)
+
+@asynccontextmanager
+async def lifespan(app):
+    keeper.start()
+    yield
+    await keeper.stop()
+    await ollama.close()
+
+app = FastAPI(lifespan=lifespan)
+install_admission(app, admission)
+install_metrics(app)
+install_readiness(app, keeper)
 
 # Serve static files (HTML, CSS, JS)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MODEL_NAME = "medllama2"  # Using MedLLaMA 2 for symptom analysis
-
 @app.get("/")
 def serve_homepage():
     """ Serve the index.html file when accessing the root URL """
     return FileResponse(os.path.join("static", "index.html"))
 
 @app.post("/analyze_symptoms")
-def analyze_symptoms(symptoms: str = Form(...)):
-    headers = {"Content-Type": "application/json"}
-
+async def analyze_symptoms(symptoms: str = Form(...), stream: bool = Form(False)):
     prompt = f"""You are a medical AI assistant trained to analyze symptoms. 
     Based on the provided symptoms, give possible explanations and general advice. 
     Do not provide a diagnosis or replace a doctor's consultation.
@@ -30,28 +55,22 @@ def analyze_symptoms(symptoms: str = Form(...)):
     
     Medical AI:"""
 
-    try:
-        # Send the symptoms to MedLLaMA 2
-        response = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL_NAME, "prompt": prompt, "stream": False},
-            headers=headers
-        )
-
-        print("Ollama Response:", response.text)
-
-        # Ensure valid JSON response
-        response_data = response.text.strip()
+    # Relay tokens as Server-Sent Events when the client asks for streaming
+    if stream:
         try:
-            json_response = json.loads(response_data)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail=f"Invalid JSON response from Ollama: {response_data}")
+            return await stream_response(admission.admit_stream("/analyze_symptoms", ollama.generate_stream(MODEL_NAME, prompt)))
+        except OllamaError as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-        ai_response = json_response.get("response", "I'm sorry, but I couldn't generate a response.")
-        return {"response": ai_response}
+    try:
+        # Send the symptoms to MedLLaMA 2
+        async with admission.admit("/analyze_symptoms"):
+            json_response = await ollama.generate(MODEL_NAME, prompt)
+    except OllamaError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Request to Ollama failed: {str(e)}")
+    ai_response = json_response.get("response", "I'm sorry, but I couldn't generate a response.")
+    return {"response": ai_response}
 
 # Run the API server
 if __name__ == "__main__":
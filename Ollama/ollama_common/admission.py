@@ -0,0 +1,227 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi.responses import JSONResponse
+
+from .metrics import ADMISSION_REJECTED, ADMISSION_WAIT, Gauge, register_gauge, timings
+
+
+# Admission settings shared by every app under Ollama/
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_ADMISSION_MAX_CONCURRENCY",
+                                               os.environ.get("OLLAMA_MAX_CONCURRENCY", "16")))
+ADMISSION_MAX_QUEUE = int(os.environ.get("OLLAMA_ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("OLLAMA_ADMISSION_QUEUE_TIMEOUT", "30"))
+
+# Priority classes, lower values are admitted first
+PRIORITY_CRITICAL = 0
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 2
+PRIORITY_LOW = 3
+
+# Classes a client may ask for with the X-Priority header. The header can only lower a request below its
+# endpoint's class, so an unauthenticated caller never overtakes a more important endpoint.
+REQUEST_PRIORITIES = {"high": PRIORITY_HIGH, "normal": PRIORITY_NORMAL, "low": PRIORITY_LOW}
+PRIORITY_NAMES = {PRIORITY_CRITICAL: "critical", PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+# Priority requested by the request being served, set by the middleware install_admission() adds
+current_priority = contextvars.ContextVar("ollama_request_priority", default=None)
+
+
+class AdmissionRejected(Exception):
+    """ Raised when a request is turned away instead of being queued for Ollama """
+
+    def __init__(self, status_code, detail, retry_after):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _Endpoint:
+    def __init__(self, max_concurrency, priority):
+        self.max_concurrency = max_concurrency
+        self.priority = priority
+        self.in_flight = 0
+        self.queued = 0
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "endpoint", "future")
+
+    def __init__(self, priority, seq, endpoint, future):
+        self.priority = priority
+        self.seq = seq
+        self.endpoint = endpoint
+        self.future = future
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """ Bounded, priority-ordered admission queue in front of the Ollama calls.
+
+    At most ``max_concurrency`` requests run at once across all endpoints, and
+    each endpoint is further capped by the limit given to register(). Waiting
+    requests are admitted by priority class, then arrival order. A request's
+    class is the class its endpoint was registered with, or its X-Priority
+    header (high, normal or low) when that is lower, so background callers can
+    step aside for interactive ones without being able to jump ahead. A request is
+    rejected with 429 when ``max_queue`` requests are already waiting, and with
+    503 once it has waited ``queue_timeout`` seconds; both carry a Retry-After
+    estimate derived from recent service times.
+    """
+
+    def __init__(self, max_concurrency=ADMISSION_MAX_CONCURRENCY,
+                 max_queue=ADMISSION_MAX_QUEUE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._endpoints = {}
+        self._queue = []
+        self._seq = itertools.count()
+        self._queued = 0
+        self._in_flight = 0
+        self._service_time = None
+
+    def register(self, endpoint, max_concurrency=None, priority=PRIORITY_NORMAL):
+        self._endpoints[endpoint] = _Endpoint(max_concurrency or self.max_concurrency, priority)
+
+    def _endpoint(self, endpoint):
+        if endpoint not in self._endpoints:
+            self.register(endpoint)
+        return self._endpoints[endpoint]
+
+    def _retry_after(self):
+        if self._service_time is None:
+            return 1
+        return max(1, math.ceil((self._queued + 1) * self._service_time / self.max_concurrency))
+
+    def _dispatch(self):
+        # Grant queued requests in priority order while there is spare capacity
+        skipped = []
+        while self._queue and self._in_flight < self.max_concurrency:
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                continue
+            state = self._endpoints[waiter.endpoint]
+            if state.in_flight >= state.max_concurrency:
+                skipped.append(waiter)
+                continue
+            state.in_flight += 1
+            state.queued -= 1
+            self._in_flight += 1
+            self._queued -= 1
+            waiter.future.set_result(None)
+        for waiter in skipped:
+            heapq.heappush(self._queue, waiter)
+
+    def _release(self, endpoint, started):
+        state = self._endpoints[endpoint]
+        state.in_flight -= 1
+        self._in_flight -= 1
+        elapsed = time.perf_counter() - started
+        self._service_time = elapsed if self._service_time is None else 0.8 * self._service_time + 0.2 * elapsed
+        self._dispatch()
+
+    def _record_wait(self, endpoint, priority, seconds):
+        ADMISSION_WAIT.observe((endpoint, PRIORITY_NAMES.get(priority, str(priority))), seconds)
+
+    async def acquire(self, endpoint, priority=None):
+        state = self._endpoint(endpoint)
+        if priority is None:
+            # Lower values go first, so max() lets the header demote the request but never promote it
+            requested = current_priority.get()
+            priority = state.priority if requested is None else max(state.priority, requested)
+        waiter = _Waiter(priority, next(self._seq), endpoint, asyncio.get_running_loop().create_future())
+        enqueued = time.perf_counter()
+
+        heapq.heappush(self._queue, waiter)
+        state.queued += 1
+        self._queued += 1
+        self._dispatch()
+
+        if not waiter.future.done() and self._queued > self.max_queue:
+            waiter.future.cancel()
+            state.queued -= 1
+            self._queued -= 1
+            ADMISSION_REJECTED.inc((endpoint, "queue_full"))
+            raise AdmissionRejected(429, "Too many requests queued for Ollama", self._retry_after())
+
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted at the same moment the caller gave up; hand the slot back
+                self._release(endpoint, time.perf_counter())
+            else:
+                state.queued -= 1
+                self._queued -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSION_REJECTED.inc((endpoint, "timeout"))
+                raise AdmissionRejected(503, "Timed out waiting for Ollama capacity", self._retry_after())
+            raise
+
+        waited = time.perf_counter() - enqueued
+        self._record_wait(endpoint, priority, waited)
+        request_timings = timings()
+        if request_timings is not None:
+            request_timings.queue_wait += waited
+
+    @asynccontextmanager
+    async def admit(self, endpoint, priority=None):
+        """ Hold one admission slot for ``endpoint`` for the duration of the block """
+        await self.acquire(endpoint, priority)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(endpoint, started)
+
+    async def admit_stream(self, endpoint, chunks, priority=None):
+        """ Wrap a streaming generation so the slot is held until the stream finishes """
+        async with self.admit(endpoint, priority):
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+
+
+class PriorityMiddleware:
+    """ ASGI middleware reading the X-Priority header into ``current_priority`` """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        header = dict(scope["headers"]).get(b"x-priority", b"").decode("latin-1").strip().lower()
+        token = current_priority.set(REQUEST_PRIORITIES.get(header))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_priority.reset(token)
+
+
+# Turn rejections into 429/503 responses with Retry-After, honour X-Priority and export the queue to /metrics
+def install_admission(app, controller):
+    app.add_middleware(PriorityMiddleware)
+
+    @app.exception_handler(AdmissionRejected)
+    async def admission_rejected(request, exc):
+        return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail},
+                            headers={"Retry-After": str(exc.retry_after)})
+
+    register_gauge(Gauge("ollama_admission_queue_depth", "Requests waiting for an admission slot", ("endpoint",),
+                         lambda: {(name,): s.queued for name, s in controller._endpoints.items()}))
+    register_gauge(Gauge("ollama_admission_in_flight", "Requests holding an admission slot", ("endpoint",),
+                         lambda: {(name,): s.in_flight for name, s in controller._endpoints.items()}))
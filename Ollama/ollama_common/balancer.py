@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+
+
+# Ollama reports resident models with their tag, e.g. "mistral:latest"
+def normalize_model(name):
+    return name if ":" in name else f"{name}:latest"
+
+
+class Backend:
+    """ Routing state for one Ollama endpoint """
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.in_flight = 0
+        self.latency = None  # exponentially weighted request latency, seconds
+        self.loaded_models = set()
+        self.healthy = True
+        self.failures = 0
+
+    def record_latency(self, seconds, alpha=0.2):
+        self.latency = seconds if self.latency is None else (1 - alpha) * self.latency + alpha * seconds
+
+    def snapshot(self):
+        return {"url": self.url, "healthy": self.healthy, "in_flight": self.in_flight,
+                "latency": self.latency, "loaded_models": sorted(self.loaded_models)}
+
+
+class OllamaBalancer:
+    """ Routes each request to the least-loaded healthy backend that already has the model resident.
+
+    Backends are evicted after ``max_failures`` consecutive request or health check
+    failures and re-admitted once a health check against /api/ps succeeds again.
+    When every backend is evicted, all of them are tried rather than failing outright.
+    """
+
+    def __init__(self, urls, health_interval=10.0, health_timeout=2.0, max_failures=3):
+        if not urls:
+            raise ValueError("At least one Ollama backend URL is required")
+        self.backends = [Backend(url) for url in urls]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.max_failures = max_failures
+
+    def pick(self, model, exclude=(), affinity=None):
+        candidates = [b for b in self.backends if b.healthy and b not in exclude]
+        if not candidates:
+            candidates = [b for b in self.backends if b not in exclude] or self.backends
+
+        # Requests sharing an affinity key (e.g. a chat session) stick to one backend, where Ollama
+        # still holds their KV cache; rendezvous hashing only moves keys off a backend that goes away
+        if affinity is not None:
+            return max(candidates, key=lambda b: hashlib.sha1(f"{affinity}|{b.url}".encode()).digest())
+
+        model = normalize_model(model)
+        resident = [b for b in candidates if model in b.loaded_models]
+        pool = resident or candidates
+
+        # Fewest in-flight requests first, then the historically fastest backend
+        return min(pool, key=lambda b: (b.in_flight, b.latency if b.latency is not None else 0.0))
+
+    def mark_success(self, backend):
+        backend.failures = 0
+        backend.healthy = True
+
+    def mark_failure(self, backend):
+        backend.failures += 1
+        if backend.failures >= self.max_failures:
+            backend.healthy = False
+
+    @asynccontextmanager
+    async def route(self, model, exclude=(), affinity=None):
+        """ Reserve a backend for one request, tracking in-flight count, latency and failures """
+        backend = self.pick(model, exclude, affinity)
+        backend.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield backend
+        except (httpx.HTTPError, OSError):
+            self.mark_failure(backend)
+            raise
+        else:
+            self.mark_success(backend)
+            backend.record_latency(time.perf_counter() - start)
+            # A successful generate leaves the model loaded on that backend
+            backend.loaded_models.add(normalize_model(model))
+        finally:
+            backend.in_flight -= 1
+
+    async def check(self, client, backend):
+        try:
+            response = await client.get(f"{backend.url}/api/ps", timeout=self.health_timeout)
+            response.raise_for_status()
+            models = response.json().get("models", [])
+        except (httpx.HTTPError, ValueError):
+            self.mark_failure(backend)
+            return
+        backend.loaded_models = {m.get("name") or m.get("model") for m in models}
+        self.mark_success(backend)
+
+    async def refresh(self, client):
+        await asyncio.gather(*(self.check(client, b) for b in self.backends))
+
+    async def run_health_checks(self, client):
+        while True:
+            await self.refresh(client)
+            await asyncio.sleep(self.health_interval)
+
+    def snapshot(self):
+        return [b.snapshot() for b in self.backends]
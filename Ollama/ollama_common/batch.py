@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+import uuid
+
+
+# Upper bound on per-batch parallelism, whatever the client asks for
+BATCH_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_BATCH_MAX_CONCURRENCY", "8"))
+
+
+def json_items(body):
+    """ Parse a JSON array body up front and return an async iterator of ``(index, item)`` """
+    items = json.loads(body)
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array of items")
+
+    async def iterate():
+        for index, item in enumerate(items):
+            yield index, item
+    return iterate()
+
+
+async def ndjson_items(chunks):
+    """ Yield ``(index, item)`` for every line of an NDJSON body, given as bytes or an async byte stream """
+    if isinstance(chunks, bytes):
+        chunks = _single(chunks)
+    buffer = b""
+    index = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, _decode_line(line)
+                index += 1
+    if buffer.strip():
+        yield index, _decode_line(buffer)
+
+
+async def _single(body):
+    yield body
+
+
+def _decode_line(line):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        # Surfaced as a per-item error rather than failing the whole batch
+        return {"invalid": line.decode("utf-8", "replace")}
+
+
+class BatchRunner:
+    """ Runs batches of items through an async worker with bounded parallelism.
+
+    Results are yielded as soon as each item finishes, not in input order, and
+    every result carries the item's index, id and status. A batch stops early
+    when cancel() is called with its id or when the consumer goes away; items
+    still in flight are then cancelled.
+    """
+
+    def __init__(self, max_concurrency=BATCH_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._batches = {}
+
+    def new_batch(self):
+        batch_id = uuid.uuid4().hex
+        self._batches[batch_id] = asyncio.Event()
+        return batch_id
+
+    def cancel(self, batch_id):
+        event = self._batches.get(batch_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+    async def _run_one(self, worker, index, item):
+        item_id = item.get("id", index) if isinstance(item, dict) else index
+        try:
+            result = await worker(item)
+        except Exception as e:
+            return {"index": index, "id": item_id, "status": "error", "detail": str(e)}
+        return {"index": index, "id": item_id, "status": "ok", **result}
+
+    async def run(self, batch_id, items, worker, concurrency=None):
+        concurrency = max(1, min(concurrency or self.max_concurrency, self.max_concurrency))
+        cancelled = self._batches[batch_id]
+        pending = set()
+        source = items.__aiter__()
+        exhausted = False
+        counts = {"ok": 0, "error": 0}
+
+        try:
+            while True:
+                # Top up the in-flight set from the input until the parallelism limit is reached
+                while not exhausted and not cancelled.is_set() and len(pending) < concurrency:
+                    try:
+                        index, item = await anext(source)
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.create_task(self._run_one(worker, index, item)))
+
+                if not pending or cancelled.is_set():
+                    break
+
+                cancel_wait = asyncio.create_task(cancelled.wait())
+                done, _ = await asyncio.wait(pending | {cancel_wait}, return_when=asyncio.FIRST_COMPLETED)
+                cancel_wait.cancel()
+
+                for task in done & pending:
+                    pending.discard(task)
+                    result = task.result()
+                    counts[result["status"]] += 1
+                    yield result
+
+            yield {"done": True, "batch_id": batch_id, "succeeded": counts["ok"], "failed": counts["error"],
+                   "cancelled": cancelled.is_set()}
+        finally:
+            for task in pending:
+                task.cancel()
+            self._batches.pop(batch_id, None)
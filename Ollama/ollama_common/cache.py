@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES
+
+
+# Response cache settings shared by every app under Ollama/
+CACHE_MAX_ENTRIES = int(os.environ.get("OLLAMA_CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL = float(os.environ.get("OLLAMA_CACHE_TTL", "3600"))
+CACHE_DB_PATH = os.environ.get("OLLAMA_CACHE_DB")  # unset keeps the cache in memory only
+CACHE_DB_MAX_ENTRIES = int(os.environ.get("OLLAMA_CACHE_DB_MAX_ENTRIES", "100000"))
+
+# Only the generated text and Ollama's stats are kept, the context tokens can be very large
+_UNCACHED_FIELDS = ("context",)
+
+
+class _DiskTier:
+    """ SQLite-backed second tier, shared safely between apps through WAL mode """
+
+    def __init__(self, path, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                  key TEXT PRIMARY KEY,
+                                  value TEXT NOT NULL,
+                                  expires_at REAL NOT NULL,
+                                  accessed_at REAL NOT NULL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key):
+        """ Return ``(value, expires_at)`` for a live entry, or ``(None, None)`` """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None, None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None, None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, ttl):
+        """ Store an entry; returns how many least recently used entries were evicted to make room """
+        now = time.time()
+        evicted = 0
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                               (key, json.dumps(value), now + ttl, now))
+            self._writes += 1
+            # Evict expired rows, then the least recently used, every so often rather than on each write
+            if self._writes % 100 == 0:
+                self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+                evicted = self._conn.execute("""DELETE FROM responses WHERE key IN (
+                                                    SELECT key FROM responses ORDER BY accessed_at
+                                                    LIMIT max(0, (SELECT count(*) FROM responses) - ?))""",
+                                             (self.max_entries,)).rowcount
+            self._conn.commit()
+        return evicted
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """ Two-tier cache of Ollama generations keyed on (model, rendered prompt, options).
+
+    The first tier is an in-process LRU bounded by ``max_entries``; the optional
+    second tier is a SQLite file at ``db_path`` bounded by ``max_db_entries``.
+    Entries expire after ``ttl`` seconds in both tiers. ``normalize_whitespace``
+    and ``normalize_case`` are applied to the prompt before hashing, so inputs
+    that differ only in spacing or capitalisation share one entry. Hits,
+    misses and evictions are counted in /metrics under the cache's ``name``.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL,
+                 db_path=CACHE_DB_PATH, max_db_entries=CACHE_DB_MAX_ENTRIES,
+                 normalize_whitespace=False, normalize_case=False, name="default"):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.normalize_whitespace = normalize_whitespace
+        self.normalize_case = normalize_case
+        self._memory = OrderedDict()
+        self._disk = _DiskTier(db_path, max_db_entries) if db_path else None
+
+    def normalize(self, prompt):
+        if self.normalize_whitespace:
+            prompt = re.sub(r"\s+", " ", prompt).strip()
+        if self.normalize_case:
+            prompt = prompt.casefold()
+        return prompt
+
+    def key(self, model, prompt, options=None):
+        material = json.dumps({"model": model, "prompt": self.normalize(prompt), "options": options or {}},
+                              sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            CACHE_EVICTIONS.inc((self.name, "memory"))
+
+    async def get(self, key):
+        """ Return ``(value, tier)`` for a live entry, or ``(None, None)`` on a miss """
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at >= time.time():
+                self._memory.move_to_end(key)
+                CACHE_HITS.inc((self.name, "memory"))
+                return value, "memory"
+            del self._memory[key]
+
+        if self._disk is not None:
+            value, expires_at = await asyncio.to_thread(self._disk.get, key)
+            if value is not None:
+                # Promoted entries keep their remaining lifetime, not a fresh ttl
+                self._remember(key, value, expires_at)
+                CACHE_HITS.inc((self.name, "disk"))
+                return value, "disk"
+
+        CACHE_MISSES.inc((self.name,))
+        return None, None
+
+    async def set(self, key, value):
+        if not value.get("response"):
+            return
+        value = {k: v for k, v in value.items() if k not in _UNCACHED_FIELDS}
+        self._remember(key, value, time.time() + self.ttl)
+        if self._disk is not None:
+            evicted = await asyncio.to_thread(self._disk.set, key, value, self.ttl)
+            if evicted:
+                CACHE_EVICTIONS.inc((self.name, "disk"), evicted)
+
+    async def store_stream(self, key, chunks):
+        """ Pass a streaming generation through, caching the assembled response once it completes """
+        tokens = []
+        try:
+            async for chunk in chunks:
+                tokens.append(chunk.get("response", ""))
+                if chunk.get("done"):
+                    await self.set(key, {**chunk, "response": "".join(tokens)})
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    @staticmethod
+    async def replay(value):
+        """ Replay a cached response in the same chunk shape as a live stream """
+        yield {"response": value["response"], "done": False}
+        yield {**value, "response": "", "done": True}
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+
+
+# Tell clients whether the body came from the cache, and from which tier
+def set_cache_headers(response, tier):
+    response.headers["X-Cache"] = "HIT" if tier else "MISS"
+    if tier:
+        response.headers["X-Cache-Tier"] = tier
+    return response
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import httpx
+
+from .balancer import OllamaBalancer, normalize_model
+from .metrics import Gauge, register_gauge, sampled, timings
+from .singleflight import SingleFlight
+
+
+logger = logging.getLogger(__name__)
+
+
+# Ollama settings shared by every app under Ollama/
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+
+# Comma-separated list of Ollama endpoints to balance across, defaults to the single base URL
+OLLAMA_BACKENDS = [u.strip() for u in os.environ.get("OLLAMA_BACKENDS", OLLAMA_BASE_URL).split(",") if u.strip()]
+OLLAMA_HEALTH_INTERVAL = float(os.environ.get("OLLAMA_HEALTH_INTERVAL", "10"))
+OLLAMA_MAX_FAILURES = int(os.environ.get("OLLAMA_MAX_FAILURES", "3"))
+
+# Generations can take minutes on CPU, so only the connect phase is kept short
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", "300"))
+
+# Connection pool and concurrency limits
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "64"))
+OLLAMA_MAX_KEEPALIVE = int(os.environ.get("OLLAMA_MAX_KEEPALIVE", "16"))
+OLLAMA_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_MAX_CONCURRENCY", "16"))
+
+# How long Ollama keeps a model resident after each request, e.g. "30m" or "-1" for forever
+OLLAMA_MODEL_KEEP_ALIVE = os.environ.get("OLLAMA_MODEL_KEEP_ALIVE", "30m")
+
+# Share one generation between concurrent identical requests
+OLLAMA_SINGLEFLIGHT = os.environ.get("OLLAMA_SINGLEFLIGHT", "1") == "1"
+
+# Errors raised before a request reaches Ollama, safe to retry on another backend
+_CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+class OllamaError(Exception):
+    """ Raised when Ollama cannot be reached or returns an unusable response """
+
+
+def _connect_tracer():
+    """ httpx trace hook adding the time spent opening connections to the current request's timings """
+    started = None
+
+    async def trace(event_name, info):
+        nonlocal started
+        request_timings = timings()
+        if request_timings is None:
+            return
+        # Pooled connections skip these events, so a reused connection counts as zero
+        if event_name in ("connection.connect_tcp.started", "connection.start_tls.started"):
+            started = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete") and started is not None:
+            request_timings.connect += time.perf_counter() - started
+            started = None
+    return {"trace": trace}
+
+
+def _record_response(model, response):
+    request_timings = timings()
+    if request_timings is not None:
+        request_timings.record_ollama(model, response)
+    # Full generations are only logged for a sample of requests
+    if logger.isEnabledFor(logging.DEBUG) and sampled():
+        logger.debug("Ollama response from %s: %s", model, response)
+
+
+def _error_detail(response):
+    """ Ollama's ``{"error": ...}`` message from a failed response, or its raw body """
+    try:
+        return response.json()["error"]
+    except (ValueError, KeyError, TypeError):
+        return response.text.strip() or response.reason_phrase
+
+
+async def _instrument_stream(model, chunks):
+    try:
+        async for chunk in chunks:
+            if chunk.get("response"):
+                request_timings = timings()
+                if request_timings is not None:
+                    request_timings.record_first_token()
+            if chunk.get("done"):
+                _record_response(model, chunk)
+            yield chunk
+    finally:
+        await chunks.aclose()
+
+
+class OllamaClient:
+    """ Async Ollama client holding one keep-alive connection pool per process.
+
+    Requests are spread over ``base_urls`` by an OllamaBalancer, and a request
+    that cannot connect is retried once per remaining backend. Concurrent
+    identical requests share a single generation unless ``singleflight`` is
+    off. The underlying httpx.AsyncClient and the background health checks
+    start lazily on first use so the client can be built at import time, and
+    must be released with close() when the app shuts down.
+    """
+
+    def __init__(self, base_urls=None,
+                 connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+                 read_timeout=OLLAMA_READ_TIMEOUT,
+                 max_connections=OLLAMA_MAX_CONNECTIONS,
+                 max_keepalive=OLLAMA_MAX_KEEPALIVE,
+                 max_concurrency=OLLAMA_MAX_CONCURRENCY,
+                 health_interval=OLLAMA_HEALTH_INTERVAL,
+                 max_failures=OLLAMA_MAX_FAILURES,
+                 singleflight=OLLAMA_SINGLEFLIGHT,
+                 keep_alive=OLLAMA_MODEL_KEEP_ALIVE):
+        self.balancer = OllamaBalancer(base_urls or OLLAMA_BACKENDS,
+                                       health_interval=health_interval,
+                                       max_failures=max_failures)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive)
+        self.max_concurrency = max_concurrency
+        self.keep_alive = keep_alive
+        self._client = None
+        self._semaphore = None
+        self._health_task = None
+        self._flights = SingleFlight() if singleflight else None
+        if self._flights is not None:
+            register_gauge(Gauge("ollama_singleflight_in_flight", "Generations currently shared by identical requests", (),
+                                 lambda: {(): self._flights.in_flight()}))
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._health_task = asyncio.create_task(self.balancer.run_health_checks(self._client))
+        return self._client
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _retry_or_raise(self, tried, backend, error):
+        tried.append(backend)
+        if len(tried) >= len(self.balancer.backends):
+            raise OllamaError(f"Request to Ollama failed: {str(error) or type(error).__name__}") from error
+
+    async def _preload_backend(self, client, backend, model, keep_alive):
+        payload = {"model": model, "prompt": "", "stream": False, "keep_alive": keep_alive}
+        try:
+            response = await client.post(f"{backend.url}/api/generate", json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.balancer.mark_failure(backend)
+            return False
+        backend.loaded_models.add(normalize_model(model))
+        return True
+
+    async def preload(self, model, keep_alive=None):
+        """ Load ``model`` on every healthy backend (an empty prompt only loads it) and refresh its keep-alive """
+        client = self._get_client()
+        backends = [b for b in self.balancer.backends if b.healthy] or self.balancer.backends
+        results = await asyncio.gather(*(self._preload_backend(client, b, model, keep_alive or self.keep_alive)
+                                         for b in backends))
+        return sum(results)
+
+    async def is_resident(self, model):
+        """ Ask every backend which models it holds and report whether ``model`` is loaded on a healthy one """
+        await self.balancer.refresh(self._get_client())
+        model = normalize_model(model)
+        return any(b.healthy and model in b.loaded_models for b in self.balancer.backends)
+
+    @staticmethod
+    def _flight_key(payload):
+        return json.dumps(payload, sort_keys=True)
+
+    async def generate(self, model, prompt, affinity=None, **options):
+        """ Run a non-streaming /api/generate call and return the decoded JSON body.
+        Calls with the same ``affinity`` key are routed to the same backend while it is healthy. """
+        payload = {"model": model, "prompt": prompt, "stream": False, "keep_alive": self.keep_alive, **options}
+        if self._flights is None:
+            response = await self._generate(payload, affinity)
+        else:
+            response = await self._flights.do(self._flight_key(payload), lambda: self._generate(payload, affinity))
+        _record_response(model, response)
+        return response
+
+    async def generate_stream(self, model, prompt, affinity=None, **options):
+        """ Run a streaming /api/generate call, yielding each decoded NDJSON chunk as it arrives.
+        Nothing is sent (and no shared stream is joined) until the first chunk is requested, so a
+        stream still waiting in the admission queue, or rejected by it, never reaches Ollama. """
+        payload = {"model": model, "prompt": prompt, "stream": True, "keep_alive": self.keep_alive, **options}
+        if self._flights is None:
+            chunks = self._generate_stream(payload, affinity)
+        else:
+            chunks = self._flights.stream(self._flight_key(payload), lambda: self._generate_stream(payload, affinity))
+        stream = _instrument_stream(model, chunks)
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def embed(self, model, texts):
+        """ Embed a batch of texts with /api/embed and return one vector per text """
+        payload = {"model": model, "input": list(texts), "keep_alive": self.keep_alive}
+        client = self._get_client()
+        tried = []
+
+        async with self._semaphore:
+            while True:
+                try:
+                    async with self.balancer.route(model, exclude=tried) as backend:
+                        response = await client.post(f"{backend.url}/api/embed", json=payload,
+                                                     extensions=_connect_tracer())
+                        response.raise_for_status()
+                    break
+                except _CONNECT_ERRORS as e:
+                    self._retry_or_raise(tried, backend, e)
+                except httpx.HTTPError as e:
+                    raise OllamaError(f"Request to Ollama failed: {str(e) or type(e).__name__}") from e
+
+        try:
+            embeddings = response.json()["embeddings"]
+        except (json.JSONDecodeError, KeyError):
+            raise OllamaError(f"Invalid JSON response from Ollama: {response.text.strip()}")
+        if len(embeddings) != len(payload["input"]):
+            raise OllamaError(f"Ollama returned {len(embeddings)} embeddings for {len(payload['input'])} texts")
+        return embeddings
+
+    async def _generate(self, payload, affinity=None):
+        model = payload["model"]
+        client = self._get_client()
+        tried = []
+
+        async with self._semaphore:
+            while True:
+                try:
+                    async with self.balancer.route(model, exclude=tried, affinity=affinity) as backend:
+                        response = await client.post(f"{backend.url}/api/generate", json=payload,
+                                                     extensions=_connect_tracer())
+                    break
+                except _CONNECT_ERRORS as e:
+                    self._retry_or_raise(tried, backend, e)
+                except httpx.HTTPError as e:
+                    raise OllamaError(f"Request to Ollama failed: {str(e) or type(e).__name__}") from e
+
+        # e.g. 404 for a model that is not pulled, with the reason in {"error": ...}
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise OllamaError(f"Ollama returned HTTP {response.status_code}: {_error_detail(response)}") from e
+
+        response_data = response.text.strip()
+        try:
+            data = json.loads(response_data)
+        except json.JSONDecodeError:
+            raise OllamaError(f"Invalid JSON response from Ollama: {response_data}")
+        if "error" in data:
+            raise OllamaError(f"Ollama returned an error: {data['error']}")
+        return data
+
+    async def _generate_stream(self, payload, affinity=None):
+        model = payload["model"]
+        client = self._get_client()
+        tried = []
+
+        async with self._semaphore:
+            while True:
+                try:
+                    async with self.balancer.route(model, exclude=tried, affinity=affinity) as backend:
+                        async with client.stream("POST", f"{backend.url}/api/generate", json=payload,
+                                                 extensions=_connect_tracer()) as response:
+                            if response.is_error:
+                                await response.aread()
+                                raise OllamaError(f"Ollama returned HTTP {response.status_code}: {_error_detail(response)}")
+                            done = False
+                            async for line in response.aiter_lines():
+                                if not line.strip():
+                                    continue
+                                try:
+                                    chunk = json.loads(line)
+                                except json.JSONDecodeError:
+                                    raise OllamaError(f"Invalid JSON response from Ollama: {line}")
+                                if "error" in chunk:
+                                    raise OllamaError(f"Ollama returned an error: {chunk['error']}")
+                                done = bool(chunk.get("done"))
+                                yield chunk
+                            # A backend that dies mid-generation can close the stream cleanly, the answer is truncated
+                            if not done:
+                                raise OllamaError("Ollama stream ended before the final chunk")
+                    return
+                except _CONNECT_ERRORS as e:
+                    self._retry_or_raise(tried, backend, e)
+                except httpx.HTTPError as e:
+                    raise OllamaError(f"Request to Ollama failed: {str(e) or type(e).__name__}") from e
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import os
+import re
+
+from .admission import AdmissionRejected
+from .client import OllamaError
+from .streaming import sse_event
+
+
+# Chunk sizes are in characters; the defaults keep a chunk plus its prompt inside phi's 2k-token context
+LEGAL_CHUNK_CHARS = int(os.environ.get("LEGAL_CHUNK_CHARS", "3000"))
+LEGAL_MIN_CHUNK_CHARS = int(os.environ.get("LEGAL_MIN_CHUNK_CHARS", "300"))
+# Chunks of one document analysed in parallel
+LEGAL_MAP_CONCURRENCY = int(os.environ.get("LEGAL_MAP_CONCURRENCY", "4"))
+# Chunk and reduce answers are kept on disk, so an amended draft uploaded days later (or after a restart) reuses them
+LEGAL_CACHE_DB = os.environ.get("LEGAL_CACHE_DB", "legal_cache.db")
+LEGAL_CACHE_TTL = float(os.environ.get("LEGAL_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Numbered clauses ("1.", "2.3", "4)"), ARTICLE/SECTION/CLAUSE headings, "§ 5" or all-caps title lines
+_HEADING = re.compile(r"""^\s*(?:
+    (?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause)\s+[\dIVXLC]+
+  | \d+(?:\.\d+)*[.)]?\s+\S
+  | §\s*\d+
+  | [A-Z][A-Z0-9 ,&/'()-]{3,}$
+)""", re.VERBOSE)
+
+MAP_PROMPT = """You are reviewing one section of a legal document.
+List the important clauses, risks and obligations it contains.
+Respond only with JSON of the form {{"clauses": [...], "risks": [...], "obligations": [...]}} using short sentences.
+
+Section:
+{section}"""
+
+REDUCE_PROMPT = """Extract key insights from the following legal document.
+The document was reviewed section by section and these are the combined findings.
+
+Clauses:
+{clauses}
+
+Risks:
+{risks}
+
+Obligations:
+{obligations}
+{notes}
+Summarize important clauses, risks, and obligations."""
+
+FINDING_KINDS = ("clauses", "risks", "obligations")
+
+
+def _split_long(section, max_chars):
+    if len(section) <= max_chars:
+        return [section]
+
+    # Keep paragraphs together where possible, hard-wrap only paragraphs that are too long on their own
+    pieces, buffer = [], ""
+    for paragraph in re.split(r"\n\s*\n", section):
+        while len(paragraph) > max_chars:
+            if buffer:
+                pieces.append(buffer)
+                buffer = ""
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if buffer and len(buffer) + len(paragraph) + 2 > max_chars:
+            pieces.append(buffer)
+            buffer = paragraph
+        else:
+            buffer = f"{buffer}\n\n{paragraph}" if buffer else paragraph
+    if buffer.strip():
+        pieces.append(buffer)
+    return pieces
+
+
+def split_clauses(text, max_chars=LEGAL_CHUNK_CHARS, min_chars=LEGAL_MIN_CHUNK_CHARS):
+    """ Split a legal document into chunks along clause and section headings.
+
+    Every section becomes its own chunk, so an edit only changes the chunks of
+    the sections it touches and the rest stay cache hits. Sections shorter
+    than ``min_chars`` are folded into the following section, and sections
+    longer than ``max_chars`` are split on paragraph boundaries.
+    """
+    sections, current = [], []
+    for line in text.splitlines():
+        if _HEADING.match(line) and any(l.strip() for l in current):
+            sections.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if current:
+        sections.append("\n".join(current).strip())
+
+    chunks, pending = [], ""
+    for section in filter(None, sections):
+        if pending and len(pending) + len(section) + 2 <= max_chars:
+            section = f"{pending}\n\n{section}"
+        elif pending:
+            chunks.append(pending)
+        pending = ""
+        if len(section) < min_chars:
+            pending = section
+            continue
+        chunks.extend(_split_long(section, max_chars))
+    if pending:
+        chunks.append(pending)
+    return chunks
+
+
+def _as_strings(value):
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return []
+
+
+def parse_findings(raw):
+    """ Read the map step's JSON answer, keeping the raw text if the model ignored the format """
+    try:
+        data = json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        data = None
+    if not isinstance(data, dict):
+        return {"clauses": [], "risks": [], "obligations": [], "notes": raw or ""}
+    return {kind: _as_strings(data.get(kind)) for kind in FINDING_KINDS}
+
+
+def merge_findings(results):
+    """ Combine per-chunk findings in document order, dropping repeats """
+    merged = {kind: [] for kind in FINDING_KINDS}
+    seen = {kind: set() for kind in FINDING_KINDS}
+    notes = []
+    for result in sorted(results, key=lambda r: r["index"]):
+        if result.get("findings", {}).get("notes"):
+            notes.append(result["findings"]["notes"])
+        for kind in FINDING_KINDS:
+            for item in result.get("findings", {}).get(kind, []):
+                key = re.sub(r"\W+", " ", item).strip().casefold()
+                if key and key not in seen[kind]:
+                    seen[kind].add(key)
+                    merged[kind].append(item)
+    if notes:
+        merged["notes"] = notes
+    return merged
+
+
+def _bullets(items):
+    return "\n".join(f"- {item}" for item in items) or "- None found"
+
+
+class ContractAnalyzer:
+    """ Map-reduce analysis of long legal documents.
+
+    The document is split with split_clauses(), each chunk is analysed in
+    parallel (map), and the combined clauses, risks and obligations are turned
+    into one summary (reduce). Map and reduce answers go through ``cache``, whose
+    keys include the chunk text, so re-submitting an amended contract only
+    re-analyses the sections that changed.
+    """
+
+    def __init__(self, client, admission, cache, model, endpoint,
+                 max_chars=LEGAL_CHUNK_CHARS, concurrency=LEGAL_MAP_CONCURRENCY):
+        self.client = client
+        self.admission = admission
+        self.cache = cache
+        self.model = model
+        self.endpoint = endpoint
+        self.max_chars = max_chars
+        self.concurrency = concurrency
+
+    async def _analyze_chunk(self, semaphore, index, chunk):
+        prompt = MAP_PROMPT.format(section=chunk)
+        cache_key = self.cache.key(self.model, prompt, {"format": "json"})
+        cached, tier = await self.cache.get(cache_key)
+        if cached:
+            return {"index": index, "cached": True, "findings": parse_findings(cached.get("response"))}
+
+        try:
+            async with semaphore, self.admission.admit(self.endpoint):
+                json_response = await self.client.generate(self.model, prompt, format="json")
+        except (OllamaError, AdmissionRejected) as e:
+            return {"index": index, "cached": False, "error": str(e)}
+
+        await self.cache.set(cache_key, json_response)
+        return {"index": index, "cached": False, "findings": parse_findings(json_response.get("response"))}
+
+    async def map(self, chunks):
+        """ Yield each chunk's findings as soon as it has been analysed """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [asyncio.create_task(self._analyze_chunk(semaphore, i, c)) for i, c in enumerate(chunks)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def reduce_prompt(self, merged):
+        # Free-text answers from chunks where the model ignored the JSON format are passed through as they are
+        notes = "\nOther notes:\n" + "\n\n".join(merged["notes"]) + "\n" if merged.get("notes") else ""
+        return REDUCE_PROMPT.format(notes=notes, **{kind: _bullets(merged[kind]) for kind in FINDING_KINDS})
+
+    async def analyze(self, text):
+        """ Run the full pipeline and return the summary with the merged findings """
+        chunks = split_clauses(text, self.max_chars)
+        results = [result async for result in self.map(chunks)]
+        failed = [r for r in results if "error" in r]
+        if len(failed) == len(results):
+            raise OllamaError(failed[0]["error"] if failed else "The document is empty")
+
+        merged = merge_findings(results)
+        prompt = self.reduce_prompt(merged)
+        cache_key = self.cache.key(self.model, prompt)
+        json_response, tier = await self.cache.get(cache_key)
+        if not json_response:
+            async with self.admission.admit(self.endpoint):
+                json_response = await self.client.generate(self.model, prompt)
+            await self.cache.set(cache_key, json_response)
+
+        return {"insights": json_response.get("response", "No insights generated."), **merged,
+                "chunks": len(chunks), "cached_chunks": sum(r["cached"] for r in results),
+                "failed_chunks": [r["index"] for r in failed]}
+
+    async def analyze_events(self, text):
+        """ Run the pipeline as Server-Sent Events: one ``chunk`` event per analysed
+        chunk, then the reduce step's tokens, then a ``done`` event with the merged findings """
+        chunks = split_clauses(text, self.max_chars)
+        results = []
+        async for result in self.map(chunks):
+            results.append(result)
+            yield sse_event({**result, "total": len(chunks)}, event="chunk")
+
+        # Reducing nothing would report an empty analysis as a success
+        failed = [r for r in results if "error" in r]
+        if len(failed) == len(results):
+            yield sse_event({"detail": failed[0]["error"] if failed else "The document is empty"}, event="error")
+            return
+
+        merged = merge_findings(results)
+        prompt = self.reduce_prompt(merged)
+        cache_key = self.cache.key(self.model, prompt)
+        cached, tier = await self.cache.get(cache_key)
+        if cached:
+            reduce_chunks = self.cache.replay(cached)
+        else:
+            reduce_chunks = self.cache.store_stream(
+                cache_key, self.admission.admit_stream(self.endpoint, self.client.generate_stream(self.model, prompt)))
+
+        try:
+            async for chunk in reduce_chunks:
+                if chunk.get("response"):
+                    yield sse_event({"token": chunk["response"]})
+        except (OllamaError, AdmissionRejected) as e:
+            yield sse_event({"detail": str(e)}, event="error")
+            return
+
+        yield sse_event({**merged, "chunks": len(chunks), "cached_chunks": sum(r["cached"] for r in results),
+                         "failed_chunks": [r["index"] for r in results if "error" in r]}, event="done")
@@ -0,0 +1,234 @@
+import bisect
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+
+from fastapi.responses import Response
+
+
+logger = logging.getLogger(__name__)
+
+# Share of requests whose timings (and Ollama responses, see client.py) are logged at DEBUG level
+LOG_SAMPLE_RATE = float(os.environ.get("OLLAMA_LOG_SAMPLE_RATE", "0.01"))
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (1, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def sampled(rate=LOG_SAMPLE_RATE):
+    return rate > 0 and random.random() < rate
+
+
+class Histogram:
+    """ Prometheus histogram with one series per label tuple """
+
+    def __init__(self, name, documentation, labelnames, buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+                lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return "\n".join(lines)
+
+
+class Counter:
+    """ Prometheus counter with one series per label tuple """
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._series.items()):
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels))
+                lines.append(f"{self.name}{{{label_text}}} {value}" if label_text else f"{self.name} {value}")
+        return "\n".join(lines)
+
+
+class Gauge:
+    """ Prometheus gauge whose series ({label tuple: value}) are read from ``collect`` at scrape time """
+
+    def __init__(self, name, documentation, labelnames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.collect().items()):
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels))
+            lines.append(f"{self.name}{{{label_text}}} {value}" if label_text else f"{self.name} {value}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+LABELS = ("route", "model")
+REQUESTS = Counter("ollama_requests_total", "Requests that called Ollama, by response status", LABELS + ("status",))
+REQUEST_DURATION = Histogram("ollama_request_duration_seconds", "Time from request start to the last response byte", LABELS)
+QUEUE_WAIT = Histogram("ollama_queue_wait_seconds", "Time spent waiting in the admission queue", LABELS)
+CONNECT = Histogram("ollama_connect_seconds", "Time spent opening connections to Ollama (0 when a pooled one was reused)", LABELS)
+TIME_TO_FIRST_TOKEN = Histogram("ollama_time_to_first_token_seconds", "Time from request start to the first streamed token", LABELS)
+LOAD_DURATION = Histogram("ollama_load_duration_seconds", "Ollama load_duration, time spent loading the model", LABELS)
+PROMPT_EVAL_DURATION = Histogram("ollama_prompt_eval_duration_seconds", "Ollama prompt_eval_duration, time spent on the prompt", LABELS)
+EVAL_DURATION = Histogram("ollama_eval_duration_seconds", "Ollama eval_duration, time spent generating tokens", LABELS)
+PROMPT_EVAL_TOKENS = Histogram("ollama_prompt_eval_tokens", "Ollama prompt_eval_count, prompt tokens evaluated", LABELS, TOKEN_BUCKETS)
+EVAL_TOKENS = Histogram("ollama_eval_tokens", "Ollama eval_count, tokens generated", LABELS, TOKEN_BUCKETS)
+ADMISSION_WAIT = Histogram("ollama_admission_wait_seconds", "Time admitted requests waited for a slot, by priority class",
+                           ("endpoint", "priority"))
+ADMISSION_REJECTED = Counter("ollama_admission_rejected_total", "Requests turned away by the admission queue",
+                             ("endpoint", "reason"))
+CACHE_HITS = Counter("ollama_cache_hits_total", "Response cache lookups answered, by cache and tier", ("cache", "tier"))
+CACHE_MISSES = Counter("ollama_cache_misses_total", "Response cache lookups that found no live entry", ("cache",))
+CACHE_EVICTIONS = Counter("ollama_cache_evictions_total", "Response cache entries dropped to stay within the size limit",
+                          ("cache", "tier"))
+SESSION_EVICTIONS = Counter("ollama_session_evictions_total", "Conversation sessions dropped on expiry or to stay within the limits", ())
+METRICS = (REQUESTS, REQUEST_DURATION, QUEUE_WAIT, CONNECT, TIME_TO_FIRST_TOKEN, LOAD_DURATION,
+           PROMPT_EVAL_DURATION, EVAL_DURATION, PROMPT_EVAL_TOKENS, EVAL_TOKENS, ADMISSION_WAIT, ADMISSION_REJECTED,
+           CACHE_HITS, CACHE_MISSES, CACHE_EVICTIONS, SESSION_EVICTIONS)
+
+# Gauges read from live objects (e.g. the admission queue), registered by name so re-installing replaces them
+_gauges = {}
+
+
+def register_gauge(gauge):
+    _gauges[gauge.name] = gauge
+
+
+class RequestTimings:
+    """ Timings collected while serving one request.
+
+    The metrics middleware puts one in ``current_timings`` per request; the
+    admission controller and the Ollama client add to it as the request moves
+    through them. A request that makes several Ollama calls (map-reduce,
+    batches) accumulates the sums of their waits, connects and Ollama stats.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.model = None
+        self.queue_wait = 0.0
+        self.connect = 0.0
+        self.first_token = None
+        self.ollama = {}
+
+    def record_first_token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+
+    def record_ollama(self, model, response):
+        self.model = model
+        for field in ("load_duration", "prompt_eval_duration", "eval_duration", "prompt_eval_count", "eval_count"):
+            if isinstance(response.get(field), (int, float)):
+                self.ollama[field] = self.ollama.get(field, 0) + response[field]
+
+    def as_dict(self):
+        return {"model": self.model, "queue_wait": round(self.queue_wait, 6), "connect": round(self.connect, 6),
+                "time_to_first_token": self.first_token, **self.ollama}
+
+    def observe(self, route, status):
+        labels = (route, self.model)
+        REQUESTS.inc(labels + (str(status),))
+        REQUEST_DURATION.observe(labels, time.perf_counter() - self.started)
+        QUEUE_WAIT.observe(labels, self.queue_wait)
+        CONNECT.observe(labels, self.connect)
+        if self.first_token is not None:
+            TIME_TO_FIRST_TOKEN.observe(labels, self.first_token)
+        # Ollama reports durations in nanoseconds
+        for field, histogram in (("load_duration", LOAD_DURATION), ("prompt_eval_duration", PROMPT_EVAL_DURATION),
+                                 ("eval_duration", EVAL_DURATION)):
+            if field in self.ollama:
+                histogram.observe(labels, self.ollama[field] / 1e9)
+        for field, histogram in (("prompt_eval_count", PROMPT_EVAL_TOKENS), ("eval_count", EVAL_TOKENS)):
+            if field in self.ollama:
+                histogram.observe(labels, self.ollama[field])
+
+
+current_timings = contextvars.ContextVar("ollama_request_timings", default=None)
+
+
+def timings():
+    """ Timings of the request being served, or None outside a request """
+    return current_timings.get()
+
+
+class MetricsMiddleware:
+    """ ASGI middleware giving each HTTP request a RequestTimings and recording it once the response is sent """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_timings = RequestTimings()
+        token = current_timings.set(request_timings)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_timings.reset(token)
+            # Only requests that reached Ollama are recorded, labelled with the route template rather than the raw path
+            if request_timings.model is not None:
+                route = getattr(scope.get("route"), "path", scope["path"])
+                request_timings.observe(route, status)
+                if logger.isEnabledFor(logging.DEBUG) and sampled():
+                    logger.debug("%s %s %s", route, status, request_timings.as_dict())
+
+
+# Prometheus endpoint plus the middleware that feeds it
+def install_metrics(app):
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics")
+    def metrics():
+        body = "\n\n".join(metric.render() for metric in METRICS + tuple(_gauges.values())) + "\n"
+        return Response(body, media_type="text/plain; version=0.0.4")
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+
+from .metrics import SESSION_EVICTIONS, Gauge, register_gauge
+
+
+# Conversation session limits shared by every app under Ollama/
+SESSION_TTL = float(os.environ.get("OLLAMA_SESSION_TTL", "1800"))
+SESSION_MAX_SESSIONS = int(os.environ.get("OLLAMA_SESSION_MAX_SESSIONS", "1000"))
+# Cap on context tokens held across all sessions (4 bytes each)
+SESSION_MAX_TOKENS = int(os.environ.get("OLLAMA_SESSION_MAX_TOKENS", "8000000"))
+
+
+class Session:
+    """ One conversation: Ollama's ``context`` tokens from the last turn and a lock serialising turns """
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.context = array("i")
+        self.turns = 0
+        # Last use, a lookup or a finished turn
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+
+class SessionStore:
+    """ In-process conversation sessions that carry Ollama's ``context`` between turns.
+
+    Each turn sends the previous turn's context tokens back to /api/generate,
+    so only the new message is tokenised and, on the same backend, Ollama
+    reuses the cached prefix instead of re-evaluating the whole history.
+    Sessions expire ``ttl`` seconds after they were last used and the least
+    recently used ones are evicted once there are more than ``max_sessions``
+    or more than ``max_tokens`` context tokens in total.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX_SESSIONS, max_tokens=SESSION_MAX_TOKENS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_tokens = max_tokens
+        self._sessions = OrderedDict()
+        self._tokens = 0
+        register_gauge(Gauge("ollama_sessions", "Live conversation sessions", (), lambda: {(): len(self._sessions)}))
+        register_gauge(Gauge("ollama_session_context_tokens", "Context tokens held across all sessions", (),
+                             lambda: {(): self._tokens}))
+
+    def _drop(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._tokens -= len(session.context)
+        return session is not None
+
+    def _expire(self):
+        # Sessions are kept in last-used order, so expired ones are always at the front
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.updated_at >= cutoff:
+                break
+            self._drop(session.id)
+            SESSION_EVICTIONS.inc(())
+
+    def _evict(self):
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._tokens > self.max_tokens):
+            oldest = next(iter(self._sessions))
+            self._drop(oldest)
+            SESSION_EVICTIONS.inc(())
+
+    def get_or_create(self, session_id=None):
+        """ Return the live session for ``session_id``, or a new one if it is missing or expired.
+
+        New sessions always get an id chosen here, never the one the client
+        sent, so a client cannot pick (or guess) the id of another's session.
+        """
+        self._expire()
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None:
+            session = Session(uuid.uuid4().hex)
+            self._sessions[session.id] = session
+            self._evict()
+        # Refreshed together with the order, so _expire can stop at the first fresh session
+        session.updated_at = time.monotonic()
+        self._sessions.move_to_end(session.id)
+        return session
+
+    def update(self, session, context):
+        """ Store the context Ollama returned for the turn that just finished """
+        if session.id not in self._sessions:
+            return
+        self._tokens += len(context or ()) - len(session.context)
+        session.context = array("i", context or ())
+        session.turns += 1
+        session.updated_at = time.monotonic()
+        self._sessions.move_to_end(session.id)
+        self._evict()
+
+    def delete(self, session_id):
+        return self._drop(session_id)
+
+    def options(self, session):
+        """ Extra /api/generate fields for the session's next turn """
+        return {"context": session.context.tolist()} if session.context else {}
+
+    async def stream_turn(self, session, start):
+        """ Run one streamed turn under the session's lock and save the final chunk's context.
+        ``start(options)`` must return the chunk iterator, so it sees the context of the turn before """
+        async with session.lock:
+            chunks = start(self.options(session))
+            try:
+                async for chunk in chunks:
+                    if chunk.get("done") and "context" in chunk:
+                        self.update(session, chunk["context"])
+                    yield chunk
+            finally:
+                await chunks.aclose()
@@ -0,0 +1,107 @@
+import asyncio
+
+
+class _Call:
+    """ One shared non-streaming call, cancelled only when every waiter has gone away """
+
+    def __init__(self, coro, forget):
+        self.task = asyncio.create_task(coro)
+        self.waiters = 0
+        self.forget = forget
+
+    async def wait(self):
+        self.waiters += 1
+        try:
+            return await asyncio.shield(self.task)
+        finally:
+            self.waiters -= 1
+            if self.waiters == 0 and not self.task.done():
+                # Forget the key now, so a caller arriving before the task winds down starts a new call
+                self.forget()
+                self.task.cancel()
+
+
+class _Stream:
+    """ One shared streaming call; every subscriber sees all chunks from the start """
+
+    def __init__(self, source, forget):
+        self.forget = forget
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._pump(source))
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _pump(self, source):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            await source.aclose()
+
+    async def subscribe(self):
+        self.subscribers += 1
+        position = 0
+        try:
+            while True:
+                while position < len(self.chunks):
+                    yield self.chunks[position]
+                    position += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                # Forget the key now, so a caller arriving before the task winds down starts a new stream
+                self.forget()
+                self.task.cancel()
+
+
+class SingleFlight:
+    """ Deduplicates concurrent calls that share a key so only one reaches Ollama.
+
+    Callers that arrive while a call for the same key is running wait for its
+    result (or, for streams, receive the same chunks) instead of starting
+    their own. The key is forgotten as soon as the call finishes, or is
+    cancelled because every caller left, so later requests start fresh.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+
+    @staticmethod
+    def _forget(table, key, flight):
+        # Only remove the flight itself, a newer one may already have taken the key
+        if table.get(key) is flight:
+            del table[key]
+
+    async def do(self, key, coro_factory):
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _Call(coro_factory(), lambda: self._forget(self._calls, key, call))
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+        return await call.wait()
+
+    def stream(self, key, source_factory):
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = self._streams[key] = _Stream(source_factory(), lambda: self._forget(self._streams, key, flight))
+            flight.task.add_done_callback(lambda _: self._forget(self._streams, key, flight))
+        return flight.subscribe()
+
+    def in_flight(self):
+        return len(self._calls) + len(self._streams)
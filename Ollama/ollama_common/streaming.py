@@ -0,0 +1,53 @@
+import json
+
+from fastapi.responses import StreamingResponse
+
+from .client import OllamaError
+
+
+# Format one Server-Sent Event frame
+def sse_event(data, event=None):
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+async def _relay(first, chunks):
+    chunk = first
+    done = False
+    try:
+        while chunk is not None:
+            if chunk.get("response"):
+                yield sse_event({"token": chunk["response"]})
+            if chunk.get("done"):
+                done = True
+                # Final chunk carries Ollama's timing stats; the context tokens are not useful to the browser
+                stats = {k: v for k, v in chunk.items() if k not in ("response", "context")}
+                yield sse_event(stats, event="done")
+            chunk = await anext(chunks, None)
+        # Without a done frame the browser could not tell a truncated answer from a complete one
+        if not done:
+            yield sse_event({"detail": "Ollama stream ended before the final chunk"}, event="error")
+    except OllamaError as e:
+        yield sse_event({"detail": str(e)}, event="error")
+    finally:
+        await chunks.aclose()
+
+
+async def stream_response(chunks):
+    """ Relay an Ollama NDJSON stream to the browser as Server-Sent Events.
+
+    Tokens are sent as ``data: {"token": ...}`` frames and the final chunk as an
+    ``event: done`` frame. A stream that fails or ends without Ollama's final
+    chunk ends with an ``event: error`` frame instead. The first chunk is awaited before the response starts,
+    so an unreachable Ollama still raises OllamaError to the handler and becomes
+    a normal HTTP error instead of a broken stream.
+    """
+    first = await anext(chunks, None)
+    return sse_response(_relay(first, chunks))
+
+
+# Wrap already formatted SSE frames in a response that proxies will not buffer
+def sse_response(frames):
+    return StreamingResponse(frames,
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
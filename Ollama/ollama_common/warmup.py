@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import os
+
+from fastapi.responses import JSONResponse
+
+
+logger = logging.getLogger(__name__)
+
+# How often the keeper re-pings the model so Ollama never unloads it
+KEEPER_INTERVAL = float(os.environ.get("OLLAMA_KEEPER_INTERVAL", "60"))
+# Retry delay while the model is still loading or Ollama is unreachable
+KEEPER_RETRY_INTERVAL = float(os.environ.get("OLLAMA_KEEPER_RETRY_INTERVAL", "5"))
+
+
+class ModelKeeper:
+    """ Preloads a model when the app starts and keeps it resident on every backend.
+
+    start() launches a background task that loads the model, confirms through
+    /api/ps that it is resident, and then re-sends the keep-alive every
+    ``interval`` seconds. ``ready`` only turns true once Ollama reports the
+    model as loaded, which is what the /ready endpoint exposes.
+    """
+
+    def __init__(self, client, model, keep_alive=None,
+                 interval=KEEPER_INTERVAL, retry_interval=KEEPER_RETRY_INTERVAL):
+        self.client = client
+        self.model = model
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.ready = False
+        self._task = None
+
+    async def warm(self):
+        await self.client.preload(self.model, self.keep_alive)
+        self.ready = await self.client.is_resident(self.model)
+        return self.ready
+
+    async def _run(self):
+        while True:
+            try:
+                await self.warm()
+            except Exception:
+                self.ready = False
+                logger.exception("Warming %s failed", self.model)
+            if not self.ready:
+                logger.warning("%s is not resident yet, retrying in %ss", self.model, self.retry_interval)
+            await asyncio.sleep(self.interval if self.ready else self.retry_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Readiness probe that only passes once the model is loaded
+def install_readiness(app, keeper):
+    @app.get("/ready")
+    def readiness():
+        if not keeper.ready:
+            return JSONResponse(status_code=503, content={"status": "loading", "model": keeper.model})
+        return {"status": "ready", "model": keeper.model}
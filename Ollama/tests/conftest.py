@@ -0,0 +1,61 @@
+import os
+import socket
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+
+# Make ollama_common, the assistant's task store and the stub server importable when pytest runs from Ollama/
+OLLAMA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [OLLAMA_DIR, os.path.join(OLLAMA_DIR, "ai_virtual_assistant"), os.path.join(OLLAMA_DIR, "benchmarks")]
+from stub_ollama import create_app
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StubServer:
+    """ benchmarks/stub_ollama.py served by uvicorn on a background thread """
+
+    def __init__(self, **options):
+        self.url = f"http://127.0.0.1:{_free_port()}"
+        port = int(self.url.rsplit(":", 1)[1])
+        self._server = uvicorn.Server(uvicorn.Config(create_app(**options), host="127.0.0.1", port=port,
+                                                     log_level="warning", lifespan="off"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Stub Ollama at {self.url} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+    def stats(self):
+        return httpx.get(f"{self.url}/stub/stats").json()
+
+
+@pytest.fixture
+def stub_ollama():
+    """ Start stub Ollama servers: ``stub_ollama(latency="fixed:0.05", tokens=4)`` """
+    servers = []
+
+    def start(**options):
+        servers.append(StubServer(**options).start())
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,41 @@
+import asyncio
+
+from ollama_common.admission import PRIORITY_HIGH, PRIORITY_LOW, AdmissionController, current_priority
+
+
+def _admission_order(requests):
+    """ Queue ``requests`` of (endpoint, X-Priority class or None) behind a busy slot and return the order they run in """
+    async def main():
+        admission = AdmissionController(max_concurrency=1)
+        admission.register("/symptoms", priority=PRIORITY_HIGH)
+        admission.register("/recommend", priority=PRIORITY_LOW)
+        order = []
+
+        async def request(n, endpoint, header):
+            current_priority.set(header)
+            async with admission.admit(endpoint):
+                order.append(n)
+
+        async with admission.admit("/symptoms"):
+            tasks = []
+            for n, (endpoint, header) in enumerate(requests):
+                tasks.append(asyncio.create_task(request(n, endpoint, header)))
+                await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    return asyncio.run(main())
+
+
+def test_header_cannot_raise_priority_above_the_endpoint():
+    # The recommender asks for "high" but stays behind the symptom checker that arrived later
+    assert _admission_order([("/recommend", PRIORITY_HIGH), ("/symptoms", None)]) == [1, 0]
+
+
+def test_header_can_lower_priority():
+    # A background caller of the symptom checker steps aside for an interactive one
+    assert _admission_order([("/symptoms", PRIORITY_LOW), ("/symptoms", None)]) == [1, 0]
+
+
+def test_same_class_keeps_arrival_order():
+    assert _admission_order([("/symptoms", None), ("/symptoms", PRIORITY_HIGH)]) == [0, 1]
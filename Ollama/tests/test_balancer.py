@@ -0,0 +1,56 @@
+import asyncio
+
+import httpx
+
+from ollama_common.client import OllamaClient
+
+
+def _load(stub, model):
+    # An empty prompt only loads the model, so it shows up in the stub's /api/ps
+    httpx.post(f"{stub.url}/api/generate", json={"model": model, "prompt": ""}).raise_for_status()
+
+
+def test_requests_go_to_the_backend_holding_the_model(stub_ollama):
+    idle, loaded = stub_ollama(latency="fixed:0.01", tokens=2), stub_ollama(latency="fixed:0.01", tokens=2)
+
+    async def main():
+        client = OllamaClient([idle.url, loaded.url], singleflight=False)
+        try:
+            assert not await client.is_resident("llama2")
+            _load(loaded, "llama2")
+            assert await client.is_resident("llama2")
+            for n in range(3):
+                await client.generate("llama2", f"question {n}")
+            # Loaded nowhere, so it goes to the backend that is idle and has not been slower
+            await client.generate("mistral", "question")
+        finally:
+            await client.close()
+
+    asyncio.run(main())
+    assert loaded.stats()["generate"] == 3
+    assert idle.stats()["generate"] == 1
+
+
+def test_fails_over_when_the_backend_holding_the_model_stops(stub_ollama):
+    spare, loaded = stub_ollama(latency="fixed:0.01", tokens=2), stub_ollama(latency="fixed:0.01", tokens=2)
+    _load(loaded, "llama2")
+
+    async def main():
+        client = OllamaClient([spare.url, loaded.url], singleflight=False, max_failures=1)
+        try:
+            assert await client.is_resident("llama2")
+            loaded.stop()
+            response = await client.generate("llama2", "question")
+            down = [b.url for b in client.balancer.backends if not b.healthy]
+            # The spare loaded the model to answer, and now reports it in /api/ps
+            assert await client.is_resident("llama2")
+            holding = [b.url for b in client.balancer.backends if b.healthy and "llama2:latest" in b.loaded_models]
+            return response, down, holding
+        finally:
+            await client.close()
+
+    response, down, holding = asyncio.run(main())
+    assert response["done"]
+    assert down == [loaded.url]
+    assert holding == [spare.url]
+    assert spare.stats()["generate"] == 1
@@ -0,0 +1,34 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ollama_common.cache import ResponseCache
+from ollama_common.metrics import install_metrics
+
+
+def _scrape():
+    app = FastAPI()
+    install_metrics(app)
+    return TestClient(app).get("/metrics").text.splitlines()
+
+
+def test_hits_misses_and_evictions_are_exported(tmp_path):
+    cache = ResponseCache(max_entries=1, db_path=str(tmp_path / "cache.db"), name="test-export")
+
+    async def main():
+        first, second = cache.key("stub", "first"), cache.key("stub", "second")
+        await cache.get(first)
+        await cache.set(first, {"response": "one"})
+        await cache.get(first)
+        # Only one entry fits in memory, so the first falls back to the disk tier
+        await cache.set(second, {"response": "two"})
+        await cache.get(first)
+
+    asyncio.run(main())
+    cache.close()
+    lines = _scrape()
+    assert 'ollama_cache_misses_total{cache="test-export"} 1' in lines
+    assert 'ollama_cache_hits_total{cache="test-export",tier="memory"} 1' in lines
+    assert 'ollama_cache_hits_total{cache="test-export",tier="disk"} 1' in lines
+    assert 'ollama_cache_evictions_total{cache="test-export",tier="memory"} 2' in lines
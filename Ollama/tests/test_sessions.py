@@ -0,0 +1,49 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ollama_common.client import OllamaClient
+from ollama_common.metrics import install_metrics
+from ollama_common.sessions import SessionStore
+
+
+def _scrape():
+    app = FastAPI()
+    install_metrics(app)
+    return TestClient(app).get("/metrics").text.splitlines()
+
+
+def test_unknown_session_ids_are_not_adopted():
+    sessions = SessionStore()
+    session = sessions.get_or_create("chosen-by-client")
+    assert session.id != "chosen-by-client"
+    assert sessions.get_or_create(session.id) is session
+
+
+def test_session_gauges_are_exported():
+    sessions = SessionStore(max_sessions=1)
+    sessions.update(sessions.get_or_create(), [1, 2, 3])
+    lines = _scrape()
+    assert "ollama_sessions 1" in lines
+    assert "ollama_session_context_tokens 3" in lines
+
+
+def test_shared_generations_are_exported(stub_ollama):
+    stub = stub_ollama(latency="fixed:0.3", tokens=4)
+
+    async def main():
+        client = OllamaClient([stub.url], singleflight=True)
+        try:
+            calls = [asyncio.create_task(client.generate("stub", "same prompt")) for _ in range(3)]
+            await asyncio.sleep(0.1)
+            during = _scrape()
+            await asyncio.gather(*calls)
+            return during, _scrape()
+        finally:
+            await client.close()
+
+    during, after = asyncio.run(main())
+    assert "ollama_singleflight_in_flight 1" in during
+    assert "ollama_singleflight_in_flight 0" in after
+    assert stub.stats()["generate"] == 1
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from ollama_common.admission import AdmissionController, AdmissionRejected
+from ollama_common.client import OllamaClient
+
+
+async def _drain(chunks):
+    return [chunk async for chunk in chunks]
+
+
+@pytest.mark.parametrize("singleflight", [True, False])
+def test_rejected_stream_sends_no_request(stub_ollama, singleflight):
+    stub = stub_ollama(latency="fixed:0.2", tokens=4)
+
+    async def main():
+        client = OllamaClient([stub.url], singleflight=singleflight)
+        admission = AdmissionController(max_concurrency=1, max_queue=0)
+        try:
+            admitted = admission.admit_stream("/generate", client.generate_stream("stub", "first"))
+            first = await admitted.__anext__()
+            # The only slot is taken and nothing may queue, so this stream is turned away
+            rejected = admission.admit_stream("/generate", client.generate_stream("stub", "second"))
+            with pytest.raises(AdmissionRejected) as rejection:
+                await rejected.__anext__()
+            assert rejection.value.status_code == 429
+            return [first] + await _drain(admitted)
+        finally:
+            await client.close()
+
+    chunks = asyncio.run(main())
+    assert chunks[-1]["done"]
+    assert stub.stats()["generate"] == 1
+
+
+def test_unstarted_stream_sends_no_request(stub_ollama):
+    stub = stub_ollama(latency="fixed:0.01", tokens=2)
+
+    async def main():
+        client = OllamaClient([stub.url])
+        try:
+            client.generate_stream("stub", "never read")
+            await asyncio.sleep(0.2)
+            return await _drain(client.generate_stream("stub", "read"))
+        finally:
+            await client.close()
+
+    assert asyncio.run(main())[-1]["done"]
+    assert stub.stats()["generate"] == 1
+
+
+def test_identical_streams_share_one_generation(stub_ollama):
+    stub = stub_ollama(latency="fixed:0.1", tokens=3)
+
+    async def main():
+        client = OllamaClient([stub.url], singleflight=True)
+        try:
+            return await asyncio.gather(*(_drain(client.generate_stream("stub", "same")) for _ in range(3)))
+        finally:
+            await client.close()
+
+    results = asyncio.run(main())
+    assert results[0] == results[1] == results[2]
+    assert stub.stats()["generate"] == 1
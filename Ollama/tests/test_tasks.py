@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from tasks import ReminderDispatcher, ReminderInbox, TaskStore, USER_COOKIE, user_id_of
+
+
+def _reminder_setup(tmp_path, **options):
+    store = TaskStore(str(tmp_path / "tasks.db"))
+    inbox = ReminderInbox(store)
+    return store, inbox, ReminderDispatcher(store, on_fire=inbox.notify, **options)
+
+
+def test_fired_reminder_reaches_only_its_users_poll(tmp_path):
+    store, inbox, dispatcher = _reminder_setup(tmp_path)
+
+    async def main():
+        dispatcher.start()
+        try:
+            due_at = time.time() + 0.2
+            task = store.add("alice", "remind me to stretch", due_at)
+            dispatcher.schedule(task["id"], due_at)
+            alice, bob = await asyncio.gather(inbox.collect("alice", wait=5), inbox.collect("bob", wait=0.5))
+            return task, alice, bob, await inbox.collect("alice")
+        finally:
+            await dispatcher.stop()
+
+    task, alice, bob, again = asyncio.run(main())
+    store.close()
+    assert [(r["id"], r["status"]) for r in alice] == [(task["id"], "delivered")]
+    assert bob == []
+    # Each reminder is handed out once
+    assert again == []
+
+
+def test_dispatcher_keeps_running_after_store_errors(tmp_path):
+    store, inbox, dispatcher = _reminder_setup(tmp_path, retry=0.1)
+    task = store.add("alice", "remind me to stretch", time.time())
+    failures = {"due_before": 1, "mark_fired": 1}
+
+    def failing(name):
+        method = getattr(store, name)
+        def call(*args):
+            if failures[name]:
+                failures[name] -= 1
+                raise RuntimeError("database is locked")
+            return method(*args)
+        return call
+    store.due_before = failing("due_before")
+    store.mark_fired = failing("mark_fired")
+
+    async def main():
+        dispatcher.start()
+        try:
+            return await inbox.collect("alice", wait=5)
+        finally:
+            await dispatcher.stop()
+
+    reminders = asyncio.run(main())
+    store.close()
+    assert failures == {"due_before": 0, "mark_fired": 0}
+    assert [r["id"] for r in reminders] == [task["id"]]
+
+
+def test_user_ids_come_from_the_signed_cookie():
+    app = FastAPI()
+
+    @app.get("/whoami")
+    def whoami(request: Request, response: Response):
+        return user_id_of(request, response)
+
+    client = TestClient(app)
+    first = client.get("/whoami")
+    assert USER_COOKIE in first.cookies
+    # The cookie is kept by the client, so the id sticks
+    assert client.get("/whoami").json() == first.json()
+
+    forged = TestClient(app, cookies={USER_COOKIE: f"{first.json()}.{'0' * 64}"}).get("/whoami")
+    assert forged.json() != first.json()
+    named = TestClient(app, cookies={USER_COOKIE: "default"}).get("/whoami")
+    assert named.json() != "default"
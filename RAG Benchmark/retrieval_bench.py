@@ -0,0 +1,352 @@
+""" Retrieval benchmark for the RAG projects in this repository.
+
+Splits a corpus with each chunking configuration, embeds the chunks with a
+deterministic local embedding model, builds an index and asks labeled
+questions against it. Every configuration is scored on recall@k, evidence
+coverage and MRR, and timed on index build, index size and query latency:
+
+    python retrieval_bench.py --presets medical-chatbot bedrock source-code-analysis
+    python retrieval_bench.py --chunk-sizes 300 500 1000 --overlaps 0 50 --k 1 3 5 --search-types similarity mmr
+    python retrieval_bench.py --corpus my_docs --questions my_questions.jsonl --compare baseline.json
+
+Questions are JSON lines of {"question", "doc", "evidence"}: ``evidence`` is
+an exact passage of ``doc`` (a file in the corpus directory) that answers the
+question, so labels do not depend on how the corpus is chunked. A retrieved
+chunk is relevant when it overlaps that passage.
+
+Everything runs offline on CPU; reports carry the git commit and settings so
+runs from different commits compare.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import platform
+import re
+import subprocess
+import time
+
+import numpy as np
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Retrieval settings of the RAG projects in this repository. Token-based splitters are converted
+# at about 4 characters per token, and k is the retriever's default where the project sets none.
+PRESETS = {
+    "medical-chatbot": {"chunk_size": 500, "chunk_overlap": 20, "k": 3, "search_type": "similarity"},
+    "source-code-analysis": {"chunk_size": 2000, "chunk_overlap": 200, "k": 8, "search_type": "mmr"},
+    "bedrock": {"chunk_size": 1000, "chunk_overlap": 500, "k": 3, "search_type": "similarity"},
+    "interview-question-creator": {"chunk_size": 4000, "chunk_overlap": 400, "k": 4, "search_type": "similarity"},
+    "llamaindex-financial": {"chunk_size": 4096, "chunk_overlap": 80, "k": 2, "search_type": "similarity"},
+}
+
+# MMR settings, LangChain's defaults
+MMR_FETCH_K = 20
+MMR_LAMBDA = 0.5
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return round(values[index], 6)
+
+
+def summarize(latencies):
+    return {"p50": percentile(latencies, 50), "p99": percentile(latencies, 99),
+            "mean": round(sum(latencies) / len(latencies), 6) if latencies else None}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class HashingEmbeddings:
+    """ Deterministic bag-of-words embeddings: hashed unigrams and bigrams with sublinear term frequency.
+
+    Needs no model download and always gives the same vectors for the same
+    text, so index changes are measured without model noise.
+    """
+
+    def __init__(self, dimensions=384):
+        self.dimensions = dimensions
+
+    def _vector(self, text):
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        counts = {}
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.md5(feature.encode()).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            sign = 1.0 if digest[4] & 1 else -1.0
+            counts[bucket] = counts.get(bucket, 0.0) + sign
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for bucket, count in counts.items():
+            vector[bucket] = np.sign(count) * (1 + np.log(abs(count))) if count else 0.0
+        return vector
+
+    def embed_documents(self, texts):
+        return np.array([self._vector(t) for t in texts], dtype=np.float32)
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+class SentenceTransformerEmbeddings:
+    """ A local sentence-transformers model (e.g. all-MiniLM-L6-v2, as in the medical chatbot), run on CPU """
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def embed_documents(self, texts):
+        return np.asarray(self.model.encode(list(texts), batch_size=64), dtype=np.float32)
+
+    def embed_query(self, text):
+        return np.asarray(self.model.encode(text), dtype=np.float32)
+
+
+def load_embeddings(name):
+    if name == "hashing":
+        return HashingEmbeddings()
+    if name.startswith("st:"):
+        return SentenceTransformerEmbeddings(name[3:])
+    raise ValueError(f"Unknown embeddings: {name} (use hashing or st:<sentence-transformers model>)")
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class NumpyIndex:
+    """ Exact cosine search over a matrix of unit vectors """
+
+    def __init__(self, vectors):
+        self.vectors = normalize_rows(vectors)
+
+    def search(self, query, n):
+        scores = self.vectors @ query
+        n = min(n, len(scores))
+        top = np.argpartition(-scores, n - 1)[:n]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def nbytes(self):
+        return self.vectors.nbytes
+
+
+class FaissIndex:
+    """ FAISS inner-product index over unit vectors, as used by the Bedrock and interview apps """
+
+    def __init__(self, vectors):
+        import faiss
+        self.vectors = normalize_rows(vectors)
+        self.index = faiss.IndexFlatIP(self.vectors.shape[1])
+        self.index.add(self.vectors)
+
+    def search(self, query, n):
+        _, rows = self.index.search(query[None, :], min(n, self.index.ntotal))
+        return rows[0]
+
+    def nbytes(self):
+        import faiss
+        return len(faiss.serialize_index(self.index))
+
+
+BACKENDS = {"numpy": NumpyIndex, "faiss": FaissIndex}
+
+
+def mmr(index, query, k, fetch_k=MMR_FETCH_K, lambda_mult=MMR_LAMBDA):
+    """ Maximal marginal relevance over the ``fetch_k`` nearest chunks """
+    candidates = list(index.search(query, fetch_k))
+    vectors = index.vectors[candidates]
+    relevance = vectors @ query
+    selected = []
+    while candidates and len(selected) < k:
+        if selected:
+            redundancy = (vectors @ index.vectors[selected].T).max(axis=1)
+        else:
+            redundancy = np.zeros(len(candidates))
+        best = int(np.argmax(lambda_mult * relevance - (1 - lambda_mult) * redundancy))
+        selected.append(candidates.pop(best))
+        vectors = np.delete(vectors, best, axis=0)
+        relevance = np.delete(relevance, best)
+    return selected
+
+
+def load_corpus(directory):
+    corpus = {}
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith((".txt", ".md", ".py")):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                corpus[name] = f.read()
+    if not corpus:
+        raise SystemExit(f"No .txt, .md or .py files in {directory}")
+    return corpus
+
+
+def load_questions(path, corpus):
+    """ Read the labeled questions and locate each evidence passage in its document """
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            question = json.loads(line)
+            start = corpus.get(question["doc"], "").find(question["evidence"])
+            if start < 0:
+                raise SystemExit(f"{path}:{number}: evidence not found in {question['doc']}")
+            question["span"] = (start, start + len(question["evidence"]))
+            questions.append(question)
+    return questions
+
+
+def split_corpus(corpus, chunk_size, chunk_overlap):
+    """ Chunks as (doc, start, end, text), split the way the apps split their documents """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    chunks = []
+    for name, text in corpus.items():
+        for document in splitter.create_documents([text]):
+            start = document.metadata["start_index"]
+            chunks.append((name, start, start + len(document.page_content), document.page_content))
+    return chunks
+
+
+def overlap(a, b):
+    return max(0, min(a[1], b[1]) - max(a[0], b[0]))
+
+
+def evaluate(questions, chunks, index, embeddings, k, search_type):
+    """ Recall@k, evidence coverage, MRR and latencies over all questions """
+    hits, coverage, reciprocal_ranks, query_times, search_times = 0, 0.0, 0.0, [], []
+    for question in questions:
+        started = time.perf_counter()
+        query = normalize_rows(embeddings.embed_query(question["question"]))
+        search_started = time.perf_counter()
+        rows = mmr(index, query, k) if search_type == "mmr" else index.search(query, k)
+        finished = time.perf_counter()
+        query_times.append(finished - started)
+        search_times.append(finished - search_started)
+
+        span = question["span"]
+        covered = []
+        first_relevant = None
+        for rank, row in enumerate(rows, 1):
+            doc, start, end, _ = chunks[row]
+            if doc == question["doc"] and overlap((start, end), span):
+                covered.append((max(start, span[0]), min(end, span[1])))
+                first_relevant = first_relevant or rank
+        if first_relevant:
+            hits += 1
+            reciprocal_ranks += 1 / first_relevant
+            # Union of the covered parts of the evidence passage
+            covered.sort()
+            merged_end, total = span[0], 0
+            for start, end in covered:
+                total += max(0, end - max(start, merged_end))
+                merged_end = max(merged_end, end)
+            coverage += total / (span[1] - span[0])
+
+    n = len(questions)
+    return {"recall@k": round(hits / n, 4), "evidence_coverage": round(coverage / n, 4), "mrr": round(reciprocal_ranks / n, 4),
+            "query_seconds": summarize(query_times), "search_seconds": summarize(search_times)}
+
+
+def run_config(config, corpus, questions, embeddings, backend, repeat):
+    started = time.perf_counter()
+    chunks = split_corpus(corpus, config["chunk_size"], config["chunk_overlap"])
+    split_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectors = embeddings.embed_documents([text for _, _, _, text in chunks])
+    embed_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = BACKENDS[backend](vectors)
+    index_seconds = time.perf_counter() - started
+
+    # Repeat the question set so the latency percentiles rest on enough samples
+    result = evaluate(questions * repeat, chunks, index, embeddings, config["k"], config["search_type"])
+    return {"config": {**config, "backend": backend}, "chunks": len(chunks),
+            "build_seconds": {"split": round(split_seconds, 4), "embed": round(embed_seconds, 4),
+                              "index": round(index_seconds, 4), "total": round(split_seconds + embed_seconds + index_seconds, 4)},
+            "index_bytes": index.nbytes() + sum(len(text.encode()) for _, _, _, text in chunks), **result}
+
+
+def configs_from_args(args):
+    if args.presets:
+        return [{"name": name, **PRESETS[name]} for name in args.presets]
+    configs = []
+    for chunk_size, chunk_overlap, k, search_type in itertools.product(args.chunk_sizes, args.overlaps, args.k, args.search_types):
+        if chunk_overlap < chunk_size:
+            configs.append({"name": f"{chunk_size}/{chunk_overlap}/k{k}/{search_type}", "chunk_size": chunk_size,
+                            "chunk_overlap": chunk_overlap, "k": k, "search_type": search_type})
+    return configs
+
+
+def compare(report, baseline):
+    """ Print quality and latency changes against an earlier report, matching configurations by name and backend """
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('created')}):")
+    before = {(r["config"]["name"], r["config"]["backend"]): r for r in baseline.get("results", [])}
+    for result in report["results"]:
+        old = before.get((result["config"]["name"], result["config"]["backend"]))
+        if not old:
+            continue
+        deltas = [f"{metric} {result[metric]} ({result[metric] - old[metric]:+.4f})" for metric in ("recall@k", "mrr")]
+        for q in ("p50", "p99"):
+            new_q, old_q = result["query_seconds"][q], old["query_seconds"][q]
+            if new_q and old_q:
+                deltas.append(f"query {q} {new_q * 1000:.3f}ms ({(new_q - old_q) / old_q:+.1%})")
+        print(f"  {result['config']['name']} [{result['config']['backend']}]: " + ", ".join(deltas))
+
+
+def main(args):
+    corpus = load_corpus(args.corpus)
+    questions = load_questions(args.questions, corpus)
+    embeddings = load_embeddings(args.embeddings)
+
+    report = {"commit": git_commit(), "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(), "machine": platform.machine(),
+              "settings": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+              "corpus": {"documents": len(corpus), "characters": sum(len(t) for t in corpus.values()), "questions": len(questions)},
+              "results": []}
+
+    for config in configs_from_args(args):
+        for backend in args.backends:
+            result = run_config(config, corpus, questions, embeddings, backend, args.repeat)
+            report["results"].append(result)
+            print(f"{config['name']:<32} {backend:<6} chunks {result['chunks']:>5}  recall@{config['k']} {result['recall@k']:.3f}  "
+                  f"coverage {result['evidence_coverage']:.3f}  mrr {result['mrr']:.3f}  build {result['build_seconds']['total']:.3f}s  "
+                  f"query p50 {result['query_seconds']['p50'] * 1000:.3f}ms p99 {result['query_seconds']['p99'] * 1000:.3f}ms")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure retrieval quality and speed across chunking and search settings")
+    parser.add_argument("--corpus", default=os.path.join(BENCH_DIR, "sample", "corpus"), help="Directory of .txt, .md or .py documents")
+    parser.add_argument("--questions", default=os.path.join(BENCH_DIR, "sample", "questions.jsonl"))
+    parser.add_argument("--embeddings", default="hashing", help="hashing (default) or st:<sentence-transformers model>")
+    parser.add_argument("--presets", nargs="+", choices=list(PRESETS), help="Benchmark the projects' own settings instead of a grid")
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[250, 500, 1000, 2000])
+    parser.add_argument("--overlaps", nargs="+", type=int, default=[20, 200])
+    parser.add_argument("--k", nargs="+", type=int, default=[3])
+    parser.add_argument("--search-types", nargs="+", choices=["similarity", "mmr"], default=["similarity"])
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=["numpy"])
+    parser.add_argument("--repeat", type=int, default=20, help="Times the question set is asked, for stable latency percentiles")
+    parser.add_argument("--out", default="retrieval_report.json")
+    parser.add_argument("--compare", help="Earlier report to compare against")
+    main(parser.parse_args())